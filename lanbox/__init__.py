@@ -0,0 +1 @@
+"""GUI-free LanBox protocol core used by the lcopen controller"""
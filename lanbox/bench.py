@@ -0,0 +1,199 @@
+"""Reproducible benchmarks against the local emulator
+
+Measures frame encoding cost, pipelined commands per second over TCP,
+round-trip latency of reply-bearing commands, the cost of a fade tick and
+UDP ingest rate. Each run
+is appended as one JSON line to a results file together with the git
+revision, and compared with the previous run of the same kind (--quick or
+not) so regressions show up.
+
+Run it with `python lcopen.py bench`.
+"""
+import argparse
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+import timeit
+
+from lanbox import commands
+from lanbox.client import Client
+from lanbox.emulator import Emulator
+from lanbox.fade import FadeEngine
+from lanbox.ioloop import IOLoop
+from lanbox.patch import patch_frames
+from lanbox.protocol import FrameBuffer
+from lanbox.udp import UdpReceiver, encode_broadcast
+
+DEFAULT_RESULTS = "bench-results.jsonl"
+
+# Metrics where a bigger number is better; everything else is a cost
+HIGHER_IS_BETTER = ("commands_per_s", "packed_commands_per_s", "udp_packets_per_s", "udp_delivered_ratio")
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def revision():
+    """Git revision of the tree being measured, or 'unknown'"""
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or "unknown"
+    except (OSError, subprocess.SubprocessError):
+        return "unknown"
+
+
+def bench_encoding(results, repeat):
+    for name, call in (
+            ("set_gain", lambda: commands.set_gain(12, 200)),
+            ("get_layer_status", lambda: commands.get_layer_status(1)),
+            ("patch_channel", lambda: commands.patch_channel(12, 300))):
+        seconds = min(timeit.repeat(call, number=repeat, repeat=5)) / repeat
+        results["encode_{}_ns".format(name)] = seconds * 1e9
+    # Packed straight into a reusable send buffer, as Connection.send_command does
+    out = FrameBuffer()
+    args = (12, 200)
+
+    def pack_set_gain():
+        out.pack(commands.set_gain, args)
+        out.clear()
+    seconds = min(timeit.repeat(pack_set_gain, number=repeat, repeat=5)) / repeat
+    results["pack_into_set_gain_ns"] = seconds * 1e9
+    patch = {dmx: dmx for dmx in range(1, 513)}
+    seconds = min(timeit.repeat(lambda: patch_frames(patch), number=max(1, repeat // 100), repeat=5))
+    results["encode_full_patch_us"] = seconds / max(1, repeat // 100) * 1e6
+
+
+def bench_throughput(results, client, count):
+    frames = [commands.set_gain(1 + i % 512, i & 0xFF) for i in range(count)]
+    started = time.perf_counter()
+    for future in client.send_all(frames):
+        future.result(30)
+    results["commands_per_s"] = count / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    futures = [client.send_command(commands.set_gain, 1 + i % 512, i & 0xFF) for i in range(count)]
+    for future in futures:
+        future.result(30)
+    results["packed_commands_per_s"] = count / (time.perf_counter() - started)
+
+
+def bench_latency(results, client, samples):
+    for opcode, frame in (("49", commands.get_layer_status(1)),
+                          ("80", commands.get_patch(1)),
+                          ("82", commands.get_gain(1))):
+        timings = []
+        for _ in range(samples):
+            started = time.perf_counter()
+            client.call(frame, 5)
+            timings.append(time.perf_counter() - started)
+        results["rtt_{}_p50_ms".format(opcode)] = percentile(timings, 0.50) * 1000
+        results["rtt_{}_p99_ms".format(opcode)] = percentile(timings, 0.99) * 1000
+
+
+def bench_fade(results, client, duration):
+    # Every one of 512 channels changes on every tick: the worst case
+    engine = FadeEngine(client.connection)
+    engine.fade({channel: 255 for channel in range(1, 513)}, duration)
+    time.sleep(duration)
+    while engine.active:
+        time.sleep(0.01)
+    results["fade_tick_512_us"] = engine.busy / max(1, engine.ticks) * 1e6
+
+
+def bench_udp(results, duration):
+    loop = IOLoop(name="lanbox-bench")
+    loop.start()
+    receiver = UdpReceiver(loop, 0, host="127.0.0.1")
+    receiver.open()
+    port = receiver.sock.getsockname()[1]
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sender.connect(("127.0.0.1", port))
+    datagrams = [encode_broadcast(sequence, 1 + (sequence % 6) * 512, bytes(512)) for sequence in range(6)]
+    sent = 0
+    started = time.perf_counter()
+    try:
+        while time.perf_counter() - started < duration:
+            for datagram in datagrams:
+                sender.send(datagram)
+            sent += len(datagrams)
+            # Keep the sender from simply overrunning the socket buffer
+            if sent - receiver.packets > 2000:
+                time.sleep(0.0005)
+        time.sleep(0.05)
+        elapsed = time.perf_counter() - started
+    finally:
+        sender.close()
+        receiver.close()
+        loop.stop()
+    results["udp_packets_per_s"] = receiver.packets / elapsed
+    results["udp_delivered_ratio"] = receiver.packets / max(1, sent)
+
+
+def run(quick=False):
+    """Run every benchmark against a fresh emulator; returns the metrics"""
+    scale = 10 if quick else 1
+    results = {}
+    bench_encoding(results, 100000 // scale)
+
+    emulator = Emulator(port=0)
+    host, port = emulator.start()
+    client = Client(host, port).connect()
+    try:
+        bench_throughput(results, client, 50000 // scale)
+        bench_latency(results, client, 2000 // scale)
+        bench_fade(results, client, 2.0 / scale)
+    finally:
+        client.close()
+        emulator.stop()
+
+    bench_udp(results, 2.0 / scale)
+    return results
+
+
+def load_previous(path, quick=False):
+    """Latest stored run made with the same --quick setting; other runs are not comparable"""
+    try:
+        with open(path) as f:
+            records = [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return None
+    matching = [record for record in records if record.get("quick", False) == quick]
+    return matching[-1] if matching else None
+
+
+def report(results, previous):
+    for name in sorted(results):
+        line = "{:<28} {:>14.3f}".format(name, results[name])
+        if previous and name in previous["results"] and previous["results"][name]:
+            change = (results[name] - previous["results"][name]) / previous["results"][name] * 100
+            worse = change < 0 if name in HIGHER_IS_BETTER else change > 0
+            line += "  {:+7.1f}% vs {}{}".format(change, previous["revision"], "  (worse)" if worse and abs(change) > 10 else "")
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="lcopen bench", description="Benchmark the protocol core against the emulator")
+    parser.add_argument("--output", default=DEFAULT_RESULTS, help="results file to append to (default: %(default)s)")
+    parser.add_argument("--quick", action="store_true", help="a tenth of the iterations, for a fast sanity check")
+    parser.add_argument("--no-save", action="store_true", help="print the results without storing them")
+    options = parser.parse_args(argv)
+
+    previous = load_previous(options.output, options.quick)
+    results = run(options.quick)
+    report(results, previous)
+    if not options.no_save:
+        record = {"revision": revision(), "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                  "python": platform.python_version(), "quick": options.quick, "results": results}
+        with open(options.output, "a") as f:
+            f.write(json.dumps(record, sort_keys=True) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,462 @@
+"""Headless command-line interface: `lcopen send`, `lcopen patch`, `lcopen monitor`,
+`lcopen cuesync`, `lcopen show`, `lcopen scene`, `lcopen fade`, `lcopen journal`, `lcopen emulator`,
+`lcopen bench`
+
+Nothing here imports PyQt6, and the protocol modules are only imported by
+the subcommand that needs them, so the CLI starts in milliseconds.
+"""
+import argparse
+import os
+import shlex
+import struct
+import sys
+import time
+
+SUBCOMMANDS = ("send", "patch", "monitor", "cuesync", "show", "scene", "fade", "journal", "emulator", "bench")
+
+
+def connection_options():
+    parser = argparse.ArgumentParser(add_help=False)
+    group = parser.add_argument_group("connection")
+    group.add_argument("--host", action="append", dest="hosts", metavar="HOST[:PORT]",
+                       help="LanBox address; repeat to drive a whole fleet at once (default: 192.168.1.77)")
+    group.add_argument("--port", type=int, default=777, help="LanBox TCP port (default: %(default)s)")
+    group.add_argument("--password", default="777", help="LanBox password (default: %(default)s)")
+    group.add_argument("--serial", metavar="DEVICE",
+                       help="talk to the LanBox on this serial port instead of TCP/IP, e.g. /dev/ttyUSB0")
+    group.add_argument("--baud", type=int, default=38400, help="serial baud rate (default: %(default)s)")
+    group.add_argument("--midi", metavar="DEVICE",
+                       help="talk to the LanBox over MIDI SysEx on this raw MIDI device, e.g. /dev/snd/midiC1D0")
+    group.add_argument("--timeout", type=float, default=5.0, help="seconds to wait for the box")
+    group.add_argument("--metrics", metavar="FILE",
+                       help="write protocol telemetry to FILE when done (.json: JSON, else Prometheus text)")
+    group.add_argument("--journal", metavar="FILE", dest="journal_path",
+                       help="journal every command sent to a single box in FILE, for replay after it lost power")
+    return parser
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="lcopen", description="Headless LanBox controller")
+    subparsers = parser.add_subparsers(dest="subcommand", required=True)
+    common = connection_options()
+
+    send = subparsers.add_parser(
+        "send", parents=[common], help="send commands and print the replies",
+        description="Send one command given on the command line, or many read from a script "
+                    "(one 'name args...' per line). Commands are pipelined.")
+    send.add_argument("command", nargs="?", help="command name, e.g. set-gain")
+    send.add_argument("args", nargs="*", type=lambda value: int(value, 0), help="command arguments")
+    send.add_argument("--script", "-f", help="file with one command per line ('-' for stdin)")
+    send.add_argument("--list", action="store_true", help="list the available command names")
+
+    patch = subparsers.add_parser("patch", parents=[common], help="apply a patch file in bulk")
+    patch.add_argument("--file", required=True, help="patch file with 'dmx mixer' lines")
+
+    monitor = subparsers.add_parser("monitor", help="print mixer levels from UDP broadcasts")
+    monitor.add_argument("--udp-port", type=int, default=4777, help="UDP port (default: %(default)s)")
+    monitor.add_argument("--channels", default="1-16", help="channel range to print, e.g. 1-16")
+    monitor.add_argument("--interval", type=float, default=1.0, help="seconds between lines")
+    monitor.add_argument("--count", type=int, default=0, help="stop after this many lines (0: run until ^C)")
+
+    cuesync = subparsers.add_parser(
+        "cuesync", parents=[common], help="mirror the box's cue lists to a local cache",
+        description="Download and upload only the cue lists that changed since the last sync.")
+    cuesync.add_argument("--cache", help="cache directory (default: ~/.cache/lcopen/HOST-PORT/cuelists)")
+    cuesync.add_argument("--lists", default="1-999", help="cue list range to sync (default: %(default)s)")
+
+    show = subparsers.add_parser(
+        "show", parents=[common], help="save or load a whole setup as a binary show file",
+        description="save reads patch, gains, layers and cue lists from the box; "
+                    "load sends only what differs from the box.")
+    show.add_argument("action", choices=("save", "load"))
+    show.add_argument("file", help="show file")
+
+    scene = subparsers.add_parser(
+        "scene", parents=[common], help="capture or recall named layer scenes",
+        description="A scene holds mix mode, transparency, priority and name of all 63 layers; "
+                    "recall sends what differs from the box as one batch.")
+    scene.add_argument("action", choices=("capture", "recall", "list", "delete"))
+    scene.add_argument("name", nargs="?", help="scene name")
+    scene.add_argument("--file", help="scene file (default: ~/.config/lcopen/scenes.json)")
+
+    fade = subparsers.add_parser(
+        "fade", parents=[common], help="fade mixer channels to a level",
+        description="Run a timed fade at 40 Hz, sending only channels whose level changed each tick.")
+    fade.add_argument("--channels", required=True, help="mixer channel range, e.g. 1-64")
+    fade.add_argument("--level", type=int, required=True, help="target level 0-255")
+    fade.add_argument("--time", type=float, default=2.0, help="fade time in seconds (default: %(default)s)")
+    fade.add_argument("--crossfade", action="store_true", help="fade every other channel that is up to 0")
+
+    journal = subparsers.add_parser(
+        "journal", parents=[common], help="inspect, compact or replay a command journal",
+        description="compact folds the journal down to what reproduces the same state; "
+                    "replay sends that onto the box, pipelined, and journals it afresh.")
+    journal.add_argument("action", choices=("show", "compact", "replay"))
+    journal.add_argument("file", help="journal file")
+    return parser
+
+
+def parse_range(text):
+    """'1-16' or '7' as an inclusive range"""
+    first, _, last = text.partition("-")
+    return range(int(first), int(last or first) + 1)
+
+
+def parse_script_line(line):
+    """Split 'set-gain 12 200' into the command name and integer arguments"""
+    fields = shlex.split(line, comments=True)
+    if not fields:
+        return None
+    return fields[0], [int(value, 0) for value in fields[1:]]
+
+
+def encode(name, args):
+    from lanbox.commands import BY_NAME
+    if name not in BY_NAME:
+        raise ValueError("Unknown command '{}' (see lcopen send --list)".format(name))
+    try:
+        return BY_NAME[name](*args)
+    except (TypeError, struct.error) as e:
+        # Wrong argument count, or a value too large for its field
+        raise ValueError("{}: {}".format(name, e))
+
+
+def hosts(options):
+    return options.hosts or ["192.168.1.77"]
+
+
+def open_client(options):
+    from lanbox.client import Client
+    from lanbox.fleet import parse_address
+    extra = {}
+    if options.serial:
+        from lanbox.serialport import SerialConnection
+        host, port = options.serial, options.baud
+        extra["connection_class"] = SerialConnection
+    elif options.midi:
+        from lanbox.midi import MIDI_BAUDRATE, MidiConnection
+        host, port = options.midi, MIDI_BAUDRATE
+        extra["connection_class"] = MidiConnection
+    else:
+        host, port = parse_address(hosts(options)[0], options.port)
+    if options.metrics:
+        from lanbox.telemetry import Telemetry
+        extra["telemetry"] = options.telemetry = Telemetry()
+    if options.journal_path:
+        from lanbox.journal import Journal
+        extra["journal"] = options.journal = Journal(options.journal_path)
+    return Client(host, port, options.password, options.timeout, **extra).connect()
+
+
+def open_fleet(options):
+    from lanbox.fleet import Fleet, parse_address
+    fleet = Fleet([parse_address(host, options.port) for host in hosts(options)],
+                  options.password, options.timeout)
+    for (host, port), error in fleet.connect().items():
+        print("{}:{}: not connected: {}".format(host, port, error), file=sys.stderr)
+    return fleet
+
+
+def report_fleet(results, labels):
+    """Print per-box replies and a completion/latency line; returns the failure count"""
+    failures = 0
+    for result in results:
+        address = "{}:{}".format(*result.address)
+        if labels:
+            for label, reply in zip(labels, result.replies):
+                print("{} {}: {}".format(address, label, " ".join(str(v) for v in reply) if reply else "ok"))
+        if result.ok:
+            print("{}: {} commands ok in {:.1f} ms".format(address, len(result.replies), result.latency * 1000))
+        else:
+            failures += 1
+            print("{}: failed: {}".format(address, result.errors[0] if result.errors else "unknown error"))
+    return failures
+
+
+def run_send(options):
+    if options.list:
+        from lanbox.commands import BY_NAME
+        for name in sorted(BY_NAME):
+            print(name)
+        return 0
+
+    if options.script:
+        source = sys.stdin if options.script == "-" else open(options.script)
+        with source:
+            parsed = [parse_script_line(line) for line in source]
+        calls = [call for call in parsed if call is not None]
+    elif options.command:
+        calls = [(options.command, options.args)]
+    else:
+        print("lcopen send: give a command or --script", file=sys.stderr)
+        return 2
+
+    frames = [encode(name, args) for name, args in calls]
+    if len(hosts(options)) > 1 and not (options.serial or options.midi):
+        fleet = open_fleet(options)
+        try:
+            labels = [" ".join([name] + [str(arg) for arg in args]) for name, args in calls]
+            failures = report_fleet(fleet.send(frames), labels)
+        finally:
+            fleet.close()
+        return 1 if failures else 0
+
+    client = open_client(options)
+    failures = 0
+    try:
+        # Everything is queued up front, so the box sees one pipelined burst
+        futures = client.send_all(frames)
+        for (name, args), future in zip(calls, futures):
+            label = " ".join([name] + [str(arg) for arg in args])
+            try:
+                reply = future.result(options.timeout * 2)
+            except Exception as e:
+                failures += 1
+                print("{}: error: {}".format(label, e))
+                continue
+            print("{}: {}".format(label, " ".join(str(value) for value in reply) if reply else "ok"))
+    finally:
+        client.close()
+    return 1 if failures else 0
+
+
+def run_patch(options):
+    from lanbox.patch import patch_frames, read_patch_file
+
+    patch = read_patch_file(options.file)
+    frames = patch_frames(patch)
+    if len(hosts(options)) > 1 and not (options.serial or options.midi):
+        fleet = open_fleet(options)
+        try:
+            failures = report_fleet(fleet.send(frames), None)
+        finally:
+            fleet.close()
+        return 1 if failures else 0
+
+    client = open_client(options)
+    try:
+        started = time.perf_counter()
+        futures = client.send_all(frames)
+        errors = []
+        for future in futures:
+            try:
+                future.result(options.timeout * 2)
+            except Exception as e:
+                errors.append(e)
+        elapsed = time.perf_counter() - started
+    finally:
+        client.close()
+
+    if errors:
+        print("Patch failed: {} of {} frames rejected, first: {}".format(
+            len(errors), len(frames), errors[0]), file=sys.stderr)
+        return 1
+    print("Patched {} channels in {} frames ({:.1f} ms)".format(len(patch), len(frames), elapsed * 1000))
+    return 0
+
+
+def run_cuesync(options):
+    from lanbox.cuesync import CueListCache, CueListSync, default_cache_directory
+
+    client = open_client(options)
+    try:
+        host, port = client.connection.host, client.connection.port
+        cache = CueListCache(options.cache or default_cache_directory(host, port))
+        report = CueListSync(client.connection, cache, options.timeout * 6).sync(parse_range(options.lists))
+    finally:
+        client.close()
+    print("Cue lists: {}".format(report))
+    for number in report.conflicts:
+        if number in report.kept:
+            print("Cue list {}: deleted on the box but edited locally, kept the local copy".format(number))
+        else:
+            print("Cue list {}: changed on both sides, kept the box's version".format(number))
+    for number, error in sorted(report.errors.items()):
+        print("Cue list {}: {}".format(number, error), file=sys.stderr)
+    return 1 if report.errors else 0
+
+
+def run_show(options):
+    from lanbox.mirror import Mirror
+    from lanbox.show import Show, capture_show, push_show, read_mirror
+
+    client = open_client(options)
+    try:
+        started = time.perf_counter()
+        if options.action == "save":
+            show = capture_show(client.connection, options.timeout * 6)
+            show.save(options.file)
+            message = "Saved {} cue lists to {}".format(len(show.cue_lists), options.file)
+        else:
+            with Show.load(options.file) as show:
+                # A fresh mirror knows nothing, so read the box first and send only what differs
+                mirror = Mirror()
+                read_mirror(client.connection, mirror, options.timeout * 6)
+                sent = push_show(client.connection, mirror, show, options.timeout * 6)
+            message = "Loaded {}: {} commands sent".format(options.file, sent)
+    finally:
+        client.close()
+    print("{} ({:.1f} ms)".format(message, (time.perf_counter() - started) * 1000))
+    return 0
+
+
+def run_scene(options):
+    from lanbox.scene import SceneBook, capture_scene, recall_scene
+
+    book = SceneBook(options.file)
+    if options.action == "list":
+        for name in book.names():
+            print(name)
+        return 0
+    if not options.name:
+        print("lcopen scene {}: give a scene name".format(options.action), file=sys.stderr)
+        return 2
+    if options.action == "delete":
+        book.remove(options.name)
+        return 0
+
+    scene = book.get(options.name) if options.action == "recall" else None
+    client = open_client(options)
+    try:
+        started = time.perf_counter()
+        if scene is None:
+            book.put(capture_scene(client.connection, options.name, options.timeout * 6))
+            message = "Captured layer scene '{}'".format(options.name)
+        else:
+            from lanbox.mirror import Mirror
+            # A fresh mirror knows nothing, so read the layers first and send only what differs
+            mirror = Mirror()
+            capture_scene(client.connection, options.name, options.timeout * 6, mirror)
+            sent, future = recall_scene(client.connection, mirror, scene)
+            future.result(options.timeout * 6)
+            message = "Recalled layer scene '{}': {} commands in one batch".format(options.name, sent)
+    finally:
+        client.close()
+    print("{} ({:.1f} ms)".format(message, (time.perf_counter() - started) * 1000))
+    return 0
+
+
+def run_fade(options):
+    from lanbox.fade import FadeEngine
+
+    levels = {channel: options.level for channel in parse_range(options.channels)}
+    client = open_client(options)
+    try:
+        engine = FadeEngine(client.connection)
+        if options.crossfade:
+            engine.crossfade(levels, options.time)
+        else:
+            engine.fade(levels, options.time)
+        time.sleep(options.time)
+        deadline = time.monotonic() + options.timeout
+        while engine.active and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        client.close()
+    print("{} ticks, {} frames, {} skipped, {:.0f} us per tick".format(
+        engine.ticks, engine.frames, engine.skipped, engine.busy / max(1, engine.ticks) * 1e6))
+    return 1 if engine.errors else 0
+
+
+def run_monitor(options):
+    from lanbox.ioloop import IOLoop
+    from lanbox.udp import UdpReceiver
+
+    channels = parse_range(options.channels)
+    first, last = channels.start, channels.stop - 1
+
+    loop = IOLoop()
+    loop.start()
+    receiver = UdpReceiver(loop, options.udp_port)
+    receiver.open()
+    lines = 0
+    try:
+        while not options.count or lines < options.count:
+            time.sleep(options.interval)
+            levels = receiver.levels[first - 1:last]
+            print("{:>8} pkts {:>6} lost | {}".format(
+                receiver.packets, receiver.lost, " ".join("{:3d}".format(v) for v in levels)))
+            sys.stdout.flush()
+            lines += 1
+            if receiver.sock is None and receiver.error is not None:
+                # Not a passing ICMP error; the receiver closed itself
+                print("lcopen monitor: {}".format(receiver.error), file=sys.stderr)
+                return 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        receiver.close()
+        loop.stop()
+    return 0
+
+
+def run_journal(options):
+    from lanbox.journal import STATUS_NAMES, Journal, replay
+
+    if not os.path.exists(options.file):
+        raise FileNotFoundError("No journal at {}".format(options.file))
+    if options.action != "replay":
+        journal = Journal(options.file)
+        try:
+            if options.action == "show":
+                for record in journal.records():
+                    print("{:>8} {} {:<8} {}".format(
+                        record.sequence, time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(record.time)),
+                        STATUS_NAMES.get(record.status, record.status), bytes(record.frame).hex(" ")))
+            else:
+                dropped = journal.compact()
+                print("Compacted {}: {} records dropped, {} left".format(options.file, dropped, journal.count))
+        finally:
+            journal.close()
+        return 0
+
+    # The replayed commands are journaled again, with their new outcome
+    options.journal_path = options.file
+    client = open_client(options)
+    try:
+        started = time.perf_counter()
+        sent, future = replay(client.connection, options.journal)
+        future.result(options.timeout * 6)
+    finally:
+        client.close()
+    print("Replayed {}: {} commands ({:.1f} ms)".format(options.file, sent, (time.perf_counter() - started) * 1000))
+    return 0
+
+
+def write_metrics(options):
+    telemetry = getattr(options, "telemetry", None)
+    if telemetry is None:
+        return
+    with open(options.metrics, "w") as f:
+        f.write(telemetry.to_json() if options.metrics.endswith(".json") else telemetry.to_prometheus())
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["emulator"]:
+        # The emulator and benchmarks have their own options and no use for a connection
+        from lanbox import emulator
+        return emulator.main(argv[1:])
+    if argv[:1] == ["bench"]:
+        from lanbox import bench
+        return bench.main(argv[1:])
+    options = build_parser().parse_args(argv)
+    runner = {"send": run_send, "patch": run_patch, "monitor": run_monitor,
+              "cuesync": run_cuesync, "show": run_show, "scene": run_scene,
+              "fade": run_fade, "journal": run_journal}[options.subcommand]
+    # A box refusing a command mid-run is reported like any other failure, not as a traceback
+    from lanbox.protocol import CommandRejected, ProtocolError
+    try:
+        status = runner(options)
+        write_metrics(options)
+        return status
+    except (OSError, ValueError, TimeoutError, CommandRejected, ProtocolError) as e:
+        print("lcopen {}: {}".format(options.subcommand, e), file=sys.stderr)
+        return 1
+    finally:
+        if getattr(options, "journal", None) is not None:
+            options.journal.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+"""Blocking LanBox client for scripts and the command line"""
+import threading
+
+from lanbox.ioloop import IOLoop
+from lanbox.connection import Connection, CONNECTED, FAILED, CLOSED
+
+DEFAULT_HOST = "192.168.1.77"
+DEFAULT_PORT = 777
+DEFAULT_PASSWORD = "777"
+
+
+class Client:
+    """One Connection plus the IOLoop driving it; connect() blocks until logged in
+
+    Extra keyword options are passed through to Connection. An existing
+    loop may be shared, in which case close() leaves it running. A
+    connection_class such as SerialConnection or MidiConnection takes the
+    device path as host and the baud rate as port.
+    """
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, password=DEFAULT_PASSWORD,
+                 timeout=5.0, loop=None, connection_class=Connection, **options):
+        if isinstance(password, str):
+            password = password.encode("ascii")
+        self._own_loop = loop is None
+        self.loop = loop or IOLoop()
+        self.timeout = timeout
+        self.connection = connection_class(self.loop, host, port, password=password,
+                                     timeout=timeout, handler=self._on_event, **options)
+        self._ready = threading.Event()
+        self._error = None
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _on_event(self, event, detail):
+        if event == CONNECTED:
+            self._ready.set()
+        elif event in (FAILED, CLOSED) and not self._ready.is_set():
+            self._error = detail
+            self._ready.set()
+
+    def connect(self):
+        if self._own_loop and not self.loop.is_alive():
+            self.loop.start()
+        self.connection.open()
+        # The connection enforces its own timeout; the margin only guards a stuck loop
+        if not self._ready.wait(self.timeout + 1.0):
+            raise TimeoutError("Timed out connecting to LanBox")
+        if self._error is not None:
+            raise self._error
+        return self
+
+    def send(self, frame):
+        """Queue one frame and return the Future of its reply"""
+        return self.connection.send(frame)
+
+    def send_command(self, command, *args):
+        """Queue a command from lanbox.commands without building its frame up front"""
+        return self.connection.send_command(command, *args)
+
+    def send_all(self, frames):
+        """Pipeline many frames at once; returns their futures in order"""
+        return [self.connection.send(frame) for frame in frames]
+
+    def call(self, frame, timeout=None):
+        """Send one frame and wait for its decoded reply"""
+        return self.send(frame).result(timeout)
+
+    def close(self):
+        self.connection.handler = None
+        self.connection.close()
+        if self._own_loop:
+            self.loop.stop()
@@ -0,0 +1,64 @@
+"""Write coalescing for rapid-fire parameter changes
+
+Dragging a slider produces a new value faster than the box needs to see
+them. The Coalescer keeps only the latest frame per (command, target) key
+and flushes at most once per window, so the box converges on the final
+value without a queue of stale ones in front of it.
+"""
+import time
+from concurrent.futures import Future
+
+
+class Coalescer:
+    """Latest-value-wins send layer in front of a Connection"""
+
+    def __init__(self, connection, window=0.025):
+        self.connection = connection
+        self.loop = connection.loop
+        self.window = window
+        self._pending = {}
+        self._timer = None
+        self._last_flush = 0.0
+
+    def submit(self, key, frame):
+        """Queue frame under key, replacing any value not yet flushed; thread-safe
+
+        The returned future resolves with the reply once the frame is sent.
+        If a newer value for the same key arrives first, it is cancelled.
+        """
+        future = Future()
+        self.loop.call_soon(self._submit, key, bytes(frame), future)
+        return future
+
+    def flush(self):
+        self.loop.call_soon(self._flush)
+
+    def _submit(self, key, frame, future):
+        superseded = self._pending.pop(key, None)
+        if superseded is not None:
+            superseded[1].cancel()
+        self._pending[key] = (frame, future)
+        if self._timer is None:
+            # Leading edge goes out at once; later values wait for the window
+            delay = max(0.0, self._last_flush + self.window - time.monotonic())
+            self._timer = self.loop.call_later(delay, self._flush)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._last_flush = time.monotonic()
+        pending, self._pending = self._pending, {}
+        for frame, future in pending.values():
+            self.connection.send(frame).add_done_callback(_forward_to(future))
+
+
+def _forward_to(future):
+    def done(source):
+        if future.cancelled():
+            return
+        if source.exception() is not None:
+            future.set_exception(source.exception())
+        else:
+            future.set_result(source.result())
+    return done
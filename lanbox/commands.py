@@ -0,0 +1,108 @@
+"""Command table: every LanBox command the controller sends
+
+Each entry is a Command with a precompiled Struct for its whole frame.
+Calling one returns a complete `*xx...#` frame, e.g. set_gain(12, 200);
+Connection.send_command(set_gain, 12, 200) packs it straight into the
+connection's send buffer instead. They are shared by the GUI, the
+command-line interface and anything else that drives a box.
+"""
+from lanbox.protocol import (Command, LAYER_STATUS, PATCH, GAIN, SYSTEM_INFO,
+                             CUE_LIST_SIZE, CUE_STEP, CUE_LIST_DIGEST)
+
+# Command: *5F CLIS # where CLIS is 16bit number (Create Cue List)
+create_cue_list = Command("create-cue-list", b"5F", "H")
+
+# Command: *5D CLIS # where CLIS is 16bit number (Load Cue List)
+load_cue_list = Command("load-cue-list", b"5D", "H")
+
+# Command: *5E CLIS # where CLIS is 16bit number (Save Cue List)
+save_cue_list = Command("save-cue-list", b"5E", "H")
+
+# Command: *5A CLIS # where CLIS is 16bit number (Clear Cue List)
+clear_cue_list = Command("clear-cue-list", b"5A", "H")
+
+# Command: *A6 CLIS # where CLIS is 16bit number (Get Cue List Size)
+get_cue_list_size = Command("get-cue-list-size", b"A6", "H", reply=CUE_LIST_SIZE)
+
+# Command: *A7 CLIS CS # where CLIS is 16bit, CS is 16bit step number (Read Cue Step)
+get_cue_step = Command("get-cue-step", b"A7", "HH", reply=CUE_STEP)
+
+# Command: *A8 CLIS # where CLIS is 16bit number (Get Cue List Digest)
+get_cue_list_digest = Command("get-cue-list-digest", b"A8", "H", reply=CUE_LIST_DIGEST)
+
+# Command: *A9 CLIS CS AC CH VA FT # 16bit list and step, 8bit action, 16bit channel,
+# 8bit value, 16bit fade time; CS one past the end appends (Write Cue Step)
+write_cue_step = Command("write-cue-step", b"A9", "HHBHBH")
+
+# Command: *5C LA (CS) # where LA is 8bit, CS is optional 8bit
+insert_step = Command("insert-step", b"5C", "BB")
+
+# Command: *5C LA # where LA is 8bit (append to layer)
+append_step = Command("append-step", b"5C", "B")
+
+# Command: *5B LA CS # where LA is 8bit, CS is 8bit
+delete_step = Command("delete-step", b"5B", "BB")
+
+# Command: *47 LA MM # where LA is 8bit, MM is 8bit mix mode
+set_mix_mode = Command("set-mix-mode", b"47", "BB")
+
+# Command: *63 LA TD # where LA is 8bit, TD is 8bit transparency
+set_transparency = Command("set-transparency", b"63", "BB")
+
+# Command: *49 LA # where LA is 8bit (Get Layer Status)
+get_layer_status = Command("get-layer-status", b"49", "B", reply=LAYER_STATUS)
+
+# Command: *4A LA PR # where LA is 8bit, PR is 8bit priority
+set_layer_priority = Command("set-layer-priority", b"4A", "BB")
+
+# Command: *48 LA NAME # where LA is 8bit, NAME is 15 bytes of latin-1, zero padded (Set Layer Name)
+set_layer_name = Command("set-layer-name", b"48", "B15s")
+
+LAYER_NAME_SIZE = 15
+
+
+def layer_name(text):
+    """A layer name as set_layer_name carries it: latin-1 ('?' for anything else), cut to 15 bytes"""
+    return text.encode("latin-1", "replace")[:LAYER_NAME_SIZE].rstrip(b"\0")
+
+
+# Command: *81 DMX1 CHA1 # (single pair; see lanbox.patch for bulk patching)
+patch_channel = Command("patch-channel", b"81", "HH")
+
+# Command: *80 DMX1 # where DMX1 is 16bit (Get Patch)
+get_patch = Command("get-patch", b"80", "H", reply=PATCH)
+
+# Command: *82 DMX1 GAIN # where DMX1 is 16bit, GAIN is 8bit (Set Gain)
+set_gain = Command("set-gain", b"82", "HB")
+
+# Command: *82 DMX1 # where DMX1 is 16bit; no gain byte means get (Get Gain)
+get_gain = Command("get-gain", b"82", "H", reply=GAIN)
+
+# Command: *B1 # (Factory Reset)
+factory_reset = Command("factory-reset", b"B1")
+
+# Command: *B2 # (Save Configuration)
+save_configuration = Command("save-configuration", b"B2")
+
+# Command: *B3 # (Get System Info)
+get_system_info = Command("get-system-info", b"B3", reply=SYSTEM_INFO)
+
+# Bulk forms carrying any number of entries, encoded with protocol.pack_frames
+# Command: *81 DMX1 CHA1 DMX2 CHA2 ... # (16bit DMX, 16bit mixer channel)
+patch_channels = Command("patch-channels", b"81", "HH", repeat=True)
+# Command: *82 DMX1 GAIN1 DMX2 GAIN2 ... # (16bit DMX, 8bit gain)
+set_gains = Command("set-gains", b"82", "HB", repeat=True)
+# Command: *C9 CH1 VAL1 CH2 VAL2 ... # (16bit mixer channel, 8bit level)
+set_levels = Command("set-levels", b"C9", "HB", repeat=True)
+
+COMMANDS = (
+    create_cue_list, load_cue_list, save_cue_list, clear_cue_list,
+    get_cue_list_size, get_cue_step, get_cue_list_digest, write_cue_step, insert_step, append_step, delete_step,
+    set_mix_mode, set_transparency, get_layer_status, set_layer_priority, set_layer_name,
+    patch_channel, get_patch, set_gain, get_gain,
+    factory_reset, save_configuration, get_system_info,
+    patch_channels, set_gains, set_levels,
+)
+
+# Command-line names, e.g. `lcopen send set-gain 12 200`
+BY_NAME = {command.name: command for command in COMMANDS if not command.repeat}
@@ -0,0 +1,81 @@
+"""Bounded communication log with batched consumers and optional file spill
+
+Lines are kept in a fixed-size ring so memory stays flat over a long show.
+Views collect new lines in batches with take_pending() instead of being
+poked for every command, and the file spill runs on logging's own
+QueueListener thread so disk I/O never blocks the caller; logging is only
+imported once a spill is enabled.
+"""
+import threading
+import time
+from collections import deque
+
+
+class CommunicationLog:
+    """Thread-safe ring of timestamped log lines"""
+
+    def __init__(self, capacity=10000):
+        self.capacity = capacity
+        self.lines = deque(maxlen=capacity)
+        self.appended = 0
+        self._pending = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._spill_logger = None
+        self._spill_listener = None
+
+    def append(self, message):
+        line = "[{}] {}".format(time.strftime("%H:%M:%S"), message)
+        with self._lock:
+            self.lines.append(line)
+            self._pending.append(line)
+            self.appended += 1
+        logger = self._spill_logger
+        if logger is not None:
+            logger.info(line)
+        return line
+
+    def take_pending(self):
+        """Lines appended since the last call, oldest first"""
+        with self._lock:
+            pending = list(self._pending)
+            self._pending.clear()
+        return pending
+
+    def clear(self):
+        with self._lock:
+            self.lines.clear()
+            self._pending.clear()
+
+    @property
+    def spilling(self):
+        return self._spill_listener is not None
+
+    def enable_spill(self, path, max_bytes=5 * 1024 * 1024, backup_count=5):
+        """Also write every line to a rotating file, asynchronously"""
+        import logging
+        import logging.handlers
+        import queue
+        self.disable_spill()
+        handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        records = queue.SimpleQueue()
+        self._spill_listener = logging.handlers.QueueListener(records, handler)
+        self._spill_listener.start()
+
+        logger = logging.getLogger("lanbox.commlog.{}".format(id(self)))
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        logger.handlers[:] = [logging.handlers.QueueHandler(records)]
+        self._spill_logger = logger
+
+    def disable_spill(self):
+        if self._spill_listener is None:
+            return
+        self._spill_logger.handlers[:] = []
+        self._spill_logger = None
+        # stop() drains whatever is still queued before closing the file
+        self._spill_listener.stop()
+        for handler in self._spill_listener.handlers:
+            handler.close()
+        self._spill_listener = None
@@ -0,0 +1,541 @@
+"""Persistent, non-blocking TCP connection to a single LanBox, driven by an IOLoop"""
+import errno
+import selectors
+import socket
+import struct
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from lanbox.commands import get_system_info
+from lanbox.journal import ACKED, REJECTED, FAILED as JOURNAL_FAILED
+from lanbox.protocol import ReplyParser, ProtocolError, CommandRejected, FrameBuffer, split_frame, reply_layout
+
+# Connection states
+DISCONNECTED = "disconnected"
+CONNECTING = "connecting"
+LOGIN = "login"
+CONNECTED = "connected"
+RECONNECTING = "reconnecting"
+
+# Events reported besides CONNECTED and RECONNECTING
+FAILED = "failed"
+CLOSED = "closed"
+
+# Marker telling Connection.send to look the reply layout up itself
+AUTO = object()
+
+# The box answers a correct password with this line
+LOGIN_OK = b"connected"
+
+# Cheap reply-bearing command used to prove an idle link is still alive
+KEEPALIVE = get_system_info
+
+# Size of the reusable receive buffer
+RECEIVE_SIZE = 65536
+
+
+class Request:
+    """One command in the pipeline, waiting for its reply
+
+    Either frame holds the encoded frame, or command and args are packed
+    into the send buffer each time the request goes out. Requests queued
+    by send_batch share one batch list. entry is the request's journal
+    sequence number, once it has been recorded.
+    """
+    __slots__ = ("frame", "opcode", "layout", "future", "command", "args", "batch",
+                 "sent_at", "deadline", "attempts", "entry")
+
+    def __init__(self, frame, opcode, layout, future, command=None, args=(), batch=None):
+        self.frame = frame
+        self.opcode = opcode
+        self.layout = layout
+        self.future = future
+        self.command = command
+        self.args = args
+        self.batch = batch
+        self.sent_at = None
+        self.deadline = None
+        self.attempts = 0
+        self.entry = None
+
+
+def gather(futures):
+    """One future for many: resolves with their results in order once all are done
+
+    If any failed, it fails with the first error, in order, after the rest
+    have settled.
+    """
+    combined = Future()
+    futures = list(futures)
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def done(_):
+        with lock:
+            remaining[0] -= 1
+            if remaining[0]:
+                return
+        for future in futures:
+            if future.exception() is not None:
+                combined.set_exception(future.exception())
+                return
+        combined.set_result([future.result() for future in futures])
+
+    if not futures:
+        combined.set_result([])
+    for future in futures:
+        future.add_done_callback(done)
+    return combined
+
+
+class Connection:
+    """Owns one LanBox socket; every method except send/send_command/open/close is loop-only
+
+    State changes are reported through handler(event, detail) on the I/O
+    thread, with event one of "connected", "reconnecting", "failed" or
+    "closed". GUI code is expected to forward these onto its own thread
+    (see lcopen.py).
+
+    Commands are pipelined: up to max_in_flight frames are on the wire at
+    once and replies are matched back to their futures in order. Frames are
+    gathered in one reusable send buffer and written with a single send()
+    per burst.
+
+    Once logged in, a lost link (socket error, EOF, a reply or keepalive
+    that never arrives) is re-established with exponential backoff. Commands
+    that were not acknowledged are replayed in order on the new link, up to
+    max_attempts sends each. A failed first connect or a rejected password
+    is reported as "failed" and not retried.
+
+    With a lanbox.telemetry.Telemetry, per-opcode counts, round-trip times,
+    bytes on the wire, pipeline depth and reconnects are recorded into it.
+    With a lanbox.journal.Journal, every command that only expects an
+    acknowledgement is appended to it when first sent, and its record
+    settled when the box answers or the request fails.
+    """
+
+    def __init__(self, loop, host, port, password=b"777", timeout=5.0, handler=None,
+                 max_in_flight=64, reply_timeout=5.0, auto_reconnect=True,
+                 keepalive_interval=2.0, backoff_initial=0.05, backoff_max=5.0,
+                 max_attempts=3, telemetry=None, journal=None):
+        self.loop = loop
+        self.host = host
+        self.port = port
+        self.password = password
+        self.timeout = timeout
+        self.handler = handler
+        self.max_in_flight = max_in_flight
+        self.reply_timeout = reply_timeout
+        self.auto_reconnect = auto_reconnect
+        self.keepalive_interval = keepalive_interval
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.max_attempts = max_attempts
+        self.telemetry = telemetry
+        self.journal = journal
+        self.state = DISCONNECTED
+        self.reconnects = 0
+
+        self.sock = None
+        self._logged_in_once = False
+        self._attempt = 0
+        self._connect_timer = None
+        self._retry_timer = None
+        self._timeout_timer = None
+        self._keepalive_timer = None
+        self._last_rx = 0.0
+        self._login_buf = bytearray()
+        self._rx = bytearray(RECEIVE_SIZE)
+        self._rx_view = memoryview(self._rx)
+        self._out = FrameBuffer()
+        self._interest = None
+        self._parser = ReplyParser()
+        # Requests waiting for a free pipeline slot, and those awaiting replies
+        self._backlog = deque()
+        self._in_flight = deque()
+
+    # -- Thread-safe API -------------------------------------------------
+
+    def open(self):
+        self.loop.call_soon(self._start_connect)
+
+    def close(self):
+        self.loop.call_soon(self._close, None)
+
+    def send(self, frame, layout=AUTO):
+        """Queue a command frame; the future resolves with the decoded reply
+
+        The result is the unpacked reply tuple, or () for commands that are
+        only acknowledged. Rejected commands fail with CommandRejected.
+        Commands sent while reconnecting wait for the link to come back.
+        Memoryview frames (see protocol.pack_frames) are kept without a
+        copy, so their buffer must not be reused until the reply is in.
+        """
+        if not isinstance(frame, (bytes, memoryview)):
+            frame = bytes(frame)
+        opcode, payload = split_frame(frame)
+        if layout is AUTO:
+            layout = reply_layout(opcode, payload)
+        future = Future()
+        self.loop.call_soon(self._queue_request, Request(frame, opcode, layout, future))
+        return future
+
+    def send_command(self, command, *args):
+        """Queue a command from lanbox.commands, e.g. send_command(set_gain, 12, 200)
+
+        No frame is built up front: the command is packed straight into the
+        send buffer when it goes out. Arguments that do not fit the
+        command's layout fail the future with ValueError.
+        """
+        future = Future()
+        self.loop.call_soon(self._queue_request,
+                            Request(None, command.opcode, command.reply, future, command, args))
+        return future
+
+    def send_batch(self, frames):
+        """Queue frames as one unit: they enter the pipeline together and leave in one flush
+
+        A batch takes pipeline slots as a whole, even past max_in_flight,
+        so nothing is interleaved with it. Returns one future per frame;
+        gather() confirms the batch as a whole.
+        """
+        requests = []
+        for frame in frames:
+            if not isinstance(frame, (bytes, memoryview)):
+                frame = bytes(frame)
+            opcode, payload = split_frame(frame)
+            requests.append(Request(frame, opcode, reply_layout(opcode, payload), Future(), batch=requests))
+        self.loop.call_soon(self._queue_batch, requests)
+        return [request.future for request in requests]
+
+    @property
+    def in_flight(self):
+        return len(self._in_flight) + len(self._backlog)
+
+    # -- Loop thread: connection lifecycle ---------------------------------
+
+    def _emit(self, event, detail=None):
+        if self.handler is not None:
+            self.handler(event, detail)
+
+    def _start_connect(self):
+        if self.state not in (DISCONNECTED, RECONNECTING):
+            return
+        self._retry_timer = None
+        self.state = CONNECTING
+        try:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.sock.setblocking(False)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            err = self.sock.connect_ex((self.host, self.port))
+        except OSError as e:
+            self._on_error(e)
+            return
+        if err not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+            self._on_error(OSError(err, errno.errorcode.get(err, "connect failed")))
+            return
+        self.loop.selector.register(self.sock, selectors.EVENT_WRITE, self._on_connect_ready)
+        self._interest = None
+        # Covers both the TCP connect and the password handshake
+        self._connect_timer = self.loop.call_later(self.timeout, self._on_connect_timeout)
+
+    def _on_connect_timeout(self):
+        self._connect_timer = None
+        if self.state in (CONNECTING, LOGIN):
+            self._on_error(socket.timeout("timed out"))
+
+    def _on_connect_ready(self, mask):
+        err = self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        if err:
+            self._on_error(OSError(err, errno.errorcode.get(err, "connect failed")))
+            return
+        self.state = LOGIN
+        self._login_buf.clear()
+
+        # Send password (as per documentation: 55 55 55 13 for "777" + carriage return)
+        self._out.write(self.password + b"\x0d")
+        self._flush()
+
+    def _on_login_data(self, data):
+        self._login_buf += data
+        if b"\n" not in self._login_buf and len(self._login_buf) < 64:
+            return
+        line, _, rest = bytes(self._login_buf).partition(b"\n")
+        if LOGIN_OK not in line.lower():
+            # A wrong password will not fix itself, so never retry this
+            self._fail(PermissionError("LanBox rejected the password"))
+            return
+        self._established(rest)
+
+    def _established(self, rest):
+        """The link is up and logged in: start timers, report it and send what is queued"""
+        if self._connect_timer is not None:
+            self._connect_timer.cancel()
+            self._connect_timer = None
+        self.state = CONNECTED
+        self._logged_in_once = True
+        self._attempt = 0
+        self._last_rx = time.monotonic()
+        self._timeout_timer = self.loop.call_later(0.25, self._check_reply_timeouts)
+        self._keepalive_timer = self.loop.call_later(self.keepalive_interval, self._keepalive)
+        self._emit(CONNECTED, (self.host, self.port))
+
+        if rest:
+            self._parser.feed(rest)
+        self._pump()
+
+    def _on_error(self, exc):
+        """Route any transport failure to a reconnect or a final failure"""
+        if self.state == DISCONNECTED:
+            return
+        if not self._logged_in_once:
+            self._fail(exc)
+        elif self.auto_reconnect:
+            self._schedule_reconnect(exc)
+        else:
+            self._close(exc)
+
+    def _schedule_reconnect(self, exc):
+        self._drop_socket()
+        self._requeue_in_flight(exc)
+        self.state = RECONNECTING
+        delay = min(self.backoff_max, self.backoff_initial * (2 ** self._attempt))
+        self._attempt += 1
+        self.reconnects += 1
+        if self.telemetry is not None:
+            self.telemetry.reconnects += 1
+        self._retry_timer = self.loop.call_later(delay, self._start_connect)
+        self._emit(RECONNECTING, (self._attempt, delay, exc))
+
+    def _requeue_in_flight(self, exc):
+        """Put unacknowledged requests back in front of the backlog, in order"""
+        while self._in_flight:
+            request = self._in_flight.pop()
+            if request.future is None:
+                # Keepalives are not worth replaying
+                continue
+            if request.future.done() or request.attempts >= self.max_attempts:
+                self._reject(request, exc)
+                continue
+            self._backlog.appendleft(request)
+
+    def _fail(self, exc):
+        self._teardown(exc)
+        self._emit(FAILED, exc)
+
+    def _close(self, reason):
+        if self.state == DISCONNECTED:
+            return
+        self._teardown(reason or ConnectionError("Connection closed"))
+        self._emit(CLOSED, reason)
+
+    def _drop_socket(self):
+        for timer in (self._connect_timer, self._retry_timer,
+                      self._timeout_timer, self._keepalive_timer):
+            if timer is not None:
+                timer.cancel()
+        self._connect_timer = self._retry_timer = None
+        self._timeout_timer = self._keepalive_timer = None
+        if self.sock is not None:
+            try:
+                self.loop.selector.unregister(self.sock)
+            except (KeyError, ValueError):
+                pass
+            self.sock.close()
+            self.sock = None
+        self._interest = None
+        self._out.clear()
+        self._parser.buffer.clear()
+
+    def _teardown(self, exc):
+        self._drop_socket()
+        self.state = DISCONNECTED
+        self._logged_in_once = False
+        self._attempt = 0
+        for queue in (self._in_flight, self._backlog):
+            while queue:
+                self._reject(queue.popleft(), exc)
+
+    # -- Loop thread: request pipeline -----------------------------------
+
+    def _resolve(self, request, result):
+        if request.entry is not None and self.journal is not None:
+            self.journal.settle(request.entry, ACKED)
+        if request.future is not None and not request.future.done():
+            request.future.set_result(result)
+
+    def _reject(self, request, exc):
+        if self.telemetry is not None and not isinstance(exc, CommandRejected):
+            self.telemetry.failed(request.opcode)
+        if request.entry is not None and self.journal is not None:
+            self.journal.settle(request.entry, REJECTED if isinstance(exc, CommandRejected) else JOURNAL_FAILED)
+        if request.future is not None and not request.future.done():
+            request.future.set_exception(exc)
+
+    def _queue_request(self, request):
+        if self.state == DISCONNECTED:
+            self._reject(request, ConnectionError("Not connected to LanBox"))
+            return
+        self._backlog.append(request)
+        self._pump()
+
+    def _queue_batch(self, requests):
+        if self.state == DISCONNECTED:
+            for request in requests:
+                self._reject(request, ConnectionError("Not connected to LanBox"))
+            return
+        self._backlog.extend(requests)
+        self._pump()
+
+    def _pump(self):
+        """Move backlog requests onto the wire while pipeline slots are free"""
+        if self.state != CONNECTED:
+            return
+        if not self._backlog or len(self._in_flight) >= self.max_in_flight:
+            return
+        now = time.monotonic()
+        out = self._out
+        telemetry = self.telemetry
+        journal = self.journal
+        admitted = None
+        while self._backlog:
+            request = self._backlog[0]
+            if len(self._in_flight) >= self.max_in_flight and (
+                    request.batch is None or request.batch is not admitted):
+                break
+            # Once a batch's first request is in, the rest of it follows regardless of the limit
+            admitted = request.batch
+            self._backlog.popleft()
+            if request.command is not None:
+                try:
+                    out.pack(request.command, request.args)
+                except struct.error as e:
+                    self._reject(request, ValueError("{}: {}".format(request.command.name, e)))
+                    continue
+            else:
+                out.write(request.frame)
+            if journal is not None and request.attempts == 0 and request.layout is None:
+                # Queries leave the box as it was; only commands that change it are journaled
+                request.entry = journal.append(out.tail(request.command.size) if request.frame is None
+                                               else request.frame)
+            request.sent_at = now
+            request.deadline = now + self.reply_timeout
+            request.attempts += 1
+            self._in_flight.append(request)
+            if telemetry is not None:
+                telemetry.sent(request.opcode, request.attempts > 1)
+        if telemetry is not None:
+            telemetry.depth(len(self._in_flight), len(self._backlog))
+        self._flush()
+
+    def _check_reply_timeouts(self):
+        self._timeout_timer = None
+        if self._in_flight and self._in_flight[0].deadline <= time.monotonic():
+            # Replies come back in order, so a stalled head means a dead link
+            self._on_error(TimeoutError("No reply to *{} from LanBox".format(
+                self._in_flight[0].opcode.decode("ascii"))))
+            return
+        self._timeout_timer = self.loop.call_later(0.25, self._check_reply_timeouts)
+
+    def _keepalive(self):
+        self._keepalive_timer = None
+        idle = time.monotonic() - self._last_rx
+        if idle >= self.keepalive_interval and not self._in_flight and not self._backlog:
+            self._backlog.append(Request(None, KEEPALIVE.opcode, KEEPALIVE.reply, None, KEEPALIVE))
+            self._pump()
+        self._keepalive_timer = self.loop.call_later(self.keepalive_interval, self._keepalive)
+
+    # -- Loop thread: socket events --------------------------------------
+
+    def _update_interest(self):
+        mask = selectors.EVENT_READ
+        if self._out:
+            mask |= selectors.EVENT_WRITE
+        if mask != self._interest:
+            self.loop.selector.modify(self.sock, mask, self._on_ready)
+            self._interest = mask
+
+    def _on_ready(self, mask):
+        if mask & selectors.EVENT_READ:
+            self._on_readable()
+        if self.sock is not None and mask & selectors.EVENT_WRITE:
+            self._on_writable()
+
+    def _on_readable(self):
+        try:
+            count = self.sock.recv_into(self._rx)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as e:
+            self._on_error(e)
+            return
+        if not count:
+            self._on_error(ConnectionError("Connection closed by LanBox"))
+            return
+        # A view into the reusable buffer; both consumers below copy what they keep
+        data = self._rx_view[:count]
+        self._last_rx = time.monotonic()
+        if self.telemetry is not None:
+            self.telemetry.bytes_received += count
+        if self.state == LOGIN:
+            self._on_login_data(data)
+            return
+        self._parser.feed(data)
+        self._dispatch_replies()
+
+    def _dispatch_replies(self):
+        telemetry = self.telemetry
+        while self._in_flight:
+            request = self._in_flight[0]
+            try:
+                result = self._parser.next_reply(request.opcode, request.layout)
+            except CommandRejected as e:
+                self._in_flight.popleft()
+                if telemetry is not None:
+                    telemetry.replied(request.opcode, self._last_rx - request.sent_at, rejected=True)
+                self._reject(request, e)
+                continue
+            except ProtocolError as e:
+                self._on_error(e)
+                return
+            if result is None:
+                break
+            self._in_flight.popleft()
+            if telemetry is not None:
+                telemetry.replied(request.opcode, self._last_rx - request.sent_at)
+            self._resolve(request, result)
+        if not self._in_flight:
+            # Nothing is waiting, so whatever is left is unsolicited chatter
+            self._parser.buffer.clear()
+        if telemetry is not None:
+            telemetry.depth(len(self._in_flight), len(self._backlog))
+        self._pump()
+
+    def _on_writable(self):
+        self._flush()
+
+    def _flush(self):
+        """Write as much of the send buffer as the socket takes, in one call
+
+        Called straight after queueing, so a burst usually leaves without
+        waiting for a writability event; whatever does not fit is sent
+        when the socket becomes writable.
+        """
+        if self._out:
+            pending = self._out.pending()
+            try:
+                sent = self.sock.send(pending)
+            except (BlockingIOError, InterruptedError):
+                sent = 0
+            except OSError as e:
+                pending.release()
+                self._on_error(e)
+                return
+            pending.release()
+            self._out.consume(sent)
+            if self.telemetry is not None:
+                self.telemetry.bytes_sent += sent
+        self._update_interest()
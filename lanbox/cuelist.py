@@ -0,0 +1,86 @@
+"""Compact client-side store of one cue list's steps, filled in lazily
+
+Steps are kept column-wise in flat arrays rather than as one object per
+step, and are read from the box a page at a time (`*A7`, pipelined) only
+when a view first needs them, so a long list opens instantly.
+"""
+from array import array
+
+# Steps read from the box per request burst
+PAGE = 32
+
+# Step action codes as shown in the editor
+ACTIONS = {
+    0: "Empty",
+    1: "Set Channel",
+    2: "Fade Channel",
+    3: "Wait",
+    4: "Go Cue List",
+}
+
+
+class CueSteps:
+    """Steps of one cue list; row 0 is step 1
+
+    A row is either loaded or still unknown. missing_page() hands out each
+    unknown page once. Structural edits bump generation, so replies to
+    pages requested before an edit are dropped rather than landing on rows
+    that have since shifted; the affected rows are simply asked for again.
+    """
+
+    def __init__(self):
+        self.generation = 0
+        self.open(None, 0)
+
+    def open(self, cue_list, size):
+        """Start over on a cue list with size steps, none of them loaded yet"""
+        self.cue_list = cue_list
+        self.actions = array("B", bytes(size))
+        self.channels = array("H", bytes(2 * size))
+        self.values = array("B", bytes(size))
+        self.fades = array("H", bytes(2 * size))
+        self.loaded = bytearray(size)
+        self._edited()
+
+    def __len__(self):
+        return len(self.loaded)
+
+    def step(self, row):
+        """(action, channel, value, fade) of a loaded row, or None"""
+        if not self.loaded[row]:
+            return None
+        return self.actions[row], self.channels[row], self.values[row], self.fades[row]
+
+    def missing_page(self, row):
+        """(first row, count) of the unrequested page holding row, or None"""
+        page = row // PAGE
+        if self.loaded[row] or page in self._requested:
+            return None
+        self._requested.add(page)
+        first = page * PAGE
+        return first, min(PAGE, len(self) - first)
+
+    def store(self, generation, row, step):
+        """Record a step read from the box; False if the reply is stale"""
+        if generation != self.generation or row >= len(self):
+            return False
+        self.actions[row], self.channels[row], self.values[row], self.fades[row] = step
+        self.loaded[row] = 1
+        return True
+
+    def insert(self, row):
+        """A step was inserted before row (or appended at len); its content is unknown"""
+        for column in (self.actions, self.channels, self.values, self.fades):
+            column.insert(row, 0)
+        self.loaded.insert(row, 0)
+        self._edited()
+
+    def delete(self, row):
+        for column in (self.actions, self.channels, self.values, self.fades):
+            del column[row]
+        del self.loaded[row]
+        self._edited()
+
+    def _edited(self):
+        self.generation += 1
+        self._requested = set()
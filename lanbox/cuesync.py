@@ -0,0 +1,256 @@
+"""Cue list download/upload with a local cache and checksum-based incremental sync
+
+Every cue list of a box is mirrored to a cache directory, one file per list
+named after its number and CRC-32 (`007-1a2b3c4d.steps`, the packed steps).
+index.json remembers the checksum each list had when it was last in sync
+with the box. On sync the box is asked only for per-list digests (`*A8`),
+which decides for each list whether nothing, a download or an upload is
+needed:
+
+    box == cache            nothing to do
+    only the box changed    download (`*A7` reads, pipelined)
+    only the cache changed  upload (`*5F`, `*5A`, then `*A9` writes)
+    both changed            the box wins; reported as a conflict
+    deleted vs. edited      the cache is kept; reported as a conflict
+
+so reconnecting to a box with a big show only moves the lists that differ.
+"""
+import json
+import os
+import time
+import zlib
+
+from lanbox import commands
+from lanbox.protocol import CUE_STEP, CommandRejected
+
+# Cue list numbers the LanBox accepts
+CUE_LISTS = range(1, 1000)
+
+
+def pack_steps(steps):
+    """Steps as stored on disk and hashed by the box: packed CUE_STEP records"""
+    buffer = bytearray(CUE_STEP.size * len(steps))
+    for offset, step in enumerate(steps):
+        CUE_STEP.pack_into(buffer, offset * CUE_STEP.size, *step)
+    return buffer
+
+
+def digest(steps):
+    return zlib.crc32(pack_steps(steps))
+
+
+def upload_lists(connection, lists):
+    """Queue the commands replacing each {list: steps} on the box; returns their futures"""
+    futures = []
+    for number, steps in lists.items():
+        futures.append(connection.send_command(commands.create_cue_list, number))
+        futures.append(connection.send_command(commands.clear_cue_list, number))
+        for step, values in enumerate(steps, 1):
+            futures.append(connection.send_command(commands.write_cue_step, number, step, *values))
+    return futures
+
+
+class CueListCache:
+    """On-disk copy of a box's cue lists, keyed by list number and content hash"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._index_path = os.path.join(directory, "index.json")
+        try:
+            with open(self._index_path) as f:
+                self.index = {int(number): entry for number, entry in json.load(f).items()}
+        except FileNotFoundError:
+            self.index = {}
+
+    def lists(self):
+        return sorted(self.index)
+
+    def hash(self, number):
+        entry = self.index.get(number)
+        return entry["hash"] if entry else None
+
+    def base(self, number):
+        """Checksum the list had when last in sync with the box, or None"""
+        entry = self.index.get(number)
+        return entry["base"] if entry else None
+
+    def _path(self, number, crc):
+        return os.path.join(self.directory, "{:03d}-{:08x}.steps".format(number, crc))
+
+    def get(self, number):
+        """Steps of a cached list as (action, channel, value, fade) tuples"""
+        with open(self._path(number, self.hash(number)), "rb") as f:
+            return list(CUE_STEP.iter_unpack(f.read()))
+
+    def put(self, number, steps, synced=False):
+        """Store a list; synced=True records it as matching the box"""
+        data = pack_steps(steps)
+        crc = zlib.crc32(data)
+        old = self.hash(number)
+        path = self._path(number, crc)
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+        if old is not None and old != crc:
+            self._unlink(number, old)
+        self.index[number] = {"hash": crc, "base": crc if synced else self.base(number)}
+        return crc
+
+    def mark_synced(self, number):
+        self.index[number]["base"] = self.index[number]["hash"]
+
+    def remove(self, number):
+        crc = self.hash(number)
+        if crc is not None:
+            self._unlink(number, crc)
+            del self.index[number]
+
+    def _unlink(self, number, crc):
+        try:
+            os.remove(self._path(number, crc))
+        except FileNotFoundError:
+            pass
+
+    def save(self):
+        with open(self._index_path + ".tmp", "w") as f:
+            json.dump({str(number): entry for number, entry in sorted(self.index.items())}, f, indent=1)
+        os.replace(self._index_path + ".tmp", self._index_path)
+
+
+class SyncReport:
+    """What one sync did, list numbers per outcome"""
+
+    def __init__(self):
+        self.unchanged = []
+        self.downloaded = []
+        self.uploaded = []
+        self.removed = []
+        self.conflicts = []
+        # Conflicts where the local copy was kept: lists deleted on the box but edited here
+        self.kept = []
+        self.errors = {}
+        self.elapsed = 0.0
+
+    def __str__(self):
+        return ("{} unchanged, {} downloaded, {} uploaded, {} removed, {} conflicts, {} errors in {:.2f} s"
+                .format(len(self.unchanged), len(self.downloaded), len(self.uploaded),
+                        len(self.removed), len(self.conflicts), len(self.errors), self.elapsed))
+
+
+class CueListSync:
+    """Brings a CueListCache and a box's cue lists into agreement over a Connection
+
+    sync() blocks on replies, so call it from a script or a worker thread,
+    never from the I/O thread itself.
+    """
+
+    def __init__(self, connection, cache, timeout=30.0):
+        self.connection = connection
+        self.cache = cache
+        self.timeout = timeout
+
+    def _results(self, futures):
+        """Wait for a batch; rejected commands come back as None"""
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result(self.timeout))
+            except CommandRejected:
+                results.append(None)
+        return results
+
+    def box_digests(self, lists=CUE_LISTS):
+        """{list: (steps, crc)} for every list that exists on the box, in one pipelined burst"""
+        lists = list(lists)
+        replies = self._results([self.connection.send_command(commands.get_cue_list_digest, number)
+                                 for number in lists])
+        return {number: reply for number, reply in zip(lists, replies) if reply is not None}
+
+    def download(self, sizes):
+        """Read whole lists from the box; sizes is {list: step count}. Returns {list: steps}"""
+        futures = {number: [self.connection.send_command(commands.get_cue_step, number, step)
+                            for step in range(1, size + 1)]
+                   for number, size in sizes.items()}
+        return {number: self._results(list_futures) for number, list_futures in futures.items()}
+
+    def upload(self, lists):
+        """Replace lists on the box with their cached steps, all pipelined; returns {list: error} of failures"""
+        futures = {number: upload_lists(self.connection, {number: self.cache.get(number)}) for number in lists}
+        errors = {}
+        for number, list_futures in futures.items():
+            for future in list_futures:
+                try:
+                    future.result(self.timeout)
+                except Exception as e:
+                    errors.setdefault(number, "upload failed: {}".format(e))
+        return errors
+
+    def sync(self, lists=CUE_LISTS):
+        started = time.perf_counter()
+        report = SyncReport()
+        cache = self.cache
+        box = self.box_digests(lists)
+        wanted = set(lists)
+
+        # Whatever happens below, the index has to match the step files left on disk
+        try:
+            to_download = {}
+            to_upload = []
+            for number in sorted(wanted & (set(box) | set(cache.lists()))):
+                local, base = cache.hash(number), cache.base(number)
+                remote = box[number][1] if number in box else None
+                if remote == local:
+                    if base != local:
+                        cache.mark_synced(number)
+                    report.unchanged.append(number)
+                elif remote is None:
+                    if base is None:
+                        # Created locally and never seen on the box
+                        to_upload.append(number)
+                    elif local == base:
+                        # Was in sync, then disappeared from the box
+                        cache.remove(number)
+                        report.removed.append(number)
+                    else:
+                        # Deleted on the box but edited here; removing it would lose the edits
+                        report.conflicts.append(number)
+                        report.kept.append(number)
+                elif local is None or local == base:
+                    to_download[number] = box[number][0]
+                elif remote == base:
+                    to_upload.append(number)
+                else:
+                    report.conflicts.append(number)
+                    to_download[number] = box[number][0]
+
+            for number, steps in self.download(to_download).items():
+                if None in steps:
+                    report.errors[number] = "list changed while it was being read"
+                    continue
+                cache.put(number, steps, synced=True)
+                if number not in report.conflicts:
+                    report.downloaded.append(number)
+
+            if to_upload:
+                report.errors.update(self.upload(to_upload))
+                # Trust the box's own checksum rather than assuming the upload landed intact
+                for number, (size, crc) in self.box_digests(to_upload).items():
+                    if number in report.errors:
+                        continue
+                    if crc == cache.hash(number):
+                        cache.mark_synced(number)
+                        report.uploaded.append(number)
+                    else:
+                        report.errors[number] = "checksum mismatch after upload"
+        finally:
+            cache.save()
+        report.elapsed = time.perf_counter() - started
+        return report
+
+
+def default_cache_directory(host, port):
+    """Per-box cache directory; host may be a device path (serial, MIDI), made into one path component"""
+    base = os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache"))
+    name = str(host).strip(os.sep).replace(os.sep, "_").replace(":", "_") or "_"
+    return os.path.join(base, "lcopen", "{}-{}".format(name, port), "cuelists")
@@ -0,0 +1,689 @@
+"""Local LanBox emulator for testing, benchmarking and reconnect drills
+
+Speaks the TCP password handshake and `*xx...#` command protocol (also on
+pseudo-terminals standing in for the serial port and a MIDI SysEx link), keeps a
+mixer / patch / gain / layer / cue list model, and broadcasts mixer levels
+over UDP in the format lanbox.udp understands. Latency, jitter, packet
+loss and dropped connections can be dialled in to see how the client
+copes on a bad link.
+
+Run it with `python lcopen.py emulator` or `python -m lanbox.emulator`.
+"""
+import argparse
+import asyncio
+import os
+import random
+import struct
+import sys
+import threading
+import zlib
+from array import array
+from collections import deque
+
+from lanbox.commands import COMMANDS
+from lanbox.patch import DMX_CHANNELS, MIXER_CHANNELS
+from lanbox.protocol import (FRAME_START, FRAME_END, REPLY_ERROR, MAX_PAYLOAD, LAYER_STATUS, SYSTEM_INFO,
+                             CUE_LIST_SIZE, CUE_STEP, CUE_LIST_DIGEST)
+from lanbox.udp import encode_broadcast
+
+LAYERS = 63
+FIRMWARE = (3, 1)
+# A TCP segment lost on the wire shows up as one retransmission timeout
+RETRANSMIT_DELAY = 0.2
+# A freshly inserted step: no action yet
+EMPTY_STEP = (0, 0, 0, 0)
+
+# Request payload sizes per opcode, from the command table: fixed sizes,
+# or ("repeat", entry size) for commands carrying any number of entries
+REQUEST_SIZES = {}
+for command in COMMANDS:
+    REQUEST_SIZES.setdefault(command.opcode, []).append(
+        ("repeat", command.layout.size) if command.repeat else command.layout.size)
+
+
+def candidate_sizes(opcode):
+    """Payload sizes an opcode may carry, smallest first"""
+    spec = REQUEST_SIZES.get(opcode)
+    if spec is None:
+        return range(0, MAX_PAYLOAD + 1)
+    sizes = []
+    for entry in spec:
+        if isinstance(entry, tuple):
+            sizes.extend(range(entry[1], MAX_PAYLOAD + 1, entry[1]))
+        else:
+            sizes.append(entry)
+    return sorted(set(sizes))
+
+
+def split_commands(buf):
+    """Cut complete command frames off the front of buf
+
+    Payloads are binary, so a frame ends at the first allowed payload size
+    whose terminator is followed by the next frame's `*` (or by the end of
+    what has arrived). Returns ([(opcode, payload)], bytes consumed).
+    """
+    commands = []
+    pos = 0
+    size = len(buf)
+    while size - pos >= 4:
+        if buf[pos:pos + 1] != FRAME_START:
+            # Garbage between frames: skip to the next start marker
+            nxt = buf.find(FRAME_START, pos + 1)
+            pos = nxt if nxt >= 0 else size
+            continue
+        opcode = bytes(buf[pos + 1:pos + 3])
+        for length in candidate_sizes(opcode):
+            end = pos + 3 + length
+            if end >= size:
+                return commands, pos
+            if buf[end:end + 1] == FRAME_END and (end + 1 == size or buf[end + 1:end + 2] == FRAME_START):
+                commands.append((opcode, bytes(buf[pos + 3:end])))
+                pos = end + 1
+                break
+        else:
+            commands.append((opcode, None))
+            nxt = buf.find(FRAME_START, pos + 1)
+            pos = nxt if nxt >= 0 else size
+    return commands, pos
+
+
+class Rejected(Exception):
+    pass
+
+
+class Layer:
+    __slots__ = ("mix_mode", "transparency", "priority", "cue_list", "step", "name")
+
+    def __init__(self, number):
+        self.mix_mode = 1
+        self.transparency = 0
+        self.priority = number
+        self.cue_list = number
+        self.step = 0
+        self.name = "Layer {}".format(number).encode("latin-1")
+
+
+class BoxModel:
+    """Everything the emulated LanBox remembers"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.levels = bytearray(MIXER_CHANNELS)
+        self.patch = array("H", range(1, DMX_CHANNELS + 1))
+        self.gains = bytearray([255] * DMX_CHANNELS)
+        self.layers = [Layer(number) for number in range(1, LAYERS + 1)]
+        self.cue_lists = {}
+        self.saved = 0
+
+    def load_show(self, cue_lists, steps):
+        """Fill cue lists 1..cue_lists with steps generated steps each"""
+        for number in range(1, cue_lists + 1):
+            self.cue_lists[number] = [(1 + step % 3, 1 + (number + step) % DMX_CHANNELS, step & 0xFF, step % 50)
+                                      for step in range(steps)]
+
+    def layer(self, number):
+        if not 1 <= number <= LAYERS:
+            raise Rejected()
+        return self.layers[number - 1]
+
+    def cue_list(self, number):
+        if number not in self.cue_lists:
+            raise Rejected()
+        return self.cue_lists[number]
+
+    def execute(self, opcode, payload):
+        """Apply one command; returns the reply payload or raises Rejected"""
+        handler = getattr(self, "cmd_" + opcode.decode("ascii", "replace"), None)
+        if handler is None or payload is None:
+            raise Rejected()
+        try:
+            return handler(payload)
+        except (struct.error, IndexError, ValueError):
+            raise Rejected()
+
+    # Cue lists
+
+    def cmd_5F(self, payload):
+        number, = struct.unpack(">H", payload)
+        self.cue_lists.setdefault(number, [])
+        return b""
+
+    def cmd_5D(self, payload):
+        number, = struct.unpack(">H", payload)
+        self.cue_list(number)
+        return b""
+
+    def cmd_5E(self, payload):
+        number, = struct.unpack(">H", payload)
+        self.cue_list(number)
+        self.saved += 1
+        return b""
+
+    def cmd_5A(self, payload):
+        number, = struct.unpack(">H", payload)
+        self.cue_list(number)[:] = []
+        return b""
+
+    def cmd_A6(self, payload):
+        number, = struct.unpack(">H", payload)
+        return CUE_LIST_SIZE.pack(len(self.cue_list(number)))
+
+    def cmd_A7(self, payload):
+        number, step = struct.unpack(">HH", payload)
+        steps = self.cue_list(number)
+        if not 1 <= step <= len(steps):
+            raise Rejected()
+        return CUE_STEP.pack(*steps[step - 1])
+
+    def cmd_A8(self, payload):
+        number, = struct.unpack(">H", payload)
+        steps = self.cue_list(number)
+        packed = b"".join(CUE_STEP.pack(*step) for step in steps)
+        return CUE_LIST_DIGEST.pack(len(steps), zlib.crc32(packed))
+
+    def cmd_A9(self, payload):
+        number, step, action, channel, value, fade = struct.unpack(">HHBHBH", payload)
+        steps = self.cue_list(number)
+        if step == len(steps) + 1:
+            steps.append((action, channel, value, fade))
+        elif 1 <= step <= len(steps):
+            steps[step - 1] = (action, channel, value, fade)
+        else:
+            raise Rejected()
+        return b""
+
+    def cmd_5C(self, payload):
+        layer = self.layer(payload[0])
+        steps = self.cue_lists.setdefault(layer.cue_list, [])
+        position = payload[1] - 1 if len(payload) > 1 else len(steps)
+        if not 0 <= position <= len(steps):
+            raise Rejected()
+        steps.insert(position, EMPTY_STEP)
+        return b""
+
+    def cmd_5B(self, payload):
+        layer = self.layer(payload[0])
+        steps = self.cue_list(layer.cue_list)
+        if not 1 <= payload[1] <= len(steps):
+            raise Rejected()
+        del steps[payload[1] - 1]
+        return b""
+
+    # Layers
+
+    def cmd_47(self, payload):
+        if payload[1] > 4:
+            raise Rejected()
+        self.layer(payload[0]).mix_mode = payload[1]
+        return b""
+
+    def cmd_63(self, payload):
+        self.layer(payload[0]).transparency = payload[1]
+        return b""
+
+    def cmd_4A(self, payload):
+        self.layer(payload[0]).priority = payload[1]
+        return b""
+
+    def cmd_48(self, payload):
+        self.layer(payload[0]).name = bytes(payload[1:]).rstrip(b"\0")
+        return b""
+
+    def cmd_49(self, payload):
+        layer = self.layer(payload[0])
+        return LAYER_STATUS.pack(layer.mix_mode, layer.transparency, layer.priority,
+                                 layer.cue_list, layer.step, layer.name)
+
+    # Patch, gains and mixer levels
+
+    def cmd_80(self, payload):
+        dmx, = struct.unpack(">H", payload)
+        if not 1 <= dmx <= DMX_CHANNELS:
+            raise Rejected()
+        return struct.pack(">H", self.patch[dmx - 1])
+
+    def cmd_81(self, payload):
+        entries = list(struct.iter_unpack(">HH", payload))
+        if any(not 1 <= dmx <= DMX_CHANNELS or mixer > MIXER_CHANNELS for dmx, mixer in entries):
+            raise Rejected()
+        for dmx, mixer in entries:
+            self.patch[dmx - 1] = mixer
+        return b""
+
+    def cmd_82(self, payload):
+        if len(payload) == 2:
+            dmx, = struct.unpack(">H", payload)
+            if not 1 <= dmx <= DMX_CHANNELS:
+                raise Rejected()
+            return bytes([self.gains[dmx - 1]])
+        entries = list(struct.iter_unpack(">HB", payload))
+        if any(not 1 <= dmx <= DMX_CHANNELS for dmx, _ in entries):
+            raise Rejected()
+        for dmx, gain in entries:
+            self.gains[dmx - 1] = gain
+        return b""
+
+    def cmd_C9(self, payload):
+        entries = list(struct.iter_unpack(">HB", payload))
+        if any(not 1 <= channel <= MIXER_CHANNELS for channel, _ in entries):
+            raise Rejected()
+        for channel, value in entries:
+            self.levels[channel - 1] = value
+        return b""
+
+    # System
+
+    def cmd_B1(self, payload):
+        self.reset()
+        return b""
+
+    def cmd_B2(self, payload):
+        self.saved += 1
+        return b""
+
+    def cmd_B3(self, payload):
+        return SYSTEM_INFO.pack(FIRMWARE[0], FIRMWARE[1], MIXER_CHANNELS)
+
+
+class LinkProfile:
+    """How bad the emulated network is"""
+
+    def __init__(self, latency=0.0, jitter=0.0, loss=0.0, disconnect_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.disconnect_rate = disconnect_rate
+        self.random = random.Random(seed)
+
+    def delay(self):
+        delay = self.latency
+        if self.jitter:
+            delay += self.random.uniform(-self.jitter, self.jitter)
+        if self.loss and self.random.random() < self.loss:
+            delay += RETRANSMIT_DELAY
+        return max(0.0, delay)
+
+    def drop_datagram(self):
+        return bool(self.loss) and self.random.random() < self.loss
+
+    def drop_connection(self):
+        return bool(self.disconnect_rate) and self.random.random() < self.disconnect_rate
+
+
+class CommandSession(asyncio.Protocol):
+    """One TCP client: password handshake, then pipelined commands
+
+    Serial sessions start logged in, as the serial port has no password.
+    """
+
+    def __init__(self, emulator, logged_in=False):
+        self.emulator = emulator
+        self.transport = None
+        self.logged_in = logged_in
+        self.buffer = bytearray()
+        # (due time, reply bytes), kept in order so replies never overtake each other
+        self.replies = deque()
+        self.flush_handle = None
+        self.last_due = 0.0
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.emulator.sessions.add(self)
+
+    def connection_lost(self, exc):
+        self.emulator.sessions.discard(self)
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+
+    def data_received(self, data):
+        self.buffer += data
+        if not self.logged_in:
+            if b"\r" not in self.buffer:
+                return
+            password, _, rest = bytes(self.buffer).partition(b"\r")
+            if password.strip() != self.emulator.password:
+                self.transport.write(b"password incorrect\r\n")
+                self.transport.close()
+                return
+            self.logged_in = True
+            self.transport.write(b"connected\r\n")
+            self.buffer = bytearray(rest)
+
+        commands, consumed = split_commands(self.buffer)
+        del self.buffer[:consumed]
+        if not commands:
+            return
+
+        out = bytearray()
+        profile = self.emulator.profile
+        for opcode, payload in commands:
+            if profile.drop_connection():
+                self.transport.abort()
+                return
+            self.emulator.commands += 1
+            try:
+                reply = self.emulator.model.execute(opcode, payload)
+                out += FRAME_START + opcode + reply + FRAME_END
+            except Rejected:
+                out += REPLY_ERROR + opcode + FRAME_END
+        self.queue_reply(bytes(out), profile.delay())
+
+    def queue_reply(self, data, delay):
+        if not delay and not self.replies:
+            self.transport.write(data)
+            return
+        loop = asyncio.get_running_loop()
+        due = max(self.last_due, loop.time() + delay)
+        self.last_due = due
+        self.replies.append((due, data))
+        if self.flush_handle is None:
+            self.flush_handle = loop.call_at(due, self.flush)
+
+    def flush(self):
+        self.flush_handle = None
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        out = bytearray()
+        while self.replies and self.replies[0][0] <= now:
+            out += self.replies.popleft()[1]
+        if out and not self.transport.is_closing():
+            self.transport.write(bytes(out))
+        if self.replies:
+            self.flush_handle = loop.call_at(self.replies[0][0], self.flush)
+
+
+class PtyTransport:
+    """The master side of a pseudo-terminal as a transport for a CommandSession"""
+
+    def __init__(self, loop, fd, session):
+        self.loop = loop
+        self.fd = fd
+        self.session = session
+        self.pending = bytearray()
+        self.closing = False
+        os.set_blocking(fd, False)
+        loop.add_reader(fd, self._readable)
+        session.connection_made(self)
+
+    def _readable(self):
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return
+        except OSError:
+            # EIO while no client has the other side open; keep serving
+            return
+        if data:
+            self.session.data_received(data)
+
+    def write(self, data):
+        if self.closing:
+            return
+        if not self.pending:
+            try:
+                data = data[os.write(self.fd, data):]
+            except BlockingIOError:
+                pass
+            if not data:
+                return
+            self.loop.add_writer(self.fd, self._writable)
+        self.pending += data
+
+    def _writable(self):
+        try:
+            del self.pending[:os.write(self.fd, self.pending)]
+        except BlockingIOError:
+            return
+        if not self.pending:
+            self.loop.remove_writer(self.fd)
+
+    def is_closing(self):
+        return self.closing
+
+    def abort(self):
+        # A serial line cannot be hung up; drop what is queued, as line noise would
+        import termios
+        self.pending.clear()
+        self.loop.remove_writer(self.fd)
+        termios.tcflush(self.fd, termios.TCIOFLUSH)
+        self.session.buffer.clear()
+
+    def close(self):
+        if not self.closing:
+            self.closing = True
+            self.loop.remove_reader(self.fd)
+            self.loop.remove_writer(self.fd)
+            self.session.connection_lost(None)
+
+
+class SysExBridge:
+    """Between a PtyTransport and a CommandSession: commands arrive and replies leave as SysEx"""
+
+    def __init__(self, session):
+        from lanbox.midi import SysExDecoder, SysExEncoder
+        self.session = session
+        self.transport = None
+        self.decoder = SysExDecoder()
+        self.encoder = SysExEncoder()
+
+    @property
+    def buffer(self):
+        return self.session.buffer
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.session.connection_made(self)
+
+    def connection_lost(self, exc):
+        self.session.connection_lost(exc)
+
+    def data_received(self, data):
+        # A lost message just loses its commands, as on the real box
+        data = self.decoder.feed(data)
+        if data:
+            self.session.data_received(data)
+
+    def write(self, data):
+        self.transport.write(self.encoder.encode(data))
+
+    def is_closing(self):
+        return self.transport.is_closing()
+
+    def abort(self):
+        self.transport.abort()
+
+    def close(self):
+        self.transport.close()
+
+
+def open_pty():
+    """A raw pty pair, like a real port, so the client sees exactly the bytes sent"""
+    import tty
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    return master, slave
+
+
+class Emulator:
+    """Emulated LanBox on localhost (or any address), and optionally on pseudo-terminals
+
+    With serial=True a pty pair is opened and serial_path names the side a
+    SerialConnection should open; with midi=True likewise midi_path for a
+    MidiConnection.
+    """
+
+    def __init__(self, host="127.0.0.1", port=777, password=b"777", udp_target=None,
+                 broadcast_rate=0.0, broadcast_channels=(1, MIXER_CHANNELS), animate=False,
+                 profile=None, serial=False, midi=False):
+        self.host = host
+        self.port = port
+        self.password = password if isinstance(password, bytes) else password.encode("ascii")
+        self.udp_target = udp_target
+        self.broadcast_rate = broadcast_rate
+        self.broadcast_channels = broadcast_channels
+        self.animate = animate
+        self.profile = profile or LinkProfile()
+        self.serial_path = None
+        self._pty = None
+        if serial:
+            self._pty = open_pty()
+            self.serial_path = os.ttyname(self._pty[1])
+        self.midi_path = None
+        self._midi_pty = None
+        if midi:
+            self._midi_pty = open_pty()
+            self.midi_path = os.ttyname(self._midi_pty[1])
+        self.model = BoxModel()
+        self.sessions = set()
+        self.commands = 0
+        self.datagrams = 0
+        self._server = None
+        self._udp = None
+        self._loop = None
+        self._thread = None
+        self._ready = threading.Event()
+        self._stop = None
+
+    async def serve(self):
+        """Run until stop() is called"""
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        self._server = await self._loop.create_server(lambda: CommandSession(self), self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        ptys = []
+        if self._pty is not None:
+            ptys.append(PtyTransport(self._loop, self._pty[0], CommandSession(self, logged_in=True)))
+        if self._midi_pty is not None:
+            ptys.append(PtyTransport(self._loop, self._midi_pty[0],
+                                     SysExBridge(CommandSession(self, logged_in=True))))
+        tasks = []
+        if self.udp_target and self.broadcast_rate:
+            self._udp, _ = await self._loop.create_datagram_endpoint(
+                asyncio.DatagramProtocol, remote_addr=self.udp_target)
+            tasks.append(asyncio.ensure_future(self._broadcast()))
+        self._ready.set()
+        try:
+            await self._stop.wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+            for pty in ptys:
+                pty.close()
+            for session in list(self.sessions):
+                session.transport.abort()
+            self._server.close()
+            await self._server.wait_closed()
+            if self._udp is not None:
+                self._udp.close()
+
+    async def _broadcast(self):
+        first, last = self.broadcast_channels
+        block = 512
+        interval = 1.0 / self.broadcast_rate
+        sequence = 0
+        tick = 0
+        next_time = self._loop.time()
+        while True:
+            if self.animate:
+                # Slow chase so the level monitor has something to show
+                levels = self.model.levels
+                for channel in range(first - 1, last):
+                    levels[channel] = (channel * 4 + tick) & 0xFF
+                tick += 1
+            for start in range(first, last + 1, block):
+                count = min(block, last + 1 - start)
+                sequence += 1
+                if self.profile.drop_datagram():
+                    continue
+                self._udp.sendto(encode_broadcast(
+                    sequence, start, self.model.levels[start - 1:start - 1 + count]))
+                self.datagrams += 1
+            next_time += interval
+            await asyncio.sleep(max(0.0, next_time - self._loop.time()))
+
+    def start(self):
+        """Serve from a background thread; returns (host, port) once listening"""
+        self._thread = threading.Thread(target=asyncio.run, args=(self.serve(),),
+                                        name="lanbox-emulator", daemon=True)
+        self._thread.start()
+        if not self._ready.wait(5.0):
+            raise RuntimeError("Emulator did not start")
+        return self.host, self.port
+
+    def stop(self):
+        if self._loop is not None and self._stop is not None:
+            self._loop.call_soon_threadsafe(self._stop.set)
+        if self._thread is not None:
+            self._thread.join(5.0)
+        for pty in (self._pty, self._midi_pty):
+            if pty is not None:
+                for fd in pty:
+                    os.close(fd)
+        self._pty = self._midi_pty = None
+
+    def drop_connections(self):
+        """Abort every client connection, as a cable glitch would"""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(
+                lambda: [session.transport.abort() for session in list(self.sessions)])
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="lcopen emulator", description="Emulated LanBox for testing")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=777, help="TCP command port (default: %(default)s)")
+    parser.add_argument("--password", default="777", help="login password (default: %(default)s)")
+    parser.add_argument("--udp-target", default="127.0.0.1:4777", metavar="HOST:PORT",
+                        help="where to send level broadcasts (default: %(default)s)")
+    parser.add_argument("--broadcast-rate", type=float, default=40.0,
+                        help="level broadcasts per second, 0 to disable (default: %(default)s)")
+    parser.add_argument("--animate", action="store_true", help="run a chase on the mixer levels")
+    parser.add_argument("--latency", type=float, default=0.0, help="reply delay in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- random delay in seconds")
+    parser.add_argument("--loss", type=float, default=0.0,
+                        help="packet loss probability (drops UDP datagrams, delays TCP replies)")
+    parser.add_argument("--disconnect-rate", type=float, default=0.0,
+                        help="probability per command of dropping the TCP connection")
+    parser.add_argument("--seed", type=int, help="random seed for repeatable runs")
+    parser.add_argument("--cue-lists", type=int, default=0, help="preload this many cue lists")
+    parser.add_argument("--steps", type=int, default=100, help="steps per preloaded cue list (default: %(default)s)")
+    parser.add_argument("--serial", action="store_true",
+                        help="also serve on a pseudo-terminal, as if on a serial port; its path is printed")
+    parser.add_argument("--midi", action="store_true",
+                        help="also serve SysEx on a pseudo-terminal, as if on a MIDI port; its path is printed")
+    return parser
+
+
+def main(argv=None):
+    options = build_parser().parse_args(argv)
+    udp_host, _, udp_port = options.udp_target.partition(":")
+    emulator = Emulator(
+        options.host, options.port, options.password,
+        udp_target=(udp_host, int(udp_port or 4777)), broadcast_rate=options.broadcast_rate,
+        animate=options.animate,
+        profile=LinkProfile(options.latency, options.jitter, options.loss,
+                            options.disconnect_rate, options.seed),
+        serial=options.serial, midi=options.midi)
+    emulator.model.load_show(options.cue_lists, options.steps)
+    print("LanBox emulator on {}:{}, broadcasting to {} at {} Hz".format(
+        options.host, options.port, options.udp_target, options.broadcast_rate))
+    if emulator.serial_path:
+        print("Serial port: {}".format(emulator.serial_path))
+    if emulator.midi_path:
+        print("MIDI port: {}".format(emulator.midi_path))
+    sys.stdout.flush()
+    try:
+        asyncio.run(emulator.serve())
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        print("lcopen emulator: {}".format(e), file=sys.stderr)
+        return 1
+    print("Served {} commands, sent {} datagrams".format(emulator.commands, emulator.datagrams))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,249 @@
+"""Timed fades and crossfades of mixer channel levels, run on the I/O thread
+
+The box only takes instantaneous levels, so a fade is a series of `*C9`
+writes at a fixed tick rate. Every tick computes all channel levels at
+once from each channel's start level, target and timing, and only
+channels whose byte value changed since the last tick are sent, packed
+into as few bulk frames as fit. With NumPy installed the per-tick work is
+a handful of array operations over the whole channel table; without it
+only the channels still fading are visited in plain Python.
+"""
+import time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from lanbox.commands import set_levels
+from lanbox.mirror import entries
+from lanbox.patch import MIXER_CHANNELS
+from lanbox.protocol import FRAME_END, MAX_PAYLOAD, pack_frames
+
+# Ticks per second
+RATE = 40
+
+
+class VectorFades:
+    """Fade state as NumPy arrays over every channel; index 0 is mixer channel 1"""
+
+    # One `*C9` entry, so changed channels are packed with a single tobytes()
+    ENTRY = numpy.dtype([("channel", ">u2"), ("level", "u1")]) if numpy is not None else None
+
+    def __init__(self, sent):
+        channels = len(sent)
+        self.sent = numpy.frombuffer(sent, numpy.uint8)
+        self.start = self.sent.astype(numpy.float32)
+        self.target = self.start.copy()
+        self.began = numpy.zeros(channels)
+        self.speed = numpy.ones(channels, numpy.float32)
+
+    def _levels(self, now):
+        progress = numpy.clip((now - self.began) * self.speed, 0.0, 1.0).astype(numpy.float32)
+        return self.start + (self.target - self.start) * progress
+
+    def begin(self, indices, targets, now, duration):
+        indices = numpy.asarray(indices, numpy.intp)
+        self.start[indices] = self._levels(now)[indices]
+        self.target[indices] = targets
+        self.began[indices] = now
+        self.speed[indices] = 1.0 / max(duration, 1e-6)
+
+    def lit(self, now):
+        """Indices of channels not at level 0"""
+        return numpy.flatnonzero(self._levels(now) >= 0.5).tolist()
+
+    def hold(self, now):
+        self.start = self._levels(now)
+        self.target = self.start.copy()
+
+    def rollback(self, items, acknowledged):
+        """Forget that items were sent: their channels go back to the acknowledged levels"""
+        indices = numpy.array([channel - 1 for channel, _ in items], numpy.intp)
+        self.sent[indices] = numpy.frombuffer(acknowledged, numpy.uint8)[indices]
+
+    def tick(self, now):
+        """`*C9` frames for channels whose byte value changed, as (frame, items); records them as sent"""
+        levels = (self._levels(now) + 0.5).astype(numpy.uint8)
+        changed = numpy.flatnonzero(levels != self.sent)
+        if not len(changed):
+            return []
+        entries = numpy.empty(len(changed), self.ENTRY)
+        entries["channel"] = changed + 1
+        entries["level"] = levels[changed]
+        self.sent[changed] = entries["level"]
+        per_frame = MAX_PAYLOAD // self.ENTRY.itemsize
+        return [(set_levels.prefix + chunk.tobytes() + FRAME_END, chunk.tolist())
+                for chunk in (entries[start:start + per_frame] for start in range(0, len(entries), per_frame))]
+
+
+class ListFades:
+    """Fallback without NumPy: only channels with a fade in progress are kept"""
+
+    def __init__(self, sent):
+        self.sent = sent
+        self.fades = {}
+
+    def _level(self, index, now):
+        fade = self.fades.get(index)
+        if fade is None:
+            return float(self.sent[index])
+        start, target, began, duration = fade
+        progress = min(1.0, max(0.0, (now - began) / duration))
+        return start + (target - start) * progress
+
+    def begin(self, indices, targets, now, duration):
+        duration = max(duration, 1e-6)
+        for index, target in zip(indices, targets):
+            self.fades[index] = (self._level(index, now), float(target), now, duration)
+
+    def lit(self, now):
+        return [index for index in range(len(self.sent)) if self._level(index, now) >= 0.5]
+
+    def hold(self, now):
+        for index in list(self.fades):
+            level = self._level(index, now)
+            self.fades[index] = (level, level, now, 1.0)
+
+    def rollback(self, items, acknowledged):
+        for channel, level in items:
+            index = channel - 1
+            self.sent[index] = acknowledged[index]
+            if index not in self.fades:
+                # Finished fades are forgotten; keep this one until its level is sent again
+                self.fades[index] = (float(level), float(level), 0.0, 1e-6)
+
+    def tick(self, now):
+        sent = self.sent
+        changed = []
+        for index, (start, target, began, duration) in list(self.fades.items()):
+            progress = min(1.0, max(0.0, (now - began) / duration))
+            level = int(start + (target - start) * progress + 0.5)
+            if level != sent[index]:
+                sent[index] = level
+                changed.append((index + 1, level))
+            if progress >= 1.0:
+                del self.fades[index]
+        return pack_frames(set_levels, changed)
+
+
+class FadeEngine:
+    """Runs fades on a Connection's I/O loop at a fixed tick rate
+
+    fade(), crossfade() and stop() are thread-safe. Starting a fade on a
+    channel that is already fading continues from wherever it is now. If
+    the previous tick's frames have not been acknowledged yet the tick is
+    skipped rather than queued, so a slow link sees fewer, later levels
+    instead of a growing backlog. A frame that fails or gets no reply puts
+    its channels back to their last acknowledged levels, so the next tick
+    sends them again. With a mirror, acknowledged levels are recorded in
+    its level table and fades start from its known levels.
+    """
+
+    def __init__(self, connection, mirror=None, rate=RATE, channels=MIXER_CHANNELS):
+        self.connection = connection
+        self.loop = connection.loop
+        self.mirror = mirror
+        self.period = 1.0 / rate
+        # Levels last sent to the box, indexed from mixer channel 1
+        self.sent = bytearray(channels)
+        if mirror is not None:
+            known = mirror.levels.known
+            for index, level in enumerate(mirror.levels.values[:channels]):
+                if known[index]:
+                    self.sent[index] = level
+        # Levels the box has confirmed; what a failed frame rolls back to
+        self.acknowledged = bytearray(self.sent)
+        self._fades = VectorFades(self.sent) if numpy is not None else ListFades(self.sent)
+        self._until = 0.0
+        self._deadline = 0.0
+        self._timer = None
+        self._unacknowledged = 0
+        self.ticks = 0
+        self.skipped = 0
+        self.frames = 0
+        self.errors = 0
+        # Seconds spent computing and queueing ticks, for judging the CPU budget
+        self.busy = 0.0
+
+    @property
+    def active(self):
+        return self._timer is not None
+
+    def fade(self, levels, duration):
+        """Fade channels to levels ({channel: level} or a table from channel 1) over duration seconds"""
+        self.loop.call_soon(self._begin, self._items(levels), float(duration), False)
+
+    def crossfade(self, levels, duration):
+        """Fade to levels while every other channel that is up fades to 0"""
+        self.loop.call_soon(self._begin, self._items(levels), float(duration), True)
+
+    def stop(self):
+        """Hold every channel at its current level"""
+        self.loop.call_soon(self._stop)
+
+    def _items(self, levels):
+        items = sorted((int(channel), int(level)) for channel, level in entries(levels))
+        for channel, level in items:
+            if not 1 <= channel <= len(self.sent):
+                raise ValueError("Channel {} out of range 1-{}".format(channel, len(self.sent)))
+            if not 0 <= level <= 255:
+                raise ValueError("Level {} out of range 0-255".format(level))
+        return items
+
+    def _begin(self, items, duration, others_out):
+        now = time.monotonic()
+        if others_out:
+            wanted = {channel - 1 for channel, _ in items}
+            items = items + [(index + 1, 0) for index in self._fades.lit(now) if index not in wanted]
+        if not items:
+            return
+        self._fades.begin([channel - 1 for channel, _ in items], [level for _, level in items], now, duration)
+        self._until = max(self._until, now + duration)
+        if self._timer is None:
+            self._deadline = now
+            self._tick()
+
+    def _stop(self):
+        self._fades.hold(time.monotonic())
+        self._until = 0.0
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _tick(self):
+        started = time.monotonic()
+        if self._unacknowledged:
+            self.skipped += 1
+        else:
+            self.ticks += 1
+            for frame, chunk in self._fades.tick(started):
+                self._unacknowledged += 1
+                self.frames += 1
+                self.connection.send(frame).add_done_callback(self._acknowledged(chunk))
+            if started >= self._until:
+                # The final levels are out; nothing is fading any more
+                self._timer = None
+                self.busy += time.monotonic() - started
+                return
+        # Fixed phase: a late tick does not push every later one back
+        self._deadline += self.period
+        now = time.monotonic()
+        if self._deadline < now:
+            self._deadline = now
+        self._timer = self.loop.call_later(self._deadline - now, self._tick)
+        self.busy += now - started
+
+    def _acknowledged(self, items):
+        def done(future):
+            # Replies resolve on the I/O thread, the same one running ticks
+            self._unacknowledged -= 1
+            if future.exception() is not None:
+                self.errors += 1
+                self._fades.rollback(items, self.acknowledged)
+                return
+            for channel, level in items:
+                self.acknowledged[channel - 1] = level
+            if self.mirror is not None:
+                self.mirror.levels.update(items)
+        return done
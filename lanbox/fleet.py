@@ -0,0 +1,175 @@
+"""Drive many LanBoxes at once from a single I/O loop
+
+Every box gets its own Connection, but all of them share one IOLoop thread,
+so a fleet of twenty costs no more threads than a single box. Commands are
+fanned out to every box before waiting on any reply, so a scene change on
+the whole rig takes roughly one round trip.
+"""
+import threading
+import time
+
+from lanbox.ioloop import IOLoop
+from lanbox.connection import Connection, CONNECTED, FAILED, CLOSED
+from lanbox.mirror import Mirror
+
+DEFAULT_PORT = 777
+
+
+def parse_address(address, default_port=DEFAULT_PORT):
+    """Accept 'host', 'host:port' or a (host, port) tuple"""
+    if isinstance(address, tuple):
+        return address
+    host, _, port = address.partition(":")
+    return host, int(port) if port else default_port
+
+
+class BoxResult:
+    """Outcome of one fleet operation on one box"""
+
+    def __init__(self, address):
+        self.address = address
+        self.replies = []
+        self.errors = []
+        self.latency = None
+
+    @property
+    def ok(self):
+        return not self.errors and self.latency is not None
+
+    def __repr__(self):
+        return "<BoxResult {}:{} ok={} latency={}>".format(
+            self.address[0], self.address[1], self.ok, self.latency)
+
+
+class Box:
+    """One member of the fleet: its connection and its own state mirror"""
+
+    def __init__(self, address, connection):
+        self.address = address
+        self.connection = connection
+        self.mirror = Mirror()
+        self.ready = threading.Event()
+        self.error = None
+
+
+class Fleet:
+    """Concurrent connections to N boxes on one IOLoop
+
+    Extra keyword options are passed through to every Connection.
+    """
+
+    def __init__(self, addresses, password="777", timeout=5.0, loop=None, **options):
+        if isinstance(password, str):
+            password = password.encode("ascii")
+        self._own_loop = loop is None
+        self.loop = loop or IOLoop(name="lanbox-fleet")
+        self.timeout = timeout
+        self.boxes = []
+        for address in addresses:
+            host, port = parse_address(address)
+            box = Box((host, port), None)
+            box.connection = Connection(self.loop, host, port, password=password, timeout=timeout,
+                                        handler=self._handler(box), **options)
+            self.boxes.append(box)
+
+    def _handler(self, box):
+        def on_event(event, detail):
+            if event == CONNECTED:
+                box.error = None
+                box.mirror.invalidate()
+                box.ready.set()
+            elif event in (FAILED, CLOSED) and not box.ready.is_set():
+                box.error = detail
+                box.ready.set()
+        return on_event
+
+    def connect(self):
+        """Open every box in parallel; returns {address: error} for boxes that failed"""
+        if self._own_loop and not self.loop.is_alive():
+            self.loop.start()
+        for box in self.boxes:
+            box.connection.open()
+        deadline = time.monotonic() + self.timeout + 1.0
+        failed = {}
+        for box in self.boxes:
+            if not box.ready.wait(max(0.0, deadline - time.monotonic())):
+                box.error = TimeoutError("Timed out connecting to LanBox")
+            if box.error is not None:
+                failed[box.address] = box.error
+        return failed
+
+    @property
+    def connected(self):
+        return [box for box in self.boxes if box.ready.is_set() and box.error is None]
+
+    def _track(self, futures, started, result, done):
+        """Record replies and the time the box's last reply landed"""
+        remaining = [len(futures)]
+        lock = threading.Lock()
+
+        def on_done(future):
+            with lock:
+                remaining[0] -= 1
+                finished = remaining[0] == 0
+            if finished:
+                result.latency = time.perf_counter() - started
+                for f in futures:
+                    if f.exception() is not None:
+                        result.errors.append(f.exception())
+                    else:
+                        result.replies.append(f.result())
+                done()
+
+        if not futures:
+            result.latency = 0.0
+            done()
+        for future in futures:
+            future.add_done_callback(on_done)
+
+    def _run(self, per_box_frames, timeout):
+        timeout = self.timeout * 2 if timeout is None else timeout
+        boxes = self.connected
+        results = {box.address: BoxResult(box.address) for box in self.boxes}
+        for box in self.boxes:
+            if box not in boxes:
+                results[box.address].errors.append(box.error or ConnectionError("Not connected"))
+
+        pending = [len(boxes)]
+        all_done = threading.Event()
+        lock = threading.Lock()
+
+        def box_done():
+            with lock:
+                pending[0] -= 1
+                if pending[0] == 0:
+                    all_done.set()
+
+        if not boxes:
+            all_done.set()
+        # Queue everything on every box before waiting on anything
+        started = time.perf_counter()
+        submissions = [(box, per_box_frames(box)) for box in boxes]
+        for box, futures in submissions:
+            self._track(futures, started, results[box.address], box_done)
+
+        if not all_done.wait(timeout):
+            for result in results.values():
+                if result.latency is None:
+                    result.errors.append(TimeoutError("No reply from LanBox"))
+        return [results[box.address] for box in self.boxes]
+
+    def send(self, frames, timeout=None):
+        """Send the same frames to every connected box; returns a BoxResult per box"""
+        frames = list(frames)
+        return self._run(lambda box: [box.connection.send(frame) for frame in frames], timeout)
+
+    def sync(self, patch=None, gains=None, levels=None, timeout=None):
+        """Bring every box to the same desired state, sending each only its differences"""
+        return self._run(lambda box: box.mirror.sync(box.connection, patch, gains, levels), timeout)
+
+    def close(self):
+        for box in self.boxes:
+            box.connection.handler = None
+            box.connection.close()
+        if self._own_loop:
+            self.loop.stop()
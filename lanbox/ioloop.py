@@ -0,0 +1,126 @@
+"""Selector-based I/O loop that owns every LanBox socket off the GUI thread"""
+import heapq
+import itertools
+import logging
+import selectors
+import socket
+import threading
+import time
+from collections import deque
+
+log = logging.getLogger(__name__)
+
+
+class Timer:
+    """Handle for a callback scheduled with IOLoop.call_later"""
+
+    def __init__(self, deadline, callback, args):
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class IOLoop(threading.Thread):
+    """Single background thread multiplexing sockets, timers and queued calls
+
+    Everything that touches a socket runs on this thread. Other threads hand
+    work over with call_soon(), which is the only thread-safe entry point.
+    """
+
+    def __init__(self, name="lanbox-io"):
+        super().__init__(name=name, daemon=True)
+        self.selector = selectors.DefaultSelector()
+        self._calls = deque()
+        self._timers = []
+        self._sequence = itertools.count()
+        self._running = True
+
+        # Self-pipe so call_soon() can interrupt a blocking select()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self.selector.register(self._wake_r, selectors.EVENT_READ, self._drain_wakeup)
+
+    def call_soon(self, callback, *args):
+        """Run callback(*args) on the loop thread; safe from any thread"""
+        self._calls.append((callback, args))
+        try:
+            self._wake_w.send(b"\0")
+        except (BlockingIOError, OSError):
+            # Pipe already full means a wakeup is pending anyway
+            pass
+
+    def call_later(self, delay, callback, *args):
+        """Schedule callback(*args) after delay seconds; loop thread only"""
+        timer = Timer(time.monotonic() + delay, callback, args)
+        heapq.heappush(self._timers, (timer.deadline, next(self._sequence), timer))
+        return timer
+
+    def in_loop_thread(self):
+        return threading.current_thread() is self
+
+    def stop(self, timeout=2.0):
+        """Stop the loop and wait for the thread to exit"""
+        self.call_soon(self._shutdown)
+        if self.is_alive() and not self.in_loop_thread():
+            self.join(timeout)
+
+    def _shutdown(self):
+        self._running = False
+
+    def _drain_wakeup(self, mask):
+        try:
+            while self._wake_r.recv(4096):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+
+    def _next_timeout(self):
+        if self._calls:
+            return 0
+        while self._timers and self._timers[0][2].cancelled:
+            heapq.heappop(self._timers)
+        if not self._timers:
+            return None
+        return max(0.0, self._timers[0][0] - time.monotonic())
+
+    def _run_timers(self):
+        now = time.monotonic()
+        while self._timers and self._timers[0][0] <= now:
+            timer = heapq.heappop(self._timers)[2]
+            if not timer.cancelled:
+                self._dispatch(timer.callback, timer.args)
+
+    def _run_calls(self):
+        for _ in range(len(self._calls)):
+            callback, args = self._calls.popleft()
+            self._dispatch(callback, args)
+
+    def _dispatch(self, callback, args):
+        # One failing handler must not take the whole I/O thread down
+        try:
+            callback(*args)
+        except Exception:
+            log.exception("Unhandled error in I/O callback %r", callback)
+
+    def run(self):
+        try:
+            while self._running:
+                for key, mask in self.selector.select(self._next_timeout()):
+                    self._dispatch(key.data, (mask,))
+                self._run_timers()
+                self._run_calls()
+        finally:
+            for key in list(self.selector.get_map().values()):
+                if key.fileobj is not self._wake_r:
+                    try:
+                        key.fileobj.close()
+                    except OSError:
+                        pass
+            self.selector.close()
+            self._wake_r.close()
+            self._wake_w.close()
@@ -0,0 +1,428 @@
+"""Append-only, memory-mapped journal of the commands sent to a box
+
+    header   "LCJRNL" version:u16 (8 bytes reserved)
+    records  sequence:u64 time:f64 crc:u32 length:u16 status:u8 (1 byte pad),
+             then the `*xx...#` frame, padded to 8 bytes
+
+Everything is little-endian. A Connection given a Journal appends every
+command that changes state (queries are not recorded) as it first goes
+out, and rewrites the record's status byte in place once the box
+acknowledges or rejects it. The CRC covers everything but the status, so
+a record torn by a crash is recognised and dropped on open; a zero
+sequence marks the end. The file starts at GROW bytes, doubles as needed
+and is written through a mmap, so appending is a memory copy.
+
+snapshot() folds the journal into the least that reproduces the same
+state: rejected and failed commands are dropped, anything before a
+save_configuration the box acknowledged is already in its flash, anything
+before a factory reset is gone, and of the per-channel and per-layer
+settings only the last value of each survives, re-packed in bulk frames.
+compact() rewrites the file as that snapshot, folding on a copy of the
+records so appends are only held up while the new file is swapped in; an
+acknowledged save_configuration triggers one on a background thread.
+replay() pushes the snapshot onto a fresh connection, e.g. after the box
+lost power, and retires each old record only once its copy is
+acknowledged, so an interrupted replay loses nothing.
+"""
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+from lanbox import commands
+from lanbox.protocol import pack_frames, split_frame
+
+MAGIC = b"LCJRNL"
+VERSION = 1
+HEADER = struct.Struct("<6sH8x")
+RECORD = struct.Struct("<QdIHBx")
+SEQUENCE_CRC = struct.Struct("<QdH")
+ALIGN = 8
+GROW = 1024 * 1024
+
+# Record status
+PENDING = 0
+ACKED = 1
+REJECTED = 2
+FAILED = 3
+# Acknowledged again by a later replay, which recorded a fresh copy
+REPLAYED = 4
+
+STATUS_NAMES = {PENDING: "pending", ACKED: "acked", REJECTED: "rejected", FAILED: "failed", REPLAYED: "replayed"}
+# Statuses snapshot() leaves out
+DROPPED = (REJECTED, FAILED, REPLAYED)
+
+# Where the status byte sits within a record
+STATUS_OFFSET = 22
+
+# Settings where only the last value per key matters: opcode -> (entry layout, command re-packing them)
+KEYED = {
+    b"81": (commands.patch_channels.layout, commands.patch_channels),
+    b"82": (commands.set_gains.layout, commands.set_gains),
+    b"C9": (commands.set_levels.layout, commands.set_levels),
+    b"47": (commands.set_mix_mode.layout, commands.set_mix_mode),
+    b"63": (commands.set_transparency.layout, commands.set_transparency),
+    b"4A": (commands.set_layer_priority.layout, commands.set_layer_priority),
+    b"48": (commands.set_layer_name.layout, commands.set_layer_name),
+}
+SAVE = commands.save_configuration.opcode
+RESET = commands.factory_reset.opcode
+
+
+class JournalFormatError(ValueError):
+    """Not a journal file, or one written by an incompatible version"""
+
+
+class Record:
+    """One journaled command"""
+    __slots__ = ("sequence", "time", "status", "frame")
+
+    def __init__(self, sequence, time, status, frame):
+        self.sequence = sequence
+        self.time = time
+        self.status = status
+        self.frame = frame
+
+    def __repr__(self):
+        return "<Record {} {} {!r}>".format(self.sequence, STATUS_NAMES.get(self.status, self.status), self.frame)
+
+
+def default_journal_path():
+    base = os.environ.get("XDG_STATE_HOME", os.path.expanduser("~/.local/state"))
+    return os.path.join(base, "lcopen", "journal")
+
+
+def _padded(size):
+    return (size + ALIGN - 1) // ALIGN * ALIGN
+
+
+def _scan(buffer):
+    """Yield (record, offset) of every intact record in a journal image; frames are views into it"""
+    offset = HEADER.size
+    while offset + RECORD.size <= len(buffer):
+        sequence, when, crc, length, status = RECORD.unpack_from(buffer, offset)
+        start = offset + RECORD.size
+        if not sequence or start + length > len(buffer):
+            return
+        frame = buffer[start:start + length]
+        if zlib.crc32(frame, zlib.crc32(SEQUENCE_CRC.pack(sequence, when, length))) != crc:
+            return
+        yield Record(sequence, when, status, frame), offset
+        offset += _padded(RECORD.size + length)
+
+
+def _fold(image, live, allocate):
+    """Snapshot of a journal image; sequences in live are still in flight and kept as they are
+
+    Records that survive unchanged keep their sequence; a frame re-packed
+    from several records, or from part of one, is a new record and gets
+    its sequence from allocate().
+    """
+    # (position, record): kept records sort by where they were in the journal
+    kept = []
+    keyed = {}
+    for position, (record, _) in enumerate(_scan(image)):
+        status = record.status
+        if status in DROPPED:
+            continue
+        if record.sequence in live:
+            # Still in flight: kept as it is, so its outcome can be recorded
+            kept.append((position, Record(record.sequence, record.time, status, bytes(record.frame))))
+            continue
+        opcode, payload = split_frame(bytes(record.frame))
+        if opcode == SAVE and status == ACKED:
+            kept = [item for item in kept if item[1].sequence in live]
+            keyed.clear()
+            continue
+        if opcode == RESET:
+            kept = [item for item in kept if item[1].sequence in live]
+            keyed.clear()
+        entry = KEYED.get(opcode)
+        if entry is None or len(payload) % entry[0].size:
+            kept.append((position, Record(record.sequence, record.time, status, bytes(record.frame))))
+            continue
+        values = keyed.setdefault(opcode, {})
+        for item in entry[0].iter_unpack(payload):
+            values[item[0]] = (item, position, record)
+
+    for opcode, values in keyed.items():
+        command = KEYED[opcode][1]
+        items = [values[key] for key in sorted(values)]
+        if command.repeat:
+            frames = pack_frames(command, [item for item, _, _ in items])
+        else:
+            frames = [(command(*item), [item]) for item, _, _ in items]
+        sources = {item: (position, record) for item, position, record in items}
+        for frame, chunk in frames:
+            position, latest = max((sources[item] for item in chunk), key=lambda source: source[0])
+            status = ACKED if all(sources[item][1].status == ACKED for item in chunk) else PENDING
+            frame = bytes(frame)
+            sequence = latest.sequence if frame == latest.frame else None
+            kept.append((position, Record(sequence, latest.time, status, frame)))
+    # Folded settings sit where their last write was, so a factory reset still comes first
+    kept.sort(key=lambda item: item[0])
+    records = [record for _, record in kept]
+    for record in records:
+        if record.sequence is None:
+            record.sequence = allocate()
+    return records
+
+
+class Journal:
+    """A journal file, open for appending; thread-safe
+
+    append() returns the record's sequence number, which settle() takes
+    to record the outcome.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or default_journal_path()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        # Held for a whole compaction, so only one runs at a time
+        self._compacting = threading.Lock()
+        self._file = None
+        self._map = None
+        # Offsets of records appended by this process that are still pending
+        self._offsets = {}
+        self._open()
+
+    def _open(self):
+        self._file = open(self.path, "a+b")
+        size = os.fstat(self._file.fileno()).st_size
+        if size == 0:
+            self._file.write(HEADER.pack(MAGIC, VERSION))
+            self._file.flush()
+            size = GROW
+            os.ftruncate(self._file.fileno(), size)
+        if size < HEADER.size:
+            self._release()
+            raise JournalFormatError("File too short for a journal header")
+        self._map = mmap.mmap(self._file.fileno(), size)
+        magic, version = HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            self._release()
+            raise JournalFormatError("Not a journal file")
+        if version != VERSION:
+            self._release()
+            raise JournalFormatError("Unsupported journal version {}".format(version))
+        self.count = 0
+        self.sequence = 0
+        self.end = HEADER.size
+        # Offset of every record, for marking it replayed
+        self._positions = {}
+        for record, offset in _scan(self._map):
+            self.count += 1
+            self.sequence = max(self.sequence, record.sequence)
+            self._positions[record.sequence] = offset
+            self.end = offset + _padded(RECORD.size + len(record.frame))
+        # Wipe a torn record, if any, so the next append starts on a clean end marker
+        tail = min(len(self._map), self.end + RECORD.size)
+        self._map[self.end:tail] = bytes(tail - self.end)
+
+    def _allocate(self):
+        """A fresh sequence number, for a record compaction re-packs"""
+        with self._lock:
+            self.sequence += 1
+            return self.sequence
+
+    def _image(self):
+        """Copy of the records and the in-flight sequences, to fold without holding the lock"""
+        return bytes(self._map[:self.end]), dict(self._offsets)
+
+    # -- Recording -------------------------------------------------------
+
+    def append(self, frame, status=PENDING, when=None, sequence=None):
+        size = _padded(RECORD.size + len(frame))
+        with self._lock:
+            if self.end + size + RECORD.size > len(self._map):
+                self._grow(size + RECORD.size)
+            if sequence is None:
+                sequence = self.sequence + 1
+            self.sequence = max(self.sequence, sequence)
+            when = time.time() if when is None else when
+            length = len(frame)
+            crc = zlib.crc32(frame, zlib.crc32(SEQUENCE_CRC.pack(sequence, when, length)))
+            offset = self.end
+            start = offset + RECORD.size
+            self._map[start:start + length] = frame
+            # The header goes in last, so a record is only there once it is complete
+            RECORD.pack_into(self._map, offset, sequence, when, crc, length, status)
+            self.end = offset + size
+            self.count += 1
+            self._positions[sequence] = offset
+            if status == PENDING:
+                self._offsets[sequence] = offset
+        return sequence
+
+    def settle(self, sequence, status):
+        """Record a pending command's outcome: ACKED, REJECTED or FAILED"""
+        with self._lock:
+            offset = self._offsets.pop(sequence, None)
+            if offset is None:
+                return
+            self._map[offset + STATUS_OFFSET] = status
+            saved = status == ACKED and self._map[offset + RECORD.size + 1:offset + RECORD.size + 3] == SAVE
+        if saved:
+            # The box wrote everything before this to flash, so that part of the journal is
+            # redundant now; settle() runs on the I/O thread, which must not wait for a rewrite
+            threading.Thread(target=self.compact, name="Journal compaction", daemon=True).start()
+
+    def retire(self, sequence):
+        """Mark a record REPLAYED: a replay recorded a fresh, acknowledged copy of it"""
+        with self._lock:
+            offset = self._positions.get(sequence)
+            if offset is not None and sequence not in self._offsets:
+                self._map[offset + STATUS_OFFSET] = REPLAYED
+
+    def _grow(self, needed):
+        size = len(self._map)
+        while size < self.end + needed:
+            size *= 2
+        self._map.close()
+        os.ftruncate(self._file.fileno(), size)
+        self._map = mmap.mmap(self._file.fileno(), size)
+
+    # -- Reading, compaction ---------------------------------------------
+
+    def records(self):
+        """Every record, oldest first"""
+        with self._lock:
+            image, _ = self._image()
+        return [Record(record.sequence, record.time, record.status, bytes(record.frame))
+                for record, _ in _scan(image)]
+
+    def snapshot(self, in_flight=True):
+        """The smallest list of records that leaves the box in the journaled state
+
+        With in_flight=False, commands this process still awaits a reply
+        for are left out.
+        """
+        with self._lock:
+            image, live = self._image()
+        records = _fold(image, live, self._allocate)
+        if not in_flight:
+            records = [record for record in records if record.sequence not in live]
+        return records
+
+    def compact(self):
+        """Rewrite the journal as its snapshot; returns the number of records dropped
+
+        The snapshot is folded and written aside without the lock; only
+        records appended meanwhile, and outcomes recorded meanwhile, are
+        carried over while the new file is swapped in.
+        """
+        with self._compacting:
+            with self._lock:
+                if self._map is None:
+                    return 0
+                before = self.count
+                image, live = self._image()
+            records = _fold(image, live, self._allocate)
+            end = len(image)
+
+            temporary = self.path + ".tmp"
+            f = open(temporary, "w+b")
+            try:
+                f.write(HEADER.pack(MAGIC, VERSION))
+                written = {}
+                for record in records:
+                    length = len(record.frame)
+                    crc = zlib.crc32(record.frame, zlib.crc32(SEQUENCE_CRC.pack(record.sequence, record.time, length)))
+                    written[record.sequence] = f.tell()
+                    f.write(RECORD.pack(record.sequence, record.time, crc, length, record.status))
+                    f.write(record.frame)
+                    f.write(bytes(_padded(RECORD.size + length) - RECORD.size - length))
+
+                with self._lock:
+                    if self._map is None:
+                        # Closed meanwhile
+                        f.close()
+                        os.remove(temporary)
+                        return 0
+                    # Outcomes of in-flight commands, and records retired by a replay, that came in while writing
+                    for sequence, position in written.items():
+                        offset = self._positions.get(sequence)
+                        if offset is None:
+                            continue
+                        status = self._map[offset + STATUS_OFFSET]
+                        if sequence in live or status == REPLAYED:
+                            f.seek(position + STATUS_OFFSET)
+                            f.write(bytes([status]))
+                    f.seek(0, os.SEEK_END)
+                    f.write(self._map[end:self.end])
+                    f.truncate(max(GROW, _padded(f.tell() + RECORD.size)))
+                    f.close()
+                    pending = self._offsets
+                    sequence = self.sequence
+                    self._release()
+                    os.replace(temporary, self.path)
+                    self._open()
+                    self.sequence = max(self.sequence, sequence)
+                    self._offsets = {number: self._positions[number] for number in pending if number in self._positions}
+            finally:
+                f.close()
+            return before - len(records)
+
+    def clear(self):
+        """Forget every record, keeping the sequence numbers going"""
+        with self._lock:
+            self._map[HEADER.size:self.end + RECORD.size] = bytes(self.end + RECORD.size - HEADER.size)
+            self.end = HEADER.size
+            self.count = 0
+            self._offsets.clear()
+            self._positions.clear()
+
+    def sync(self):
+        """Force the journal to disk; appends already survive a crash of the process"""
+        with self._lock:
+            self._map.flush()
+
+    def close(self):
+        # Waits for a running compaction rather than pulling the file from under it
+        with self._compacting, self._lock:
+            self._release()
+
+    def _release(self):
+        if self._map is not None:
+            self._map.flush()
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def replay(connection, journal):
+    """Push a journal's snapshot onto a connection, pipelined; returns (frames, future of the whole)
+
+    The journal is compacted first, so every frame sent is one record. If
+    the connection journals into the same journal, each old record is
+    retired once its replayed copy is acknowledged; anything rejected or
+    lost on the way keeps its old record for the next attempt. Commands
+    still in flight are not sent twice.
+    """
+    # Deferred: connection.py imports this module for the status codes
+    from lanbox.connection import gather
+    journal.compact()
+    records = journal.snapshot(in_flight=False)
+    recorded = getattr(connection, "journal", None) is journal
+
+    def retire(sequence):
+        def done(future):
+            if future.exception() is None:
+                journal.retire(sequence)
+        return done
+
+    futures = []
+    for record in records:
+        future = connection.send(record.frame)
+        if recorded:
+            # Added before gather() adds its own, so retiring is done by the time the whole resolves
+            future.add_done_callback(retire(record.sequence))
+        futures.append(future)
+    return len(records), gather(futures)
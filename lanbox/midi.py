@@ -0,0 +1,303 @@
+"""LanBox over MIDI: the `*xx...#` command stream carried in SysEx messages
+
+MIDI data bytes only have seven bits, so the command stream is packed in
+groups of seven bytes behind a byte holding their high bits. Each message
+is
+
+    F0 <manufacturer> <sequence> <packed stream bytes> F7
+
+with a 7-bit sequence number that lets either side notice a message lost
+on the wire. Messages carry a slice of the stream, not one command each:
+everything queued while the 31.25 kbaud link is busy goes out in as few
+messages as MAX_MESSAGE allows, so the five bytes of framing are paid per
+burst rather than per command. Replies are unpacked incrementally as bytes
+arrive, skipping real-time bytes (clock, active sensing) that may appear
+anywhere, even inside a message.
+
+Any byte stream will do: a raw MIDI device (/dev/snd/midiC1D0,
+/dev/midi1, a virtual port such as snd-virmidi), a serial port or pty, or
+an in-memory loopback() pair for tests. MidiPort adapts one to the socket
+methods Connection uses, so a MidiConnection keeps pipelining, replay and
+reconnects. `lcopen emulator --midi` serves the protocol on a pty.
+"""
+import glob
+import os
+import re
+import selectors
+import socket
+
+from lanbox.connection import Connection, CONNECTING, DISCONNECTED, RECONNECTING
+
+MIDI_BAUDRATE = 31250
+
+SYSEX_START = 0xF0
+SYSEX_END = 0xF7
+# 0x7D is set aside for non-commercial use
+MANUFACTURER = b"\x7d"
+
+# Longest message sent, F0 and F7 included; fits the input buffer of common interfaces
+MAX_MESSAGE = 256
+# Longest message accepted; anything longer is treated as garbage
+MAX_RECEIVE = 8192
+
+# Every status byte ends a SysEx message, except real-time ones (F8-FF)
+STATUS = re.compile(rb"[\x80-\xf7]")
+REALTIME = bytes(range(0xF8, 0x100))
+LOW_BITS = bytes(value & 0x7F for value in range(256))
+
+
+def pack7(data):
+    """Stream bytes as 7-bit MIDI data: each group of up to 7 bytes behind its high bits"""
+    data = bytes(data)
+    out = bytearray()
+    for start in range(0, len(data), 7):
+        group = data[start:start + 7]
+        high = 0
+        for bit, value in enumerate(group):
+            if value & 0x80:
+                high |= 1 << bit
+        out.append(high)
+        out += group.translate(LOW_BITS)
+    return out
+
+
+def unpack7(data):
+    """Inverse of pack7"""
+    out = bytearray()
+    for start in range(0, len(data), 8):
+        high = data[start]
+        group = bytearray(data[start + 1:start + 8])
+        if high:
+            for bit in range(len(group)):
+                if high >> bit & 1:
+                    group[bit] |= 0x80
+        out += group
+    return out
+
+
+class SysExEncoder:
+    """Cuts a byte stream into numbered SysEx messages of at most max_message bytes"""
+
+    def __init__(self, max_message=MAX_MESSAGE):
+        # Framing is F0, manufacturer, sequence and F7; every 8 data bytes carry 7 stream bytes
+        groups = (max_message - len(MANUFACTURER) - 3) // 8
+        if groups < 1:
+            raise ValueError("max_message {} leaves no room for data".format(max_message))
+        self.chunk = groups * 7
+        self.sequence = 0
+        self.messages = 0
+
+    def encode(self, data):
+        out = bytearray()
+        data = bytes(data)
+        for start in range(0, len(data), self.chunk):
+            out.append(SYSEX_START)
+            out += MANUFACTURER
+            out.append(self.sequence)
+            out += pack7(data[start:start + self.chunk])
+            out.append(SYSEX_END)
+            self.sequence = (self.sequence + 1) & 0x7F
+            self.messages += 1
+        return bytes(out)
+
+
+class SysExDecoder:
+    """Incremental decoder: feed() raw MIDI bytes, get back the stream bytes of completed messages
+
+    SysEx from other manufacturers and all channel messages are skipped.
+    Our messages cut short by another status byte count as truncated, and
+    messages missing from the sequence as gaps; the caller decides what a
+    loss means.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self._message = None
+        self._expected = None
+        self.messages = 0
+        self.truncated = 0
+        self.gaps = 0
+
+    @property
+    def lost(self):
+        return self.truncated + self.gaps
+
+    def feed(self, data):
+        out = bytearray()
+        data = bytes(data).translate(None, REALTIME)
+        pos = 0
+        while pos < len(data):
+            if self._message is None:
+                start = data.find(SYSEX_START, pos)
+                if start < 0:
+                    break
+                self._message = bytearray()
+                pos = start + 1
+                continue
+            status = STATUS.search(data, pos)
+            end = len(data) if status is None else status.start()
+            self._message += data[pos:end]
+            if len(self._message) > MAX_RECEIVE:
+                self._message = None
+                pos = end
+                continue
+            if status is None:
+                break
+            if data[end] == SYSEX_END:
+                self._complete(self._message, out)
+                pos = end + 1
+            else:
+                if self._message.startswith(MANUFACTURER):
+                    self.truncated += 1
+                # F0 starts the next message; any other status byte is skipped with its data
+                pos = end if data[end] == SYSEX_START else end + 1
+            self._message = None
+        return bytes(out)
+
+    def _complete(self, message, out):
+        header = len(MANUFACTURER)
+        if len(message) <= header or not message.startswith(MANUFACTURER):
+            return
+        sequence = message[header]
+        if self._expected is not None and sequence != self._expected:
+            self.gaps += 1
+        self._expected = (sequence + 1) & 0x7F
+        self.messages += 1
+        out += unpack7(message[header + 1:])
+
+
+class DeviceStream:
+    """A MIDI device file, opened non-blocking; ttys (serial MIDI, pty) are set raw"""
+
+    def __init__(self, path):
+        self.path = path
+        self.fd = os.open(path, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+        if os.isatty(self.fd):
+            import termios
+            import tty
+            tty.setraw(self.fd)
+            termios.tcflush(self.fd, termios.TCIOFLUSH)
+
+    def fileno(self):
+        return self.fd
+
+    def read(self, size):
+        return os.read(self.fd, size)
+
+    def write(self, data):
+        return os.write(self.fd, data)
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class SocketStream:
+    """One end of an in-memory loopback"""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.sock.setblocking(False)
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def read(self, size):
+        return self.sock.recv(size)
+
+    def write(self, data):
+        return self.sock.send(data)
+
+    def close(self):
+        self.sock.close()
+
+
+def loopback():
+    """Two connected in-memory streams, selectable like a device"""
+    first, second = socket.socketpair()
+    return SocketStream(first), SocketStream(second)
+
+
+def list_devices():
+    """Raw MIDI device files present on this machine"""
+    return sorted(glob.glob("/dev/snd/midiC*D*")) + sorted(glob.glob("/dev/midi*"))
+
+
+class MidiPort:
+    """A byte stream speaking SysEx, with socket-style fileno/recv_into/send/close for Connection
+
+    send() counts stream bytes as sent only once all of their messages are
+    on the wire, so Connection keeps asking to write until they are.
+    Frames queued meanwhile are encoded together on the next call.
+    """
+
+    def __init__(self, stream, max_message=MAX_MESSAGE):
+        self.stream = stream
+        self.encoder = SysExEncoder(max_message)
+        self.decoder = SysExDecoder()
+        self._wire = bytearray()
+        self._taken = 0
+
+    def fileno(self):
+        return self.stream.fileno()
+
+    def recv_into(self, buffer):
+        data = self.stream.read(len(buffer) - MAX_RECEIVE)
+        if not data:
+            return 0
+        lost = self.decoder.lost
+        payload = self.decoder.feed(data)
+        if self.decoder.lost != lost:
+            # The reply stream no longer lines up; reconnecting replays what is unanswered
+            raise ConnectionError("SysEx message lost on the MIDI link")
+        if not payload:
+            # Only clock, sensing or part of a message so far
+            raise BlockingIOError()
+        buffer[:len(payload)] = payload
+        return len(payload)
+
+    def send(self, data):
+        if not self._wire:
+            self._taken = len(data)
+            self._wire += self.encoder.encode(data)
+        del self._wire[:self.stream.write(self._wire)]
+        if self._wire:
+            return 0
+        return self._taken
+
+    def close(self):
+        self.stream.close()
+
+
+class MidiConnection(Connection):
+    """Connection to a LanBox over MIDI SysEx; host is the device, port the MIDI baud rate
+
+    The baud rate is fixed by MIDI and only reported. stream_factory(device)
+    opens the byte stream on every (re)connect; DeviceStream by default.
+    There is no password over MIDI.
+    """
+
+    def __init__(self, loop, device, baudrate=MIDI_BAUDRATE, stream_factory=DeviceStream,
+                 max_message=MAX_MESSAGE, **options):
+        # Reject an unusable message size here rather than on the I/O thread
+        SysExEncoder(max_message)
+        super().__init__(loop, device, baudrate, **options)
+        self.stream_factory = stream_factory
+        self.max_message = max_message
+
+    def _start_connect(self):
+        if self.state not in (DISCONNECTED, RECONNECTING):
+            return
+        self._retry_timer = None
+        self.state = CONNECTING
+        try:
+            self.sock = MidiPort(self.stream_factory(self.host), self.max_message)
+        except OSError as e:
+            self._on_error(e)
+            return
+        self.loop.selector.register(self.sock, selectors.EVENT_READ, self._on_ready)
+        self._interest = selectors.EVENT_READ
+        self._established(b"")
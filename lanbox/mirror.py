@@ -0,0 +1,171 @@
+"""Client-side mirror of the LanBox patch table, gains, mixer levels and layer settings
+
+The mirror remembers what the box is known to hold, so applying a desired
+state only sends channels that actually differ. Entries start out unknown
+(and become unknown again after a reconnect); unknown entries are always
+sent.
+"""
+from array import array
+
+from lanbox.commands import (patch_channels, set_gains, set_levels,
+                             set_mix_mode, set_transparency, set_layer_priority, set_layer_name)
+from lanbox.patch import DMX_CHANNELS, MIXER_CHANNELS
+from lanbox.protocol import pack_frames
+
+LAYERS = 63
+
+
+def entries(desired):
+    """Yield (channel, value) from a mapping or a table indexed from channel 1"""
+    if hasattr(desired, "ndim"):
+        desired = desired.tolist()
+    if hasattr(desired, "items"):
+        return desired.items()
+    return enumerate(desired, 1)
+
+
+class Table:
+    """Flat array of channel values plus a bitmap of which entries are known"""
+
+    def __init__(self, typecode, size):
+        self.values = array(typecode, bytes(array(typecode).itemsize * size))
+        self.known = bytearray(size)
+
+    def __len__(self):
+        return len(self.values)
+
+    def get(self, channel):
+        """Known value of a channel (numbered from 1), or None"""
+        if self.known[channel - 1]:
+            return self.values[channel - 1]
+        return None
+
+    def update(self, items):
+        values, known = self.values, self.known
+        for channel, value in items:
+            values[channel - 1] = value
+            known[channel - 1] = 1
+
+    def diff(self, desired):
+        """(channel, value) pairs of desired that differ from, or are unknown to, the mirror"""
+        values, known = self.values, self.known
+        size = len(values)
+        if isinstance(desired, memoryview) and len(desired) == size and all(known):
+            # A whole table (e.g. mapped from a show file): compare in C first
+            if memoryview(values) == desired:
+                return []
+        changed = []
+        for channel, value in entries(desired):
+            channel, value = int(channel), int(value)
+            if not 1 <= channel <= size:
+                raise ValueError("Channel {} out of range 1-{}".format(channel, size))
+            if not known[channel - 1] or values[channel - 1] != value:
+                changed.append((channel, value))
+        return changed
+
+    def invalidate(self):
+        self.known[:] = bytes(len(self.known))
+
+
+class NameTable:
+    """Like Table, for short byte strings such as layer names; None is unknown"""
+
+    def __init__(self, size):
+        self.values = [None] * size
+
+    def __len__(self):
+        return len(self.values)
+
+    def get(self, channel):
+        return self.values[channel - 1]
+
+    def update(self, items):
+        for channel, value in items:
+            self.values[channel - 1] = bytes(value)
+
+    def diff(self, desired):
+        values = self.values
+        changed = []
+        for channel, value in entries(desired):
+            channel, value = int(channel), bytes(value)
+            if not 1 <= channel <= len(values):
+                raise ValueError("Channel {} out of range 1-{}".format(channel, len(values)))
+            if values[channel - 1] != value:
+                changed.append((channel, value))
+        return changed
+
+    def invalidate(self):
+        self.values = [None] * len(self.values)
+
+
+class Mirror:
+    """Last known patch (DMX -> mixer channel), gains, mixer levels and layer settings of one box
+
+    Layer tables are indexed by layer number (1-63).
+    """
+
+    def __init__(self):
+        self.patch = Table("H", DMX_CHANNELS)
+        self.gains = Table("B", DMX_CHANNELS)
+        self.levels = Table("B", MIXER_CHANNELS)
+        self.mix_modes = Table("B", LAYERS)
+        self.transparencies = Table("B", LAYERS)
+        self.priorities = Table("B", LAYERS)
+        self.names = NameTable(LAYERS)
+
+    def invalidate(self):
+        """Forget everything, e.g. after reconnecting to a box that may have changed"""
+        for table in (self.patch, self.gains, self.levels,
+                      self.mix_modes, self.transparencies, self.priorities, self.names):
+            table.invalidate()
+
+    def plan(self, patch=None, gains=None, levels=None,
+             mix_modes=None, transparencies=None, priorities=None, names=None):
+        """Frames needed to bring the box to the desired state, with their entries
+
+        Returns a list of (table, frame, items) covering only changed channels.
+        Channel tables go out in bulk frames; layer settings have no bulk
+        form, so each changed layer costs one frame.
+        """
+        plan = []
+        for table, command, desired in (
+                (self.patch, patch_channels, patch),
+                (self.gains, set_gains, gains),
+                (self.levels, set_levels, levels)):
+            if desired is None:
+                continue
+            for full_command, items in pack_frames(command, table.diff(desired)):
+                plan.append((table, full_command, items))
+        for table, command, desired in (
+                (self.mix_modes, set_mix_mode, mix_modes),
+                (self.transparencies, set_transparency, transparencies),
+                (self.priorities, set_layer_priority, priorities),
+                (self.names, set_layer_name, names)):
+            if desired is None:
+                continue
+            for layer, value in table.diff(desired):
+                plan.append((table, command(layer, value), [(layer, value)]))
+        return plan
+
+    def sync(self, connection, patch=None, gains=None, levels=None,
+             mix_modes=None, transparencies=None, priorities=None, names=None, batch=False):
+        """Send only what differs; each frame updates the mirror once acknowledged
+
+        With batch=True the frames go out as one Connection.send_batch, in a
+        single flush. Returns the list of reply futures, one per frame sent.
+        """
+        plan = self.plan(patch, gains, levels, mix_modes, transparencies, priorities, names)
+        if batch:
+            futures = connection.send_batch([full_command for _, full_command, _ in plan])
+        else:
+            futures = [connection.send(full_command) for _, full_command, _ in plan]
+        for (table, _, items), future in zip(plan, futures):
+            future.add_done_callback(_commit_on_ack(table, items))
+        return futures
+
+
+def _commit_on_ack(table, items):
+    def done(future):
+        if future.exception() is None:
+            table.update(items)
+    return done
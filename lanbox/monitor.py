@@ -0,0 +1,84 @@
+"""Ring buffer of recent mixer-level frames for the live level monitor
+
+Frames are snapshots of a shared level buffer (the UDP receiver's levels,
+or the mirror's level table when values come from batched reads). Each
+capture reports which channels changed since the previous frame, so views
+only repaint what moved.
+"""
+import time
+from array import array
+
+from lanbox.patch import MIXER_CHANNELS
+
+# Granularity of the change scan; unchanged blocks are skipped with one compare
+BLOCK = 64
+
+
+class LevelHistory:
+    """Fixed-size ring of channel-level frames, stored in one flat bytearray"""
+
+    def __init__(self, channels=MIXER_CHANNELS, depth=128):
+        self.channels = channels
+        self.depth = depth
+        self.frames = bytearray(channels * depth)
+        self.times = array("d", bytes(8 * depth))
+        self.captured = 0
+        self._view = memoryview(self.frames)
+
+    def __len__(self):
+        return min(self.captured, self.depth)
+
+    def _slot(self, index):
+        offset = (index % self.depth) * self.channels
+        return offset, offset + self.channels
+
+    def capture(self, source, timestamp=None):
+        """Copy the source buffer into the next slot; return changed channel indices
+
+        Indices are 0-based (index 0 is mixer channel 1). The first capture
+        reports every channel as changed; channels past the end of a short
+        source read as 0.
+        """
+        start, end = self._slot(self.captured)
+        frames = self.frames
+        # Never resize: frames is exported through _view. A short source (a partial mirror) reads as zeros
+        size = min(len(source), self.channels)
+        frames[start:start + size] = source[:size]
+        frames[start + size:end] = bytes(self.channels - size)
+        self.times[self.captured % self.depth] = time.monotonic() if timestamp is None else timestamp
+        self.captured += 1
+
+        if self.captured == 1:
+            return range(self.channels)
+        prev_start, _ = self._slot(self.captured - 2)
+        if frames[start:end] == frames[prev_start:prev_start + self.channels]:
+            return []
+
+        changed = []
+        for block in range(0, self.channels, BLOCK):
+            a = start + block
+            b = prev_start + block
+            size = min(BLOCK, self.channels - block)
+            if frames[a:a + size] == frames[b:b + size]:
+                continue
+            for i in range(size):
+                if frames[a + i] != frames[b + i]:
+                    changed.append(block + i)
+        return changed
+
+    def latest(self):
+        """Most recent frame as a read-only memoryview, or None before the first capture"""
+        return self.frame(0)
+
+    def frame(self, age):
+        """Frame captured `age` captures ago (0 is the newest)"""
+        if age >= len(self):
+            return None
+        start, end = self._slot(self.captured - 1 - age)
+        return self._view[start:end].toreadonly()
+
+    def series(self, channel):
+        """Values of one channel (numbered from 1) from oldest to newest frame"""
+        count = len(self)
+        first = self.captured - count
+        return [self.frames[self._slot(i)[0] + channel - 1] for i in range(first, self.captured)]
@@ -0,0 +1,68 @@
+"""Bulk DMX patching: pack whole patch tables into as few `*81` frames as possible"""
+from lanbox.commands import patch_channels
+from lanbox.protocol import MAX_PAYLOAD, pack_frames
+
+DMX_CHANNELS = 512
+MIXER_CHANNELS = 3072
+
+
+def patch_pairs(patch):
+    """Normalise a patch description into a flat [dmx1, cha1, dmx2, cha2, ...] list
+
+    Accepts a {dmx: mixer} mapping, an iterable of (dmx, mixer) pairs, or a
+    flat table indexed by DMX channel (entry 0 is DMX 1), including NumPy
+    arrays of either shape.
+    """
+    if hasattr(patch, "ndim"):
+        # NumPy array: 1-D is a patch table, N x 2 is a list of pairs
+        if patch.ndim == 1:
+            patch = patch.tolist()
+        else:
+            patch = [tuple(row) for row in patch.tolist()]
+    if hasattr(patch, "items"):
+        patch = sorted(patch.items())
+
+    flat = []
+    for index, entry in enumerate(patch):
+        if isinstance(entry, (tuple, list)):
+            dmx, mixer = entry
+        else:
+            dmx, mixer = index + 1, entry
+        dmx, mixer = int(dmx), int(mixer)
+        if not 1 <= dmx <= DMX_CHANNELS:
+            raise ValueError("DMX channel {} out of range 1-{}".format(dmx, DMX_CHANNELS))
+        if not 0 <= mixer <= MIXER_CHANNELS:
+            raise ValueError("Mixer channel {} out of range 0-{}".format(mixer, MIXER_CHANNELS))
+        flat.append(dmx)
+        flat.append(mixer)
+    return flat
+
+
+def patch_frames(patch, max_payload=MAX_PAYLOAD):
+    """Encode a patch as the minimum number of maximally sized `*81` frames
+
+    Frames are memoryview slices of one buffer, packed by
+    protocol.pack_frames like every other bulk command.
+    """
+    flat = patch_pairs(patch)
+    pairs = list(zip(flat[0::2], flat[1::2]))
+    return [frame for frame, _ in pack_frames(patch_channels, pairs, max_payload)]
+
+
+def read_patch_file(path):
+    """Read a patch file of `dmx mixer` (or `dmx,mixer`) lines into a dict
+
+    Blank lines and anything after a `#` or `;` are ignored.
+    """
+    patch = {}
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.split("#", 1)[0].split(";", 1)[0].replace(",", " ").strip()
+            if not line:
+                continue
+            fields = line.split()
+            if len(fields) != 2:
+                raise ValueError("{}:{}: expected 'dmx mixer', got {!r}".format(
+                    path, line_number, line))
+            patch[int(fields[0])] = int(fields[1])
+    return patch
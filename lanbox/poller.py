@@ -0,0 +1,173 @@
+"""Adaptive status poller: every layer's `*49`, optionally patch and gains, swept in the background
+
+Each sweep queues all of its requests at once so they are pipelined, and
+runs on the connection's I/O thread. The interval between sweeps adapts:
+it halves while sweeps keep finding changes and stretches while nothing
+moves, but never drops below the sweep's own round trip divided by
+DUTY, so polling can only take that share of the link. Only fields that
+changed since the previous sweep are handed to the handler.
+"""
+import time
+
+from lanbox import commands
+from lanbox.mirror import LAYERS
+
+# Largest share of the link's time a poller may keep busy
+DUTY = 0.25
+# Interval growth per sweep that found nothing new
+STRETCH = 1.5
+
+LAYER_FIELDS = ("mix_mode", "transparency", "priority", "cue_list", "step", "name")
+
+
+class StatusPoller:
+    """Sweeps layer status (and optional patch/gain ranges) on a Connection's I/O loop
+
+    handler(changes) runs on the I/O thread after every sweep that found
+    something new, with changes holding only what changed:
+
+        {"layers": {layer: {field: value}}, "patch": {dmx: channel}, "gains": {dmx: gain}}
+
+    Sections without changes are left out; the first sweep reports
+    everything. start(), stop(), forget() and poll_now() are thread-safe. With a
+    mirror, every value read is recorded there.
+    """
+
+    def __init__(self, connection, handler=None, mirror=None, layers=range(1, LAYERS + 1),
+                 patch=(), gains=(), min_interval=0.1, max_interval=5.0):
+        self.connection = connection
+        self.loop = connection.loop
+        self.handler = handler
+        self.mirror = mirror
+        self.layers = list(layers)
+        self.patch = list(patch)
+        self.gains = list(gains)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        # Last values read, per section and number
+        self.values = {"layers": {}, "patch": {}, "gains": {}}
+        self._timer = None
+        self._running = False
+        self._sweeping = False
+        self.sweeps = 0
+        self.errors = 0
+        self.changes = 0
+        # Seconds from queueing a sweep to its last reply
+        self.sweep_time = 0.0
+
+    @property
+    def active(self):
+        return self._running
+
+    def start(self):
+        self.loop.call_soon(self._start)
+
+    def stop(self):
+        self.loop.call_soon(self._stop)
+
+    def forget(self):
+        """Drop what was read, e.g. after a reconnect; the next sweep reports everything again"""
+        self.loop.call_soon(self.values.update, {"layers": {}, "patch": {}, "gains": {}})
+
+    def poll_now(self):
+        """Sweep right away, unless a sweep is already under way; works while stopped too"""
+        self.loop.call_soon(self._poll_now)
+
+    def _start(self):
+        if not self._running:
+            self._running = True
+            self.interval = self.min_interval
+            self._poll_now()
+
+    def _stop(self):
+        self._running = False
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _poll_now(self):
+        if self._sweeping:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._sweep()
+
+    def _sweep(self):
+        self._timer = None
+        self._sweeping = True
+        send = self.connection.send_command
+        requests = [("layers", layer, send(commands.get_layer_status, layer)) for layer in self.layers]
+        requests += [("patch", dmx, send(commands.get_patch, dmx)) for dmx in self.patch]
+        requests += [("gains", dmx, send(commands.get_gain, dmx)) for dmx in self.gains]
+        started = time.monotonic()
+        remaining = [len(requests)]
+
+        def done(_):
+            # Replies resolve on the I/O thread, the same one running sweeps
+            remaining[0] -= 1
+            if not remaining[0]:
+                self._finish(requests, time.monotonic() - started)
+
+        for _, _, future in requests:
+            future.add_done_callback(done)
+        if not requests:
+            self._finish(requests, 0.0)
+
+    def _finish(self, requests, elapsed):
+        self._sweeping = False
+        self.sweeps += 1
+        self.sweep_time = elapsed
+        changes = {}
+        failed = False
+        for section, number, future in requests:
+            if future.exception() is not None:
+                failed = True
+                continue
+            reply = future.result()
+            if section == "layers":
+                value = dict(zip(LAYER_FIELDS, reply[:5] + (reply[5].rstrip(b"\0"),)))
+                known = self.values["layers"].get(number, {})
+                changed = {field: item for field, item in value.items() if known.get(field) != item}
+                if not changed:
+                    continue
+            else:
+                value = changed = reply[0]
+                if self.values[section].get(number) == value:
+                    continue
+            self.values[section][number] = value
+            changes.setdefault(section, {})[number] = changed
+        if failed:
+            self.errors += 1
+        if changes:
+            self.changes += sum(len(section) for section in changes.values())
+            self._record(changes)
+            if self.handler is not None:
+                self.handler(changes)
+        self._adapt(bool(changes), failed)
+        if self._running:
+            self._timer = self.loop.call_later(self.interval, self._sweep)
+
+    def _adapt(self, changed, failed):
+        if changed:
+            interval = self.interval / 2
+        elif failed:
+            # The link is down or struggling; back right off
+            interval = self.max_interval
+        else:
+            interval = self.interval * STRETCH
+        floor = max(self.min_interval, self.sweep_time / DUTY)
+        self.interval = min(self.max_interval, max(floor, interval))
+
+    def _record(self, changes):
+        mirror = self.mirror
+        if mirror is None:
+            return
+        for layer, changed in changes.get("layers", {}).items():
+            for field, table in (("mix_mode", mirror.mix_modes), ("transparency", mirror.transparencies),
+                                 ("priority", mirror.priorities), ("name", mirror.names)):
+                if field in changed:
+                    table.update([(layer, changed[field])])
+        mirror.patch.update(changes.get("patch", {}).items())
+        mirror.gains.update(changes.get("gains", {}).items())
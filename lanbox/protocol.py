@@ -0,0 +1,239 @@
+"""LanBox `*xx...#` command framing and incremental reply parsing
+
+Commands are framed as `*` + two ASCII hex opcode characters + binary
+payload + `#`. The box answers every command in the order it was received:
+
+    *OP<reply payload>#   command executed (payload empty for writes)
+    ?OP#                  command rejected
+
+Payloads are binary, so `#` and `?` may legitimately appear inside them.
+Replies are therefore parsed by length, using the reply layout of the
+request they answer rather than by scanning for terminators.
+"""
+import struct
+
+FRAME_START = b"*"
+FRAME_END = b"#"
+REPLY_ERROR = b"?"
+
+# Largest payload the LanBox accepts in one command frame
+MAX_PAYLOAD = 256
+
+# Reply payload layouts for commands that return data
+LAYER_STATUS = struct.Struct(">BBBHB15s")  # mix mode, transparency, priority, cue list, step, name
+PATCH = struct.Struct(">H")                # mixer channel patched to the DMX channel
+GAIN = struct.Struct(">B")                 # gain of the DMX channel
+SYSTEM_INFO = struct.Struct(">BBH")        # firmware major, minor, mixer channel count
+CUE_LIST_SIZE = struct.Struct(">H")        # number of steps in the cue list
+CUE_STEP = struct.Struct(">BHBH")          # action, channel, value, fade time in 1/10 s
+CUE_LIST_DIGEST = struct.Struct(">HI")     # number of steps, CRC-32 of the packed steps
+
+REPLY_LAYOUTS = {
+    b"49": LAYER_STATUS,
+    b"80": PATCH,
+    b"B3": SYSTEM_INFO,
+    b"A6": CUE_LIST_SIZE,
+    b"A7": CUE_STEP,
+    b"A8": CUE_LIST_DIGEST,
+}
+
+
+class ProtocolError(Exception):
+    """The reply stream no longer lines up with the requests in flight"""
+
+
+class CommandRejected(Exception):
+    """The LanBox answered a command with `?`"""
+
+
+def frame(opcode, payload=b""):
+    return FRAME_START + opcode + payload + FRAME_END
+
+
+class Command:
+    """One entry of the command table: opcode, request layout and reply layout
+
+    The whole frame of a fixed-size command, `*`, opcode and `#` included,
+    is one precompiled Struct, so encoding is a single pack() call, or a
+    pack_into() straight into a caller's buffer. Commands with repeat=True
+    carry any number of layout entries and are encoded with pack_frames().
+    """
+    __slots__ = ("name", "opcode", "layout", "reply", "repeat", "prefix", "frame_struct", "size")
+
+    def __init__(self, name, opcode, layout="", reply=None, repeat=False):
+        self.name = name
+        self.opcode = opcode
+        self.layout = struct.Struct(">" + layout)
+        self.reply = reply
+        self.repeat = repeat
+        self.prefix = FRAME_START + opcode
+        self.frame_struct = None if repeat else struct.Struct(">3s{}c".format(layout))
+        self.size = None if repeat else self.frame_struct.size
+
+    def __repr__(self):
+        return "<Command {} *{}>".format(self.name, self.opcode.decode("ascii"))
+
+    def __call__(self, *args):
+        """Encode one complete frame"""
+        return self.frame_struct.pack(self.prefix, *args, FRAME_END)
+
+    def pack_into(self, buffer, offset, *args):
+        """Encode one frame into buffer at offset; returns the offset just past it"""
+        self.frame_struct.pack_into(buffer, offset, self.prefix, *args, FRAME_END)
+        return offset + self.size
+
+
+class FrameBuffer:
+    """Reusable output buffer that frames are packed straight into
+
+    Bytes between start and end are waiting to be written. The space is
+    reused once they have been consumed, so a steady stream of commands
+    keeps writing into the same memory instead of allocating per frame.
+    """
+
+    def __init__(self, size=65536):
+        self._buffer = bytearray(size)
+        self._view = memoryview(self._buffer)
+        self.start = 0
+        self.end = 0
+
+    def __len__(self):
+        return self.end - self.start
+
+    def _reserve(self, size):
+        if self.end + size <= len(self._buffer):
+            return
+        pending = self.end - self.start
+        if pending + size <= len(self._buffer):
+            # Slide the unwritten tail to the front
+            self._buffer[:pending] = self._buffer[self.start:self.end]
+        else:
+            grown = bytearray(max(2 * len(self._buffer), pending + size))
+            grown[:pending] = self._view[self.start:self.end]
+            self._view.release()
+            self._buffer = grown
+            self._view = memoryview(grown)
+        self.start, self.end = 0, pending
+
+    def pack(self, command, args):
+        """Append one frame of a fixed-size command"""
+        end = self.end + command.size
+        if end > len(self._buffer):
+            self._reserve(command.size)
+            end = self.end + command.size
+        command.frame_struct.pack_into(self._buffer, self.end, command.prefix, *args, FRAME_END)
+        self.end = end
+
+    def write(self, data):
+        """Append an already encoded frame"""
+        size = len(data)
+        self._reserve(size)
+        self._buffer[self.end:self.end + size] = data
+        self.end += size
+
+    def tail(self, size):
+        """Copy of the last size bytes appended, e.g. the frame pack() just wrote"""
+        return bytes(self._view[self.end - size:self.end])
+
+    def pending(self):
+        """Memoryview of everything not yet consumed; release it before the next append"""
+        return self._view[self.start:self.end]
+
+    def consume(self, size):
+        self.start += size
+        if self.start >= self.end:
+            self.start = self.end = 0
+
+    def clear(self):
+        self.start = self.end = 0
+
+
+def pack_frames(command, items, max_payload=MAX_PAYLOAD):
+    """Pack repeated entries (e.g. DMX1 GAIN1 DMX2 GAIN2 ...) into as few frames as fit
+
+    All frames are packed into one buffer and returned as memoryview
+    slices of it, as a list of (frame, items) so callers know what each
+    frame carried.
+    """
+    entry = command.layout
+    per_frame = max(1, max_payload // entry.size)
+    items = list(items)
+    count = -(-len(items) // per_frame)
+    buffer = bytearray(len(items) * entry.size + count * (len(command.prefix) + 1))
+    view = memoryview(buffer)
+    frames = []
+    offset = 0
+    for start in range(0, len(items), per_frame):
+        chunk = items[start:start + per_frame]
+        begin = offset
+        buffer[offset:offset + 3] = command.prefix
+        offset += 3
+        for item in chunk:
+            entry.pack_into(buffer, offset, *item)
+            offset += entry.size
+        buffer[offset] = FRAME_END[0]
+        offset += 1
+        frames.append((view[begin:offset], chunk))
+    return frames
+
+
+def split_frame(full_command):
+    """Return (opcode, payload) of a single `*xx...#` frame; payload is a memoryview"""
+    if full_command[:1] != FRAME_START or full_command[-1:] != FRAME_END or len(full_command) < 4:
+        raise ValueError("Not a LanBox command frame: {!r}".format(bytes(full_command)))
+    return bytes(full_command[1:3]), memoryview(full_command)[3:-1]
+
+
+def reply_layout(opcode, payload):
+    """Struct describing the reply payload of a command, or None for plain acks
+
+    Only the payload's length is looked at, so a memoryview slice will do.
+    """
+    # *82 doubles as Get Gain when only the 16bit DMX channel is given
+    if opcode == b"82" and len(payload) == 2:
+        return GAIN
+    return REPLY_LAYOUTS.get(opcode)
+
+
+class ReplyParser:
+    """Accumulates received bytes and cuts them into replies on demand"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        self.buffer += data
+
+    def next_reply(self, opcode, layout):
+        """Parse the reply to the oldest request in flight
+
+        Returns None until the whole reply has arrived, otherwise the
+        decoded reply tuple (empty for plain acks). Raises
+        CommandRejected for `?` replies and ProtocolError on garbage.
+        """
+        buf = self.buffer
+        if len(buf) < 1:
+            return None
+        status = buf[:1]
+        if status == REPLY_ERROR:
+            if len(buf) < 4:
+                return None
+            self._check(buf, opcode, 4)
+            del buf[:4]
+            raise CommandRejected("LanBox rejected command *{}".format(opcode.decode("ascii")))
+        if status != FRAME_START:
+            raise ProtocolError("Unexpected reply byte {!r}".format(bytes(status)))
+
+        size = layout.size if layout is not None else 0
+        total = 4 + size
+        if len(buf) < total:
+            return None
+        self._check(buf, opcode, total)
+        result = layout.unpack_from(buf, 3) if layout is not None else ()
+        del buf[:total]
+        return result
+
+    def _check(self, buf, opcode, total):
+        if buf[1:3] != opcode or buf[total - 1:total] != FRAME_END:
+            raise ProtocolError("Reply {!r} does not answer *{}".format(
+                bytes(buf[:total]), opcode.decode("ascii")))
@@ -0,0 +1,109 @@
+"""Named layer scenes: mix mode, transparency, priority and name of all 63 layers
+
+A scene is captured with one pipelined `*49` per layer and recalled as a
+single transaction: it is diffed against the mirror, every frame that
+differs is queued with Connection.send_batch so the whole changeover
+leaves in one flush, and the recall is confirmed once all of them are
+acknowledged. Scenes are kept by name in a small JSON file.
+"""
+import json
+import os
+
+from lanbox import commands
+from lanbox.connection import gather
+from lanbox.mirror import LAYERS
+
+
+class LayerScene:
+    """Settings of every layer; each table is indexed from layer 1, names are bytes"""
+
+    def __init__(self, name, mix_modes, transparencies, priorities, names):
+        self.name = name
+        self.mix_modes = list(mix_modes)
+        self.transparencies = list(transparencies)
+        self.priorities = list(priorities)
+        self.names = [bytes(value) for value in names]
+        for table in (self.mix_modes, self.transparencies, self.priorities, self.names):
+            if len(table) != LAYERS:
+                raise ValueError("A scene needs all {} layers, got {}".format(LAYERS, len(table)))
+
+    def to_dict(self):
+        return {"mix_modes": self.mix_modes, "transparencies": self.transparencies,
+                "priorities": self.priorities, "names": [value.decode("latin-1") for value in self.names]}
+
+    @classmethod
+    def from_dict(cls, name, data):
+        return cls(name, data["mix_modes"], data["transparencies"], data["priorities"],
+                   [commands.layer_name(value) for value in data["names"]])
+
+
+def capture_scene(connection, name, timeout=30.0, mirror=None):
+    """Read every layer of a box into a LayerScene, all requests pipelined
+
+    With a mirror, what was read is recorded there too, so recalling a
+    scene next only sends what differs.
+    """
+    futures = [connection.send_command(commands.get_layer_status, layer) for layer in range(1, LAYERS + 1)]
+    status = [future.result(timeout) for future in futures]
+    scene = LayerScene(name, [reply[0] for reply in status], [reply[1] for reply in status],
+                       [reply[2] for reply in status], [reply[5].rstrip(b"\0") for reply in status])
+    if mirror is not None:
+        for table, values in ((mirror.mix_modes, scene.mix_modes), (mirror.transparencies, scene.transparencies),
+                              (mirror.priorities, scene.priorities), (mirror.names, scene.names)):
+            table.update(enumerate(values, 1))
+    return scene
+
+
+def recall_scene(connection, mirror, scene):
+    """Send what differs from the mirror as one batch; returns (frames sent, future of the whole)
+
+    The future resolves once every frame is acknowledged, or fails with
+    the first rejection. Acknowledged frames update the mirror either way.
+    """
+    futures = mirror.sync(connection, mix_modes=scene.mix_modes, transparencies=scene.transparencies,
+                          priorities=scene.priorities, names=scene.names, batch=True)
+    return len(futures), gather(futures)
+
+
+def default_scene_path():
+    base = os.environ.get("XDG_CONFIG_HOME", os.path.expanduser("~/.config"))
+    return os.path.join(base, "lcopen", "scenes.json")
+
+
+class SceneBook:
+    """Scenes by name, stored as one JSON file"""
+
+    def __init__(self, path=None):
+        self.path = path or default_scene_path()
+        self.scenes = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            self.scenes = {name: LayerScene.from_dict(name, entry) for name, entry in data.items()}
+
+    def names(self):
+        return sorted(self.scenes)
+
+    def get(self, name):
+        if name not in self.scenes:
+            raise ValueError("No layer scene named '{}'".format(name))
+        return self.scenes[name]
+
+    def put(self, scene):
+        self.scenes[scene.name] = scene
+        self.save()
+
+    def remove(self, name):
+        self.get(name)
+        del self.scenes[name]
+        self.save()
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Written aside and renamed, so a crash never leaves half a file
+        temporary = self.path + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump({name: scene.to_dict() for name, scene in self.scenes.items()}, f, indent=1, sort_keys=True)
+        os.replace(temporary, self.path)
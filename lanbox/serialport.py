@@ -0,0 +1,101 @@
+"""LanBox over a serial line: a raw termios port driven by the same Connection
+
+SerialPort opens and configures the device (raw 8N1, no flow control,
+non-blocking) and offers the few socket methods Connection uses, so a
+SerialConnection gets pipelining, the reusable receive and send buffers,
+replay and reconnects unchanged. Frames queued while the slow line is
+still busy accumulate in the send buffer and leave in one write once the
+port drains. There is no password over serial.
+
+POSIX only. Anything that behaves like a tty works, including a
+pseudo-terminal pair: `lcopen emulator --serial` serves one.
+"""
+import fcntl
+import os
+import selectors
+import termios
+
+from lanbox.connection import Connection, CONNECTING, DISCONNECTED, RECONNECTING
+
+DEFAULT_BAUDRATE = 38400
+
+BAUDRATES = {rate: getattr(termios, "B{}".format(rate))
+             for rate in (9600, 19200, 38400, 57600, 115200, 230400)
+             if hasattr(termios, "B{}".format(rate))}
+
+
+def check_baudrate(baudrate):
+    if baudrate not in BAUDRATES:
+        raise ValueError("Unsupported baud rate {} (one of {})".format(
+            baudrate, ", ".join(str(rate) for rate in sorted(BAUDRATES))))
+
+
+class SerialPort:
+    """Non-blocking raw serial device with socket-style fileno/recv_into/send/close"""
+
+    def __init__(self, path, baudrate=DEFAULT_BAUDRATE):
+        check_baudrate(baudrate)
+        self.path = path
+        self.baudrate = baudrate
+        self.fd = os.open(path, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+        try:
+            self._configure()
+        except (OSError, termios.error) as e:
+            os.close(self.fd)
+            raise OSError("{}: not a usable serial port ({})".format(path, e))
+
+    def _configure(self):
+        iflag, oflag, cflag, lflag, ispeed, ospeed, cc = termios.tcgetattr(self.fd)
+        # Raw 8N1: no parity, one stop bit, no flow control, no line editing or translation
+        iflag = termios.IGNBRK
+        oflag = 0
+        cflag = termios.CS8 | termios.CREAD | termios.CLOCAL
+        lflag = 0
+        cc[termios.VMIN] = 0
+        cc[termios.VTIME] = 0
+        speed = BAUDRATES[self.baudrate]
+        termios.tcsetattr(self.fd, termios.TCSANOW, [iflag, oflag, cflag, lflag, speed, speed, cc])
+        termios.tcflush(self.fd, termios.TCIOFLUSH)
+        if hasattr(termios, "TIOCEXCL"):
+            # Keep other programs from opening the port underneath us
+            fcntl.ioctl(self.fd, termios.TIOCEXCL)
+
+    def fileno(self):
+        return self.fd
+
+    def recv_into(self, buffer):
+        return os.readv(self.fd, [buffer])
+
+    def send(self, data):
+        return os.write(self.fd, data)
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class SerialConnection(Connection):
+    """Connection to a LanBox on a serial port; host is the device path, port the baud rate
+
+    A port that cannot be opened at first fails the connection; a port that
+    goes away later (a USB adapter pulled out) is reopened with backoff.
+    """
+
+    def __init__(self, loop, path, baudrate=DEFAULT_BAUDRATE, **options):
+        check_baudrate(baudrate)
+        super().__init__(loop, path, baudrate, **options)
+
+    def _start_connect(self):
+        if self.state not in (DISCONNECTED, RECONNECTING):
+            return
+        self._retry_timer = None
+        self.state = CONNECTING
+        try:
+            self.sock = SerialPort(self.host, self.port)
+        except OSError as e:
+            self._on_error(e)
+            return
+        self.loop.selector.register(self.sock, selectors.EVENT_READ, self._on_ready)
+        self._interest = selectors.EVENT_READ
+        self._established(b"")
@@ -0,0 +1,253 @@
+"""Versioned binary show files: a whole box setup in fixed-layout sections
+
+    header   "LCSHOW" version:u16 sections:u16 (6 bytes reserved)
+    table    per section: tag:4s offset:u32 length:u32
+    PTCH     512 x uint16  mixer channel patched to each DMX channel
+    GAIN     512 x uint8   gain of each DMX channel
+    LAYR     3 x 63 x uint8  mix modes, then transparencies, then priorities
+    CUES     count:u16, per list (number:u16 steps:u16 offset:u32), then the
+             packed `*A7` step records of every list
+
+Header, section table, PTCH and the cue directory are little-endian; step
+records keep the wire layout so their CRC matches the box's `*A8` digest.
+Sections start on 8-byte boundaries, so a loaded show is just typed
+memoryviews over an mmap: nothing is parsed or copied until it is compared
+with the mirror, and a show pushes only what differs from the box.
+"""
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+
+from lanbox import commands
+from lanbox.cuesync import CUE_LISTS, pack_steps, upload_lists
+from lanbox.mirror import LAYERS
+from lanbox.patch import DMX_CHANNELS
+from lanbox.protocol import CUE_STEP, CommandRejected
+
+MAGIC = b"LCSHOW"
+VERSION = 1
+HEADER = struct.Struct("<6sHH6x")
+SECTION = struct.Struct("<4sII")
+CUE_ENTRY = struct.Struct("<HHI")
+ALIGN = 8
+
+
+class ShowFormatError(ValueError):
+    """Not a show file, or one written by an incompatible version"""
+
+
+class Show:
+    """A complete setup: patch, gains, layer settings and cue lists
+
+    patch and gains are sequences indexed from DMX channel 1, the layer
+    tables from layer 1; cue_lists maps list numbers to packed step records.
+    Shows returned by load() are views into the mapped file and stay valid
+    until close().
+    """
+
+    def __init__(self, patch, gains, mix_modes, transparencies, priorities, cue_lists):
+        self.patch = patch
+        self.gains = gains
+        self.mix_modes = mix_modes
+        self.transparencies = transparencies
+        self.priorities = priorities
+        self.cue_lists = cue_lists
+        self._map = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def steps(self, number):
+        """Cue list steps as (action, channel, value, fade) tuples"""
+        return list(CUE_STEP.iter_unpack(self.cue_lists[number]))
+
+    def close(self):
+        if self._map is not None:
+            # Views must go before the map they point into
+            for view in (self.patch, self.gains, self.mix_modes, self.transparencies, self.priorities):
+                if isinstance(view, memoryview):
+                    view.release()
+            for view in self.cue_lists.values():
+                view.release()
+            self._map.close()
+            self._map = None
+
+    def save(self, path):
+        cues = sorted(self.cue_lists.items())
+        directory = bytearray(2 + CUE_ENTRY.size * len(cues))
+        struct.pack_into("<H", directory, 0, len(cues))
+        offset = len(directory)
+        for index, (number, packed) in enumerate(cues):
+            CUE_ENTRY.pack_into(directory, 2 + index * CUE_ENTRY.size, number, len(packed) // CUE_STEP.size, offset)
+            offset += len(packed)
+
+        patch = array("H", self.patch)
+        if sys.byteorder != "little":
+            patch.byteswap()
+        sections = [
+            (b"PTCH", [patch.tobytes()]),
+            (b"GAIN", [bytes(self.gains)]),
+            (b"LAYR", [bytes(self.mix_modes), bytes(self.transparencies), bytes(self.priorities)]),
+            (b"CUES", [bytes(directory)] + [bytes(packed) for _, packed in cues]),
+        ]
+        position = _aligned(HEADER.size + SECTION.size * len(sections))
+        table = []
+        for tag, parts in sections:
+            length = sum(len(part) for part in parts)
+            table.append((tag, position, length))
+            position = _aligned(position + length)
+
+        with open(path + ".tmp", "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, len(sections)))
+            for entry in table:
+                f.write(SECTION.pack(*entry))
+            for (tag, parts), (_, offset, _) in zip(sections, table):
+                f.write(bytes(offset - f.tell()))
+                for part in parts:
+                    f.write(part)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path):
+        """Map a show file; only the header and cue directory are read"""
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return cls._from_map(mapped)
+        except ShowFormatError:
+            mapped.close()
+            raise
+        except struct.error:
+            mapped.close()
+            raise ShowFormatError("Truncated show file")
+
+    @classmethod
+    def _from_map(cls, mapped):
+        # Validate with plain unpacks first, so a bad file leaves no views on the map
+        if len(mapped) < HEADER.size:
+            raise ShowFormatError("File too short for a show header")
+        magic, version, count = HEADER.unpack_from(mapped)
+        if magic != MAGIC:
+            raise ShowFormatError("Not a show file")
+        if version != VERSION:
+            raise ShowFormatError("Unsupported show file version {}".format(version))
+        if HEADER.size + count * SECTION.size > len(mapped):
+            raise ShowFormatError("Section table runs past the end of the file")
+        sections = {}
+        for index in range(count):
+            tag, offset, length = SECTION.unpack_from(mapped, HEADER.size + index * SECTION.size)
+            if offset + length > len(mapped):
+                raise ShowFormatError("Section {} runs past the end of the file".format(tag))
+            sections[tag] = (offset, length)
+        missing = [tag for tag in (b"PTCH", b"GAIN", b"LAYR", b"CUES") if tag not in sections]
+        if missing:
+            raise ShowFormatError("Missing sections: {}".format(b", ".join(missing).decode("ascii")))
+        if sections[b"PTCH"][1] != 2 * DMX_CHANNELS or sections[b"GAIN"][1] != DMX_CHANNELS \
+                or sections[b"LAYR"][1] != 3 * LAYERS:
+            raise ShowFormatError("Section sizes do not match show format version {}".format(VERSION))
+        cues_offset, cues_length = sections[b"CUES"]
+        if cues_length < 2:
+            raise ShowFormatError("Cue section too short for its list count")
+        cue_count, = struct.unpack_from("<H", mapped, cues_offset)
+        if 2 + cue_count * CUE_ENTRY.size > cues_length:
+            raise ShowFormatError("Cue directory of {} lists runs past the end of its section".format(cue_count))
+        directory = []
+        for index in range(cue_count):
+            number, steps, offset = CUE_ENTRY.unpack_from(mapped, cues_offset + 2 + index * CUE_ENTRY.size)
+            if offset + steps * CUE_STEP.size > cues_length:
+                raise ShowFormatError("Cue list {} runs past the end of its section".format(number))
+            directory.append((number, cues_offset + offset, steps * CUE_STEP.size))
+
+        view = memoryview(mapped)
+        offset, length = sections[b"PTCH"]
+        patch = view[offset:offset + length].cast("H")
+        if sys.byteorder != "little":
+            patch = array("H", patch)
+            patch.byteswap()
+        offset, length = sections[b"GAIN"]
+        gains = view[offset:offset + length]
+        offset, _ = sections[b"LAYR"]
+        layers = [view[offset + LAYERS * index:offset + LAYERS * (index + 1)] for index in range(3)]
+        cue_lists = {number: view[offset:offset + length] for number, offset, length in directory}
+        view.release()
+
+        show = cls(patch, gains, layers[0], layers[1], layers[2], cue_lists)
+        show._map = mapped
+        return show
+
+
+def _aligned(position):
+    return (position + ALIGN - 1) // ALIGN * ALIGN
+
+
+def capture_show(connection, timeout=30.0, lists=CUE_LISTS):
+    """Read the whole setup of a box into a Show, every request pipelined"""
+    send = connection.send_command
+    patch = [send(commands.get_patch, dmx) for dmx in range(1, DMX_CHANNELS + 1)]
+    gains = [send(commands.get_gain, dmx) for dmx in range(1, DMX_CHANNELS + 1)]
+    layers = [send(commands.get_layer_status, layer) for layer in range(1, LAYERS + 1)]
+    digests = [(number, send(commands.get_cue_list_digest, number)) for number in lists]
+
+    sizes = {}
+    for number, future in digests:
+        try:
+            sizes[number] = future.result(timeout)[0]
+        except CommandRejected:
+            continue
+    steps = {number: [send(commands.get_cue_step, number, step) for step in range(1, size + 1)]
+             for number, size in sizes.items()}
+
+    status = [future.result(timeout) for future in layers]
+    return Show([future.result(timeout)[0] for future in patch],
+                [future.result(timeout)[0] for future in gains],
+                [reply[0] for reply in status], [reply[1] for reply in status], [reply[2] for reply in status],
+                {number: pack_steps([future.result(timeout) for future in futures])
+                 for number, futures in steps.items()})
+
+
+def read_mirror(connection, mirror, timeout=30.0):
+    """Fill a mirror with the patch, gains and layer settings of a box, every request pipelined
+
+    push_show() sends every entry the mirror does not know, so reading first
+    is what lets a fresh mirror send only the differences.
+    """
+    send = connection.send_command
+    patch = [send(commands.get_patch, dmx) for dmx in range(1, DMX_CHANNELS + 1)]
+    gains = [send(commands.get_gain, dmx) for dmx in range(1, DMX_CHANNELS + 1)]
+    layers = [send(commands.get_layer_status, layer) for layer in range(1, LAYERS + 1)]
+    mirror.patch.update((dmx, future.result(timeout)[0]) for dmx, future in enumerate(patch, 1))
+    mirror.gains.update((dmx, future.result(timeout)[0]) for dmx, future in enumerate(gains, 1))
+    status = [future.result(timeout) for future in layers]
+    for table, column in ((mirror.mix_modes, 0), (mirror.transparencies, 1), (mirror.priorities, 2)):
+        table.update((layer, reply[column]) for layer, reply in enumerate(status, 1))
+
+
+def push_show(connection, mirror, show, timeout=30.0):
+    """Send only what differs between a show and the box; returns the number of frames sent
+
+    Patch, gains and layer settings are diffed against the mirror (unknown
+    entries are always sent). Cue lists are compared by checksum with the
+    box's own `*A8` digests and only lists that differ are uploaded.
+    """
+    futures = mirror.sync(connection, patch=show.patch, gains=show.gains, mix_modes=show.mix_modes,
+                          transparencies=show.transparencies, priorities=show.priorities)
+    numbers = sorted(show.cue_lists)
+    digests = [connection.send_command(commands.get_cue_list_digest, number) for number in numbers]
+    changed = {}
+    for number, future in zip(numbers, digests):
+        try:
+            remote = future.result(timeout)[1]
+        except CommandRejected:
+            remote = None
+        if remote != zlib.crc32(show.cue_lists[number]):
+            changed[number] = show.steps(number)
+    futures += upload_lists(connection, changed)
+    for future in futures:
+        future.result(timeout)
+    return len(futures)
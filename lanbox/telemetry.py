@@ -0,0 +1,223 @@
+"""Protocol telemetry: per-opcode counters, round-trip histograms, bytes and queue depth
+
+A Connection given a Telemetry records into it on its I/O thread: commands
+sent and replied per opcode, round-trip times into fixed-bucket
+histograms, bytes on the wire, pipeline depth and reconnects. Recording is
+a few integer increments per command. Any thread may read a snapshot(),
+export it as JSON or Prometheus text, or serve both over HTTP with
+MetricsServer while a show is running.
+"""
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+# Round-trip histogram bucket upper bounds in seconds; one more bucket catches the rest
+BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0)
+
+
+class Histogram:
+    """Counts of observations per bucket, plus their sum"""
+
+    def __init__(self, bounds=BUCKETS):
+        self.bounds = bounds
+        self.counts = array("Q", bytes(8 * (len(bounds) + 1)))
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of observations, or None"""
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.bounds[index] if index < len(self.bounds) else float("inf")
+        return float("inf")
+
+
+class OpcodeStats:
+    """Traffic of one opcode"""
+    __slots__ = ("sent", "replays", "replied", "rejected", "failed", "rtt")
+
+    def __init__(self):
+        self.sent = 0
+        self.replays = 0
+        self.replied = 0
+        self.rejected = 0
+        self.failed = 0
+        self.rtt = Histogram()
+
+
+class Telemetry:
+    """Metrics of one connection (or several sharing it); written by the I/O thread only"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.started = time.time()
+        self.opcodes = {}
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.in_flight = 0
+        self.backlog = 0
+        self.max_in_flight = 0
+        self.reconnects = 0
+
+    def _opcode(self, opcode):
+        stats = self.opcodes.get(opcode)
+        if stats is None:
+            stats = self.opcodes[opcode] = OpcodeStats()
+        return stats
+
+    # -- Recording, I/O thread -------------------------------------------
+
+    def sent(self, opcode, replay=False):
+        stats = self._opcode(opcode)
+        stats.sent += 1
+        if replay:
+            stats.replays += 1
+
+    def replied(self, opcode, seconds, rejected=False):
+        """The box answered, with a reply or a `?xx#` rejection, after seconds"""
+        stats = self._opcode(opcode)
+        if rejected:
+            stats.rejected += 1
+        else:
+            stats.replied += 1
+        stats.rtt.observe(seconds)
+
+    def failed(self, opcode):
+        """Given up on without an answer: link lost, timed out or unencodable"""
+        self._opcode(opcode).failed += 1
+
+    def depth(self, in_flight, backlog):
+        self.in_flight = in_flight
+        self.backlog = backlog
+        if in_flight > self.max_in_flight:
+            self.max_in_flight = in_flight
+
+    # -- Reading, any thread ---------------------------------------------
+
+    def snapshot(self):
+        """Everything as plain numbers, opcodes keyed by their hex text"""
+        opcodes = {}
+        for opcode, stats in sorted(list(self.opcodes.items())):
+            rtt = stats.rtt
+            opcodes[opcode.decode("ascii")] = {
+                "sent": stats.sent, "replays": stats.replays, "replied": stats.replied,
+                "rejected": stats.rejected, "failed": stats.failed,
+                "rtt_count": rtt.count, "rtt_sum": rtt.sum, "rtt_buckets": list(rtt.counts),
+                "rtt_p50": rtt.quantile(0.50), "rtt_p99": rtt.quantile(0.99),
+            }
+        return {
+            "uptime": time.time() - self.started,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            "in_flight": self.in_flight,
+            "backlog": self.backlog,
+            "max_in_flight": self.max_in_flight,
+            "reconnects": self.reconnects,
+            "rtt_bounds": list(BUCKETS),
+            "opcodes": opcodes,
+        }
+
+    def to_json(self):
+        import json
+        snapshot = self.snapshot()
+        for stats in snapshot["opcodes"].values():
+            # JSON has no infinity; p99 past the last bucket is reported as null
+            for key in ("rtt_p50", "rtt_p99"):
+                if stats[key] == float("inf"):
+                    stats[key] = None
+        return json.dumps(snapshot, indent=1, sort_keys=True)
+
+    def to_prometheus(self):
+        """Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append("# HELP lanbox_{} {}".format(name, help_text))
+            lines.append("# TYPE lanbox_{} {}".format(name, kind))
+            for labels, value in samples:
+                lines.append("lanbox_{}{} {}".format(name, labels, value))
+
+        metric("bytes_sent_total", "counter", "Bytes written to the LanBox.", [("", snapshot["bytes_sent"])])
+        metric("bytes_received_total", "counter", "Bytes read from the LanBox.", [("", snapshot["bytes_received"])])
+        metric("in_flight", "gauge", "Commands awaiting a reply.", [("", snapshot["in_flight"])])
+        metric("backlog", "gauge", "Commands waiting for a pipeline slot.", [("", snapshot["backlog"])])
+        metric("reconnects_total", "counter", "Links re-established after a loss.", [("", snapshot["reconnects"])])
+        opcodes = snapshot["opcodes"]
+        for name, help_text in (("sent", "Commands sent, including replays."),
+                                ("replays", "Commands resent after a reconnect."),
+                                ("replied", "Commands acknowledged."),
+                                ("rejected", "Commands the LanBox answered with an error."),
+                                ("failed", "Commands given up on without an answer.")):
+            metric("commands_{}_total".format(name), "counter", help_text,
+                   [('{{opcode="{}"}}'.format(opcode), stats[name]) for opcode, stats in opcodes.items()])
+
+        lines.append("# HELP lanbox_rtt_seconds Round-trip time from send to reply.")
+        lines.append("# TYPE lanbox_rtt_seconds histogram")
+        for opcode, stats in opcodes.items():
+            cumulative = 0
+            for bound, count in zip(snapshot["rtt_bounds"] + ["+Inf"], stats["rtt_buckets"]):
+                cumulative += count
+                lines.append('lanbox_rtt_seconds_bucket{{opcode="{}",le="{}"}} {}'.format(opcode, bound, cumulative))
+            lines.append('lanbox_rtt_seconds_sum{{opcode="{}"}} {}'.format(opcode, stats["rtt_sum"]))
+            lines.append('lanbox_rtt_seconds_count{{opcode="{}"}} {}'.format(opcode, stats["rtt_count"]))
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Serves a Telemetry over HTTP: /metrics (Prometheus text) and /metrics.json"""
+
+    def __init__(self, telemetry, host="127.0.0.1", port=9777):
+        self.telemetry = telemetry
+        self.host = host
+        self.port = port
+        self._server = None
+
+    def start(self):
+        """Start serving on a background thread; returns the bound (host, port)"""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        telemetry = self.telemetry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, kind = telemetry.to_prometheus(), "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body, kind = telemetry.to_json(), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                body = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", kind)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="lanbox-metrics", daemon=True).start()
+        self.host, self.port = self._server.server_address[:2]
+        return self.host, self.port
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
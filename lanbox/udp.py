@@ -0,0 +1,132 @@
+"""Non-blocking receiver for LanBox UDP channel-value broadcasts
+
+Each broadcast datagram carries one block of consecutive mixer channels:
+
+    "LB"  sequence:u16  start channel:u16  count:u16  value[count]:u8
+
+(all big-endian, channels numbered from 1). Datagrams are received into a
+preallocated buffer and their values copied straight into the shared
+`levels` bytearray, so ingest allocates nothing per packet.
+"""
+import errno
+import selectors
+import socket
+import struct
+
+from lanbox.patch import MIXER_CHANNELS
+
+DEFAULT_PORT = 4777
+MAGIC = b"LB"
+HEADER = struct.Struct(">2sHHH")
+MAX_DATAGRAM = HEADER.size + MIXER_CHANNELS
+
+# Errors a datagram socket reports for an earlier ICMP message; the socket itself is fine
+TRANSIENT_ERRORS = (errno.ECONNREFUSED, errno.ECONNRESET, errno.EHOSTUNREACH, errno.ENETUNREACH, errno.ENOBUFS)
+
+
+def encode_broadcast(sequence, start, values):
+    """Build one broadcast datagram (used by the emulator and benchmarks)"""
+    return HEADER.pack(MAGIC, sequence & 0xFFFF, start, len(values)) + bytes(values)
+
+
+class UdpReceiver:
+    """Listens for broadcasts on an IOLoop and keeps the latest mixer levels
+
+    levels is a bytearray of MIXER_CHANNELS values (index 0 is channel 1)
+    that readers may wrap in a memoryview. If given, on_block(start, count)
+    is called on the I/O thread after each block has been stored.
+
+    Socket errors are counted in errors, the last one kept in error; any
+    but the transient ones close the receiver.
+    """
+
+    def __init__(self, loop, port=DEFAULT_PORT, host="", on_block=None, rcvbuf=1 << 20):
+        self.loop = loop
+        self.port = port
+        self.host = host
+        self.on_block = on_block
+        self.rcvbuf = rcvbuf
+        self.levels = bytearray(MIXER_CHANNELS)
+        self.sock = None
+
+        self.packets = 0
+        self.bytes = 0
+        self.lost = 0
+        self.late = 0
+        self.malformed = 0
+        self.errors = 0
+        self.error = None
+        self._last_sequence = None
+        self._buffer = bytearray(MAX_DATAGRAM)
+        self._view = memoryview(self._buffer)
+
+    def open(self):
+        """Bind the socket now (raising OSError on failure) and start receiving"""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            # A roomy kernel buffer absorbs bursts while the loop is busy
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.rcvbuf)
+            sock.bind((self.host, self.port))
+            sock.setblocking(False)
+            self.sock = sock
+            self.loop.call_soon(self.loop.selector.register, sock, selectors.EVENT_READ, self._on_readable)
+        except Exception:
+            # Nothing half-open is left behind, so open() can be retried
+            self.sock = None
+            sock.close()
+            raise
+
+    def close(self):
+        self.loop.call_soon(self._close)
+
+    def _close(self):
+        if self.sock is None:
+            return
+        try:
+            self.loop.selector.unregister(self.sock)
+        except (KeyError, ValueError):
+            pass
+        self.sock.close()
+        self.sock = None
+
+    def _on_readable(self, mask):
+        # Drain everything queued so one wakeup handles a whole burst
+        sock, view = self.sock, self._view
+        while sock is not None:
+            try:
+                size = sock.recv_into(self._buffer)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                self.errors += 1
+                self.error = e
+                if e.errno not in TRANSIENT_ERRORS:
+                    self._close()
+                return
+            self.packets += 1
+            self.bytes += size
+            self._store(view, size)
+
+    def _store(self, view, size):
+        if size < HEADER.size:
+            self.malformed += 1
+            return
+        magic, sequence, start, count = HEADER.unpack_from(view)
+        end = start - 1 + count
+        if magic != MAGIC or start < 1 or end > MIXER_CHANNELS or HEADER.size + count > size:
+            self.malformed += 1
+            return
+
+        if self._last_sequence is not None:
+            gap = (sequence - self._last_sequence - 1) & 0xFFFF
+            if gap >= 0x8000:
+                # Late or duplicated datagram: newer values are already stored
+                self.late += 1
+                return
+            self.lost += gap
+        self._last_sequence = sequence
+
+        self.levels[start - 1:end] = view[HEADER.size:HEADER.size + count]
+        if self.on_block is not None:
+            self.on_block(start, count)
@@ -1,13 +1,236 @@
 import sys
+import time
+
+# Start of the startup-time measurement (see report_startup)
+STARTED = time.perf_counter()
+
+# Subcommands (send, patch, monitor) run headless and must not pay for importing PyQt6
+if __name__ == "__main__" and len(sys.argv) > 1:
+    from lanbox import cli
+    if sys.argv[1] in cli.SUBCOMMANDS:
+        sys.exit(cli.main(sys.argv[1:]))
+
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                              QHBoxLayout, QGridLayout, QPushButton, QLabel, 
-                             QLineEdit, QComboBox, QSpinBox, QTextEdit, QGroupBox,
-                             QTabWidget, QTableWidget, QTableWidgetItem, QHeaderView,
-                             QCheckBox)
-from PyQt6.QtCore import Qt, QTimer
-import socket
-import struct
-import time
+                             QLineEdit, QComboBox, QSpinBox, QDoubleSpinBox, QGroupBox,
+                             QTabWidget, QTableView, QTableWidget, QTableWidgetItem, QHeaderView,
+                             QCheckBox, QFileDialog, QListView)
+from PyQt6.QtCore import (Qt, QTimer, QObject, QRect, QAbstractListModel, QAbstractTableModel,
+                          QModelIndex, pyqtSignal)
+from PyQt6.QtGui import QPainter, QColor
+import os
+import threading
+from collections import deque
+
+# Only what the first window needs is imported here; transports, NumPy
+# (fades), cue list sync and show files are imported on first use
+from lanbox import commands
+from lanbox.mirror import Mirror
+from lanbox.commlog import CommunicationLog
+from lanbox.telemetry import Telemetry
+from lanbox.cuelist import CueSteps, ACTIONS
+
+# Minimum spacing between live updates of the same parameter (40 Hz)
+LIVE_UPDATE_INTERVAL = 0.025
+
+# Level monitor repaint cap (25 fps)
+MONITOR_INTERVAL_MS = 40
+
+# Communication log: lines kept in memory and how often the view catches up
+LOG_CAPACITY = 10000
+LOG_FLUSH_INTERVAL_MS = 100
+LOG_SPILL_PATH = os.path.expanduser("~/lcopen-communication.log")
+
+# Columns of the live layer status table, in status poller field order
+LAYER_COLUMNS = ["Mix Mode", "Transparency", "Priority", "Cue List", "Step", "Name"]
+
+# Statistics tab refresh interval and default metrics endpoint port
+STATS_INTERVAL_MS = 500
+METRICS_PORT = 9777
+
+class ConnectionSignals(QObject):
+    """Carries results from the I/O thread back onto the GUI thread"""
+    connection_event = pyqtSignal(str, object)
+    log_message = pyqtSignal(str)
+    cue_list_opened = pyqtSignal(int, int, int)   # layer, cue list, step count
+    cue_steps = pyqtSignal(int, object)           # store generation, [(row, step)]
+    cue_step_edited = pyqtSignal(int, str, int)   # layer, "insert"/"append"/"delete", step; or 0, "clear", cue list
+    scene_captured = pyqtSignal(object)           # LayerScene read from the box
+    status_polled = pyqtSignal(object)            # fields the status poller found changed
+    journal_changed = pyqtSignal()                # records compacted or replayed off the GUI thread
+
+class LogModel(QAbstractListModel):
+    """Read-only list model holding a bounded window of log lines"""
+    
+    def __init__(self, capacity):
+        super().__init__()
+        self.lines = deque(maxlen=capacity)
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.lines)
+    
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and 0 <= index.row() < len(self.lines):
+            return self.lines[index.row()]
+        return None
+    
+    def append_lines(self, batch):
+        """Add a batch of lines, dropping the oldest rows beyond capacity"""
+        capacity = self.lines.maxlen
+        if len(batch) >= capacity:
+            self.beginResetModel()
+            self.lines.clear()
+            self.lines.extend(batch[-capacity:])
+            self.endResetModel()
+            return
+        evicted = len(self.lines) + len(batch) - capacity
+        if evicted > 0:
+            self.beginRemoveRows(QModelIndex(), 0, evicted - 1)
+            for _ in range(evicted):
+                self.lines.popleft()
+            self.endRemoveRows()
+        first = len(self.lines)
+        self.beginInsertRows(QModelIndex(), first, first + len(batch) - 1)
+        self.lines.extend(batch)
+        self.endInsertRows()
+    
+    def clear(self):
+        self.beginResetModel()
+        self.lines.clear()
+        self.endResetModel()
+
+class CueStepModel(QAbstractTableModel):
+    """Virtualized cue list: steps are read from the box as their rows come into view
+    
+    fetch(cue_list, generation, first_row, count) is called for each page
+    the view needs; results come back through apply_steps().
+    """
+    HEADERS = ["Step", "Action", "Channel", "Value", "Fade"]
+    
+    def __init__(self, fetch):
+        super().__init__()
+        self.steps = CueSteps()
+        self.layer = None
+        self.fetch = fetch
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.steps)
+    
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+    
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.HEADERS[section]
+        return None
+    
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole or not index.isValid():
+            return None
+        row = index.row()
+        column = index.column()
+        if column == 0:
+            return str(row + 1)
+        step = self.steps.step(row)
+        if step is None:
+            page = self.steps.missing_page(row)
+            if page is not None:
+                self.fetch(self.steps.cue_list, self.steps.generation, *page)
+            return "..."
+        action, channel, value, fade = step
+        if column == 1:
+            return ACTIONS.get(action, "Action {}".format(action))
+        if column == 2:
+            return str(channel)
+        if column == 3:
+            return str(value)
+        return "{:.1f}s".format(fade / 10)
+    
+    def open_list(self, layer, cue_list, size):
+        self.beginResetModel()
+        self.layer = layer
+        self.steps.open(cue_list, size)
+        self.endResetModel()
+    
+    def apply_steps(self, generation, rows):
+        """Store a page of steps read from the box and repaint just those rows"""
+        stored = [row for row, step in rows if self.steps.store(generation, row, step)]
+        if stored:
+            self.dataChanged.emit(self.index(min(stored), 0),
+                                  self.index(max(stored), len(self.HEADERS) - 1))
+    
+    def insert_step(self, row):
+        if not 0 <= row <= len(self.steps):
+            return
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.steps.insert(row)
+        self.endInsertRows()
+    
+    def delete_step(self, row):
+        if not 0 <= row < len(self.steps):
+            return
+        self.beginRemoveRows(QModelIndex(), row, row)
+        self.steps.delete(row)
+        self.endRemoveRows()
+
+class ChannelGrid(QWidget):
+    """Grid of mixer channel cells that repaints only the cells that changed"""
+    COLUMNS = 64
+    
+    def __init__(self, channels):
+        super().__init__()
+        self.channels = channels
+        self.rows = (channels + self.COLUMNS - 1) // self.COLUMNS
+        self.values = bytearray(channels)
+        self.setMinimumSize(self.COLUMNS * 8, self.rows * 8)
+        self.setMouseTracking(True)
+    
+    def cell_rect(self, index):
+        width = self.width() / self.COLUMNS
+        height = self.height() / self.rows
+        row, column = divmod(index, self.COLUMNS)
+        return QRect(int(column * width), int(row * height),
+                     int((column + 1) * width) - int(column * width),
+                     int((row + 1) * height) - int(row * height))
+    
+    def set_levels(self, frame, changed):
+        self.values[:] = frame
+        if len(changed) > self.channels // 2:
+            self.update()
+            return
+        for index in changed:
+            self.update(self.cell_rect(index))
+    
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        width = self.width() / self.COLUMNS
+        height = self.height() / self.rows
+        
+        # Only paint the cells inside the dirty region Qt hands us
+        region = event.region()
+        rect = event.rect()
+        first_row = max(0, int(rect.top() / height))
+        last_row = min(self.rows - 1, int(rect.bottom() / height))
+        first_column = max(0, int(rect.left() / width))
+        last_column = min(self.COLUMNS - 1, int(rect.right() / width))
+        for row in range(first_row, last_row + 1):
+            for column in range(first_column, last_column + 1):
+                index = row * self.COLUMNS + column
+                if index >= self.channels:
+                    break
+                cell = self.cell_rect(index)
+                if not region.intersects(cell):
+                    continue
+                value = self.values[index]
+                painter.fillRect(cell, QColor(value, value, 0) if value else QColor(32, 32, 32))
+        painter.end()
+    
+    def mouseMoveEvent(self, event):
+        column = int(event.position().x() * self.COLUMNS / max(1, self.width()))
+        row = int(event.position().y() * self.rows / max(1, self.height()))
+        index = row * self.COLUMNS + column
+        if 0 <= index < self.channels:
+            self.setToolTip("Mixer {}: {}".format(index + 1, self.values[index]))
 
 class LanBoxController(QMainWindow):
     def __init__(self):
@@ -15,21 +238,78 @@ class LanBoxController(QMainWindow):
         self.setWindowTitle("LCedit+ Replacement - LanBox Controller")
         self.setGeometry(100, 100, 1200, 800)
         
-        # Create tabbed interface
-        self.tabs = QTabWidget()
-        self.setCentralWidget(self.tabs)
-        
-        # Create tabs
-        self.create_connection_tab()
-        self.create_cue_management_tab()
-        self.create_layer_control_tab()
-        self.create_patch_tab()
-        self.create_system_controls_tab()
-        self.create_communication_log_tab()
+        # Bounded log; the view is refreshed in batches by a timer
+        self.comm_log = CommunicationLog(LOG_CAPACITY)
         
         # Initialize connection state
         self.connected = False
-        self.socket = None
+        self.connection = None
+        self.connection_type = None
+        self.coalescer = None
+        self.fader = None
+        self.poller = None
+        self.layer_table = None
+        self.poll_info_label = None
+        self.udp_receiver = None
+        # What the box is known to hold, so bulk changes only send differences
+        self.mirror = Mirror()
+        # Protocol counters and round-trip histograms, recorded by the connection
+        self.telemetry = Telemetry()
+        self.metrics_server = None
+        # Every command sent, for replay onto a box that lost power; opt-in
+        self.journal = None
+        self.journal_info_label = None
+        # Blocking jobs (cue list sync, show files) run one at a time on this thread
+        self.worker = None
+        # Settings shared across tabs, kept here since their tabs may not be built yet
+        self.auto_update_enabled = True
+        self.poll_patch_gains = False
+        self.cue_sync_on_connect = False
+        self.monitor_timer = None
+        self.log_timer = None
+        self.stats_timer = None
+        
+        # All socket I/O runs on a background thread, started with the first connection
+        self.io_loop = None
+        self.signals = ConnectionSignals()
+        self.signals.connection_event.connect(self.on_connection_event)
+        self.signals.log_message.connect(self.append_to_log)
+        self.signals.cue_list_opened.connect(self.on_cue_list_opened)
+        self.signals.cue_steps.connect(self.on_cue_steps)
+        self.signals.cue_step_edited.connect(self.on_cue_step_edited)
+        self.signals.scene_captured.connect(self.on_scene_captured)
+        self.signals.status_polled.connect(self.on_status_polled)
+        self.signals.journal_changed.connect(self.show_journal_info)
+        
+        # Create tabbed interface; each tab is built the first time it is shown
+        self.tabs = QTabWidget()
+        self.setCentralWidget(self.tabs)
+        self.tab_builders = {}
+        for title, builder in (("Connection", self.create_connection_tab),
+                               ("Cue Management", self.create_cue_management_tab),
+                               ("Layer Control", self.create_layer_control_tab),
+                               ("DMX Patch", self.create_patch_tab),
+                               ("System Controls", self.create_system_controls_tab),
+                               ("Level Monitor", self.create_level_monitor_tab),
+                               ("Statistics", self.create_statistics_tab),
+                               ("Communication Log", self.create_communication_log_tab)):
+            placeholder = QWidget()
+            QVBoxLayout(placeholder).setContentsMargins(0, 0, 0, 0)
+            self.tab_builders[self.tabs.addTab(placeholder, title)] = builder
+        self.tabs.currentChanged.connect(self.build_tab)
+        self.build_tab(self.tabs.currentIndex())
+    
+    def build_tab(self, index):
+        """Build a tab's widgets into its placeholder on first activation"""
+        builder = self.tab_builders.pop(index, None)
+        if builder is not None:
+            self.tabs.widget(index).layout().addWidget(builder())
+    
+    def report_startup(self):
+        """Log the time from the start of lcopen.py until the window is up"""
+        elapsed = (time.perf_counter() - STARTED) * 1000
+        self.append_to_log("Started in {:.0f} ms".format(elapsed))
+        return elapsed
         
     def create_connection_tab(self):
         tab = QWidget()
@@ -62,11 +342,16 @@ class LanBoxController(QMainWindow):
         self.serial_label = QLabel("Serial Port:")
         self.serial_input = QLineEdit("/dev/ttyUSB0")  # Default Linux/Mac
         self.serial_input.setVisible(False)
+        self.baud_input = QComboBox()
+        self.baud_input.addItems(["9600", "19200", "38400", "57600", "115200"])
+        self.baud_input.setCurrentText("38400")
+        self.baud_input.setVisible(False)
         
         # MIDI Settings (for MIDI connections)
         self.midi_label = QLabel("MIDI Device:")
+        # Filled with the raw MIDI devices present when MIDI is picked; any path may be typed
         self.midi_input = QComboBox()
-        self.midi_input.addItems(["MIDI IN", "MIDI OUT", "USB-MIDI"])
+        self.midi_input.setEditable(True)
         self.midi_input.setVisible(False)
         
         # UDP Settings
@@ -105,6 +390,7 @@ class LanBoxController(QMainWindow):
         
         conn_layout.addWidget(self.serial_label, 3, 0)
         conn_layout.addWidget(self.serial_input, 3, 1)
+        conn_layout.addWidget(self.baud_input, 3, 2)
         
         conn_layout.addWidget(self.midi_label, 4, 0)
         conn_layout.addWidget(self.midi_input, 4, 1)
@@ -157,13 +443,14 @@ class LanBoxController(QMainWindow):
         self.connection_info_label.setStyleSheet("QLabel { background-color: lightblue; padding: 5px; }")
         layout.addWidget(self.connection_info_label)
         
-        self.tabs.addTab(tab, "Connection")
+        return tab
     
     def connection_type_changed(self, text):
         """Update visible fields based on selected connection type"""
         # Hide all connection-specific fields
         self.ip_input.setVisible(False)
         self.serial_input.setVisible(False)
+        self.baud_input.setVisible(False)
         self.midi_input.setVisible(False)
         self.udp_port_input.setVisible(False)
         
@@ -180,19 +467,29 @@ class LanBoxController(QMainWindow):
             
         elif text == "Serial":
             self.serial_input.setVisible(True)
+            self.baud_input.setVisible(True)
             self.serial_label.setVisible(True)
-            self.connection_info_label.setText("Serial Connection - USB connection required")
+            self.connection_info_label.setText("Serial Connection - 8N1, no flow control; pick the port and baud rate")
             
         elif text == "MIDI":
             self.midi_input.setVisible(True)
             self.midi_label.setVisible(True)
-            self.connection_info_label.setText("MIDI Connection - Configure MIDI device settings")
+            self.refresh_midi_devices()
+            self.connection_info_label.setText("MIDI Connection - Commands sent as SysEx over a raw MIDI device")
             
         elif text == "UDP":
             self.udp_port_input.setVisible(True)
             self.udp_label.setVisible(True)
             self.connection_info_label.setText("UDP Connection - Default port: 4777 for broadcasting")
     
+    def refresh_midi_devices(self):
+        from lanbox.midi import list_devices
+        current = self.midi_input.currentText()
+        self.midi_input.clear()
+        self.midi_input.addItems(list_devices())
+        if current:
+            self.midi_input.setCurrentText(current)
+    
     def create_cue_management_tab(self):
         tab = QWidget()
         layout = QVBoxLayout(tab)
@@ -245,6 +542,15 @@ class LanBoxController(QMainWindow):
         cue_layout.addWidget(self.clear_cue_input, 3, 1)
         cue_layout.addWidget(self.clear_cue_btn, 3, 2)
         
+        # Sync every cue list with the local cache, moving only lists that changed
+        self.cue_sync_btn = QPushButton("Sync Cue Lists")
+        self.cue_sync_btn.clicked.connect(self.sync_cue_lists)
+        self.cue_sync_checkbox = QCheckBox("Sync on connect")
+        self.cue_sync_checkbox.setChecked(self.cue_sync_on_connect)
+        self.cue_sync_checkbox.toggled.connect(self.toggle_cue_sync_on_connect)
+        cue_layout.addWidget(self.cue_sync_btn, 4, 0)
+        cue_layout.addWidget(self.cue_sync_checkbox, 4, 1)
+        
         cue_list_group.setLayout(cue_layout)
         layout.addWidget(cue_list_group)
         
@@ -294,18 +600,35 @@ class LanBoxController(QMainWindow):
         cue_steps_group.setLayout(steps_layout)
         layout.addWidget(cue_steps_group)
         
-        # Cue List Editor (simplified table view)
+        # Cue List Editor: shows the cue list of a layer, reading steps only as they scroll into view
         editor_group = QGroupBox("Cue List Editor")
-        self.cue_table = QTableWidget(10, 4)  # 10 rows, 4 columns
-        self.cue_table.setHorizontalHeaderLabels(["Step", "Action", "Channel", "Value"])
+        editor_controls = QHBoxLayout()
+        editor_controls.addWidget(QLabel("Layer:"))
+        self.editor_layer_input = QSpinBox()
+        self.editor_layer_input.setRange(1, 63)
+        editor_controls.addWidget(self.editor_layer_input)
+        self.editor_open_btn = QPushButton("Open")
+        self.editor_open_btn.clicked.connect(self.open_cue_editor)
+        editor_controls.addWidget(self.editor_open_btn)
+        self.cue_editor_info = QLabel("No cue list open")
+        editor_controls.addWidget(self.cue_editor_info)
+        editor_controls.addStretch()
+        
+        self.cue_model = CueStepModel(self.fetch_cue_steps)
+        self.cue_table = QTableView()
+        self.cue_table.setModel(self.cue_model)
         self.cue_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        # Fixed row heights keep scrolling cheap however long the list is
+        self.cue_table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        self.cue_table.verticalHeader().hide()
         
         editor_layout = QVBoxLayout()
+        editor_layout.addLayout(editor_controls)
         editor_layout.addWidget(self.cue_table)
         editor_group.setLayout(editor_layout)
         layout.addWidget(editor_group)
         
-        self.tabs.addTab(tab, "Cue Management")
+        return tab
     
     def create_layer_control_tab(self):
         tab = QWidget()
@@ -332,6 +655,7 @@ class LanBoxController(QMainWindow):
         self.trans_depth_input.setRange(0, 255)
         self.trans_btn = QPushButton("Set")
         self.trans_btn.clicked.connect(self.set_transparency)
+        self.trans_depth_input.valueChanged.connect(self.live_update_transparency)
         
         # Layer Status
         status_label = QLabel("Layer Status:")
@@ -357,6 +681,21 @@ class LanBoxController(QMainWindow):
         layer_group.setLayout(layer_layout)
         layout.addWidget(layer_group)
         
+        # All layers, kept current by the status poller while Auto Update is on
+        live_group = QGroupBox("Layer Status (Auto Update)")
+        live_layout = QVBoxLayout()
+        self.layer_table = QTableWidget(63, len(LAYER_COLUMNS))
+        self.layer_table.setHorizontalHeaderLabels(LAYER_COLUMNS)
+        self.layer_table.setVerticalHeaderLabels([str(layer) for layer in range(1, 64)])
+        self.layer_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.layer_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        live_layout.addWidget(self.layer_table)
+        live_group.setLayout(live_layout)
+        layout.addWidget(live_group)
+        if self.poller is not None:
+            # Whatever was polled before this tab was first shown
+            self.show_layer_status(self.poller.values["layers"])
+        
         # Layer Settings
         settings_group = QGroupBox("Layer Settings")
         settings_layout = QGridLayout()
@@ -391,7 +730,38 @@ class LanBoxController(QMainWindow):
         settings_group.setLayout(settings_layout)
         layout.addWidget(settings_group)
         
-        self.tabs.addTab(tab, "Layer Control")
+        # Layer Scenes: every layer's settings, recalled as one batch
+        from lanbox.scene import SceneBook
+        self.scene_book = SceneBook()
+        scenes_group = QGroupBox("Layer Scenes")
+        scenes_layout = QGridLayout()
+        
+        capture_label = QLabel("Capture All Layers As:")
+        self.scene_name_input = QLineEdit("Scene 1")
+        self.capture_scene_btn = QPushButton("Capture")
+        self.capture_scene_btn.clicked.connect(self.capture_layer_scene)
+        
+        recall_label = QLabel("Recall Scene:")
+        self.scene_combo = QComboBox()
+        self.scene_combo.addItems(self.scene_book.names())
+        self.recall_scene_btn = QPushButton("Recall")
+        self.recall_scene_btn.clicked.connect(self.recall_layer_scene)
+        self.delete_scene_btn = QPushButton("Delete")
+        self.delete_scene_btn.clicked.connect(self.delete_layer_scene)
+        
+        scenes_layout.addWidget(capture_label, 0, 0)
+        scenes_layout.addWidget(self.scene_name_input, 0, 1, 1, 2)
+        scenes_layout.addWidget(self.capture_scene_btn, 0, 3)
+        
+        scenes_layout.addWidget(recall_label, 1, 0)
+        scenes_layout.addWidget(self.scene_combo, 1, 1)
+        scenes_layout.addWidget(self.recall_scene_btn, 1, 2)
+        scenes_layout.addWidget(self.delete_scene_btn, 1, 3)
+        
+        scenes_group.setLayout(scenes_layout)
+        layout.addWidget(scenes_group)
+        
+        return tab
     
     def create_patch_tab(self):
         tab = QWidget()
@@ -422,10 +792,18 @@ class LanBoxController(QMainWindow):
         patch_layout.addWidget(self.patch_mixer_input, 0, 2)
         patch_layout.addWidget(self.patch_btn, 0, 3)
         
+        # Apply a whole patch file in one bulk operation
+        patch_file_label = QLabel("Patch File:")
+        self.patch_file_btn = QPushButton("Apply Patch File...")
+        self.patch_file_btn.clicked.connect(self.apply_patch_file)
+        
         patch_layout.addWidget(get_patch_label, 1, 0)
         patch_layout.addWidget(self.get_patch_dmx_input, 1, 1)
         patch_layout.addWidget(self.get_patch_btn, 1, 2)
         
+        patch_layout.addWidget(patch_file_label, 2, 0)
+        patch_layout.addWidget(self.patch_file_btn, 2, 1)
+        
         patch_group.setLayout(patch_layout)
         layout.addWidget(patch_group)
         
@@ -441,6 +819,7 @@ class LanBoxController(QMainWindow):
         self.gain_value_input.setRange(0, 255)
         self.gain_btn = QPushButton("Set")
         self.gain_btn.clicked.connect(self.set_gain)
+        self.gain_value_input.valueChanged.connect(self.live_update_gain)
         
         # Get Gain
         get_gain_label = QLabel("Get Gain:")
@@ -472,7 +851,7 @@ class LanBoxController(QMainWindow):
         analog_group.setLayout(analog_layout)
         layout.addWidget(analog_group)
         
-        self.tabs.addTab(tab, "DMX Patch")
+        return tab
     
     def create_system_controls_tab(self):
         tab = QWidget()
@@ -499,22 +878,58 @@ class LanBoxController(QMainWindow):
         system_layout.addWidget(save_data_btn, 0, 1)
         system_layout.addWidget(sys_info_btn, 0, 2)
         
+        # Show files: the whole setup in one binary file
+        save_show_btn = QPushButton("Save Show...")
+        save_show_btn.clicked.connect(self.save_show)
+        load_show_btn = QPushButton("Load Show...")
+        load_show_btn.clicked.connect(self.load_show)
+        system_layout.addWidget(save_show_btn, 1, 0)
+        system_layout.addWidget(load_show_btn, 1, 1)
+        
         system_group.setLayout(system_layout)
         layout.addWidget(system_group)
         
+        # Command journal: what was sent, compacted and replayed after a power loss
+        journal_group = QGroupBox("Command Journal")
+        journal_layout = QHBoxLayout()
+        
+        journal_checkbox = QCheckBox("Journal commands")
+        journal_checkbox.setChecked(self.journal is not None)
+        journal_checkbox.toggled.connect(self.toggle_journal)
+        compact_journal_btn = QPushButton("Compact")
+        compact_journal_btn.clicked.connect(self.compact_journal)
+        replay_journal_btn = QPushButton("Replay to LanBox")
+        replay_journal_btn.clicked.connect(self.replay_journal)
+        self.journal_info_label = QLabel()
+        
+        journal_layout.addWidget(journal_checkbox)
+        journal_layout.addWidget(compact_journal_btn)
+        journal_layout.addWidget(replay_journal_btn)
+        journal_layout.addWidget(self.journal_info_label)
+        
+        journal_group.setLayout(journal_layout)
+        layout.addWidget(journal_group)
+        self.show_journal_info()
+        
         # Auto Update Control
         auto_update_group = QGroupBox("Auto Update")
         auto_update_layout = QHBoxLayout()
         
-        self.auto_update_enabled = True
-        self.auto_update_btn = QPushButton("Disable Auto Update")
+        self.auto_update_btn = QPushButton("Disable Auto Update" if self.auto_update_enabled else "Enable Auto Update")
         self.auto_update_btn.clicked.connect(self.toggle_auto_update)
         
         update_now_btn = QPushButton("Update Now")
         update_now_btn.clicked.connect(self.update_now)
         
+        self.poll_patch_gains_checkbox = QCheckBox("Also poll patch and gains")
+        self.poll_patch_gains_checkbox.setChecked(self.poll_patch_gains)
+        self.poll_patch_gains_checkbox.toggled.connect(self.toggle_poll_patch_gains)
+        self.poll_info_label = QLabel("Layer status: not polling")
+        
         auto_update_layout.addWidget(self.auto_update_btn)
         auto_update_layout.addWidget(update_now_btn)
+        auto_update_layout.addWidget(self.poll_patch_gains_checkbox)
+        auto_update_layout.addWidget(self.poll_info_label)
         
         auto_update_group.setLayout(auto_update_layout)
         layout.addWidget(auto_update_group)
@@ -540,25 +955,296 @@ class LanBoxController(QMainWindow):
         udp_group.setLayout(udp_layout)
         layout.addWidget(udp_group)
         
-        self.tabs.addTab(tab, "System Controls")
+        return tab
+    
+    def create_level_monitor_tab(self):
+        tab = QWidget()
+        layout = QVBoxLayout(tab)
+        
+        # Live mixer levels from UDP broadcasts, or the mirror's last batched read
+        monitor_group = QGroupBox("Mixer Levels")
+        monitor_layout = QVBoxLayout()
+        
+        from lanbox.monitor import LevelHistory
+        self.level_history = LevelHistory()
+        self.level_grid = ChannelGrid(self.level_history.channels)
+        self.monitor_info_label = QLabel("Source: none")
+        
+        monitor_layout.addWidget(self.level_grid)
+        monitor_layout.addWidget(self.monitor_info_label)
+        monitor_group.setLayout(monitor_layout)
+        layout.addWidget(monitor_group)
+        
+        # Timed fades, computed and sent at 40 Hz on the I/O thread
+        fade_group = QGroupBox("Fades")
+        fade_layout = QHBoxLayout()
+        
+        self.fade_channels_input = QLineEdit("1-16")
+        self.fade_level_input = QSpinBox()
+        self.fade_level_input.setRange(0, 255)
+        self.fade_level_input.setValue(255)
+        self.fade_time_input = QDoubleSpinBox()
+        self.fade_time_input.setRange(0.0, 3600.0)
+        self.fade_time_input.setValue(2.0)
+        self.fade_time_input.setSuffix(" s")
+        self.fade_btn = QPushButton("Fade")
+        self.fade_btn.clicked.connect(lambda: self.start_fade(crossfade=False))
+        self.crossfade_btn = QPushButton("Crossfade")
+        self.crossfade_btn.clicked.connect(lambda: self.start_fade(crossfade=True))
+        self.fade_stop_btn = QPushButton("Stop")
+        self.fade_stop_btn.clicked.connect(self.stop_fade)
+        
+        fade_layout.addWidget(QLabel("Channels:"))
+        fade_layout.addWidget(self.fade_channels_input)
+        fade_layout.addWidget(QLabel("Level:"))
+        fade_layout.addWidget(self.fade_level_input)
+        fade_layout.addWidget(QLabel("Time:"))
+        fade_layout.addWidget(self.fade_time_input)
+        fade_layout.addWidget(self.fade_btn)
+        fade_layout.addWidget(self.crossfade_btn)
+        fade_layout.addWidget(self.fade_stop_btn)
+        fade_group.setLayout(fade_layout)
+        layout.addWidget(fade_group)
+        
+        # Capped refresh rate; each tick only repaints channels that moved
+        self.monitor_timer = QTimer(self)
+        self.monitor_timer.setInterval(MONITOR_INTERVAL_MS)
+        self.monitor_timer.timeout.connect(self.refresh_level_monitor)
+        if self.auto_update_enabled:
+            self.monitor_timer.start()
+        
+        return tab
+    
+    def refresh_level_monitor(self):
+        if self.udp_receiver is not None:
+            source = self.udp_receiver.levels
+            info = "Source: UDP port {} - {} packets, {} lost".format(
+                self.udp_receiver.port, self.udp_receiver.packets, self.udp_receiver.lost)
+            if self.udp_receiver.error is not None:
+                info += ", {} errors (last: {})".format(self.udp_receiver.errors, self.udp_receiver.error)
+        else:
+            source = self.mirror.levels.values
+            info = "Source: last values read from or written to the LanBox"
+        
+        changed = self.level_history.capture(source)
+        if changed:
+            self.level_grid.set_levels(self.level_history.latest(), changed)
+        self.monitor_info_label.setText("{} ({} channels changed)".format(info, len(changed)))
+    
+    def start_fade(self, crossfade):
+        if not self.connected:
+            self.append_to_log("Not connected to LanBox!")
+            return
+        
+        try:
+            if self.fader is None:
+                # Created on first use: the fade engine pulls in NumPy
+                from lanbox.fade import FadeEngine
+                self.fader = FadeEngine(self.connection, self.mirror)
+            first, _, last = self.fade_channels_input.text().partition("-")
+            channels = range(int(first), int(last or first) + 1)
+            level = self.fade_level_input.value()
+            duration = self.fade_time_input.value()
+            levels = {channel: level for channel in channels}
+            if crossfade:
+                self.fader.crossfade(levels, duration)
+            else:
+                self.fader.fade(levels, duration)
+            self.append_to_log("{} channels {}-{} to {} over {:.1f}s".format(
+                "Crossfading" if crossfade else "Fading", channels.start, channels.stop - 1, level, duration))
+        except Exception as e:
+            self.append_to_log("Error starting fade: {}".format(str(e)))
+    
+    def stop_fade(self):
+        if self.fader is not None:
+            self.fader.stop()
+            self.append_to_log("Fades stopped")
+    
+    def create_statistics_tab(self):
+        tab = QWidget()
+        layout = QVBoxLayout(tab)
+        
+        # Link totals
+        totals_group = QGroupBox("Link")
+        totals_layout = QGridLayout()
+        
+        self.stats_bytes_label = QLabel("-")
+        self.stats_rate_label = QLabel("-")
+        self.stats_queue_label = QLabel("-")
+        self.stats_reconnects_label = QLabel("-")
+        
+        totals_layout.addWidget(QLabel("Bytes sent / received:"), 0, 0)
+        totals_layout.addWidget(self.stats_bytes_label, 0, 1)
+        totals_layout.addWidget(QLabel("Throughput:"), 1, 0)
+        totals_layout.addWidget(self.stats_rate_label, 1, 1)
+        totals_layout.addWidget(QLabel("In flight / backlog (max):"), 2, 0)
+        totals_layout.addWidget(self.stats_queue_label, 2, 1)
+        totals_layout.addWidget(QLabel("Reconnects:"), 3, 0)
+        totals_layout.addWidget(self.stats_reconnects_label, 3, 1)
+        
+        totals_group.setLayout(totals_layout)
+        layout.addWidget(totals_group)
+        
+        # Per-opcode counts and round-trip times
+        opcode_group = QGroupBox("Commands")
+        opcode_layout = QVBoxLayout()
+        
+        self.stats_table = QTableWidget(0, 9)
+        self.stats_table.setHorizontalHeaderLabels(
+            ["Opcode", "Command", "Sent", "Replied", "Rejected", "Failed", "Replays", "RTT p50", "RTT p99"])
+        self.stats_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.stats_table.verticalHeader().hide()
+        self.stats_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        opcode_layout.addWidget(self.stats_table)
+        
+        opcode_group.setLayout(opcode_layout)
+        layout.addWidget(opcode_group)
+        
+        # Export and reset
+        export_group = QGroupBox("Export")
+        export_layout = QHBoxLayout()
+        
+        export_json_btn = QPushButton("Export JSON...")
+        export_json_btn.clicked.connect(lambda: self.export_statistics("json"))
+        export_prom_btn = QPushButton("Export Prometheus...")
+        export_prom_btn.clicked.connect(lambda: self.export_statistics("prom"))
+        reset_stats_btn = QPushButton("Reset")
+        reset_stats_btn.clicked.connect(self.reset_statistics)
+        self.metrics_serve_checkbox = QCheckBox("Serve /metrics on port")
+        self.metrics_serve_checkbox.toggled.connect(self.toggle_metrics_server)
+        self.metrics_port_input = QSpinBox()
+        self.metrics_port_input.setRange(1, 65535)
+        self.metrics_port_input.setValue(METRICS_PORT)
+        
+        export_layout.addWidget(export_json_btn)
+        export_layout.addWidget(export_prom_btn)
+        export_layout.addWidget(reset_stats_btn)
+        export_layout.addStretch()
+        export_layout.addWidget(self.metrics_serve_checkbox)
+        export_layout.addWidget(self.metrics_port_input)
+        
+        export_group.setLayout(export_layout)
+        layout.addWidget(export_group)
+        
+        # Command names per opcode, for the table
+        self.opcode_names = {}
+        for command in commands.COMMANDS:
+            self.opcode_names.setdefault(command.opcode.decode("ascii"), []).append(command.name)
+        self.stats_previous = (time.monotonic(), self.telemetry.bytes_sent, self.telemetry.bytes_received, 0)
+        
+        self.stats_timer = QTimer(self)
+        self.stats_timer.setInterval(STATS_INTERVAL_MS)
+        self.stats_timer.timeout.connect(self.refresh_statistics)
+        self.stats_timer.start()
+        self.refresh_statistics()
+        
+        return tab
+    
+    def refresh_statistics(self):
+        snapshot = self.telemetry.snapshot()
+        opcodes = snapshot["opcodes"]
+        
+        now = time.monotonic()
+        replied = sum(stats["replied"] + stats["rejected"] for stats in opcodes.values())
+        then, sent_before, received_before, replied_before = self.stats_previous
+        elapsed = max(now - then, 1e-6)
+        self.stats_previous = (now, snapshot["bytes_sent"], snapshot["bytes_received"], replied)
+        
+        self.stats_bytes_label.setText("{} / {}".format(snapshot["bytes_sent"], snapshot["bytes_received"]))
+        self.stats_rate_label.setText("{:.0f} commands/s, {:.1f} / {:.1f} KB/s".format(
+            max(0, replied - replied_before) / elapsed,
+            max(0, snapshot["bytes_sent"] - sent_before) / elapsed / 1024,
+            max(0, snapshot["bytes_received"] - received_before) / elapsed / 1024))
+        self.stats_queue_label.setText("{} / {} ({})".format(
+            snapshot["in_flight"], snapshot["backlog"], snapshot["max_in_flight"]))
+        self.stats_reconnects_label.setText(str(snapshot["reconnects"]))
+        
+        def milliseconds(seconds):
+            if seconds is None:
+                return "-"
+            if seconds == float("inf"):
+                return "> {:.0f} ms".format(snapshot["rtt_bounds"][-1] * 1000)
+            return "<= {:g} ms".format(seconds * 1000)
+        
+        self.stats_table.setRowCount(len(opcodes))
+        for row, (opcode, stats) in enumerate(opcodes.items()):
+            values = ["*" + opcode, ", ".join(self.opcode_names.get(opcode, [])),
+                      stats["sent"], stats["replied"], stats["rejected"], stats["failed"], stats["replays"],
+                      milliseconds(stats["rtt_p50"]), milliseconds(stats["rtt_p99"])]
+            for column, value in enumerate(values):
+                item = self.stats_table.item(row, column)
+                if item is None:
+                    item = QTableWidgetItem()
+                    self.stats_table.setItem(row, column, item)
+                item.setText(str(value))
+    
+    def reset_statistics(self):
+        self.telemetry.reset()
+        self.stats_previous = (time.monotonic(), 0, 0, 0)
+        self.refresh_statistics()
+        self.append_to_log("Statistics reset")
+    
+    def export_statistics(self, kind):
+        if kind == "json":
+            path, _ = QFileDialog.getSaveFileName(self, "Export Statistics", "lcopen-metrics.json", "JSON (*.json)")
+        else:
+            path, _ = QFileDialog.getSaveFileName(self, "Export Statistics", "lcopen-metrics.prom",
+                                                  "Prometheus text (*.prom *.txt)")
+        if not path:
+            return
+        
+        try:
+            with open(path, "w") as f:
+                f.write(self.telemetry.to_json() if kind == "json" else self.telemetry.to_prometheus())
+            self.append_to_log("Statistics exported to {}".format(path))
+        except OSError as e:
+            self.append_to_log("Error exporting statistics: {}".format(str(e)))
+    
+    def toggle_metrics_server(self, enabled):
+        if self.metrics_server is not None:
+            self.metrics_server.close()
+            self.metrics_server = None
+        if not enabled:
+            self.append_to_log("Metrics endpoint stopped")
+            return
+        
+        try:
+            from lanbox.telemetry import MetricsServer
+            self.metrics_server = MetricsServer(self.telemetry, port=self.metrics_port_input.value())
+            host, port = self.metrics_server.start()
+            self.append_to_log("Serving metrics at http://{}:{}/metrics and /metrics.json".format(host, port))
+        except OSError as e:
+            self.metrics_server = None
+            self.append_to_log("Error starting metrics endpoint: {}".format(str(e)))
     
     def create_communication_log_tab(self):
         tab = QWidget()
         layout = QVBoxLayout(tab)
         
-        # Communication Log
+        # Communication Log (virtualized view over a bounded ring buffer)
         log_group = QGroupBox("Communication Log")
-        self.log_output = QTextEdit()
-        self.log_output.setReadOnly(True)
+        self.log_model = LogModel(LOG_CAPACITY)
+        self.log_output = QListView()
+        self.log_output.setModel(self.log_model)
+        self.log_output.setUniformItemSizes(True)
         self.log_output.setMinimumHeight(300)
         
         clear_log_btn = QPushButton("Clear Log")
         clear_log_btn.clicked.connect(self.clear_log)
         
+        self.log_spill_checkbox = QCheckBox("Also write log to {}".format(LOG_SPILL_PATH))
+        self.log_spill_checkbox.toggled.connect(self.toggle_log_spill)
+        
         layout.addWidget(self.log_output)
+        layout.addWidget(self.log_spill_checkbox)
         layout.addWidget(clear_log_btn)
         
-        self.tabs.addTab(tab, "Communication Log")
+        self.log_timer = QTimer(self)
+        self.log_timer.setInterval(LOG_FLUSH_INTERVAL_MS)
+        self.log_timer.timeout.connect(self.flush_log)
+        self.log_timer.start()
+        
+        return tab
     
     def toggle_connection(self):
         if not self.connected:
@@ -570,59 +1256,43 @@ class LanBoxController(QMainWindow):
         conn_type = self.conn_type_combo.currentText()
         
         try:
-            if conn_type == "TCP/IP":
-                # Create TCP socket connection
-                self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                self.socket.settimeout(5.0)
-                self.socket.connect((self.ip_input.text(), self.port_input.value()))
-                
-                # Send password (as per documentation: 55 55 55 13 for "777" + carriage return)
-                password = b"777\x0d"
-                self.socket.send(password)
+            if conn_type in ("TCP/IP", "Serial", "MIDI"):
+                self.start_io_loop()
                 
-                self.connected = True
-                self.status_label.setText("Connected via TCP/IP")
-                self.status_label.setStyleSheet("QLabel { background-color: lightgreen; padding: 5px; }")
+                # Connect in the background; on_connection_event reports the outcome
+                if conn_type == "TCP/IP":
+                    from lanbox.connection import Connection
+                    self.connection = Connection(
+                        self.io_loop, self.ip_input.text(), self.port_input.value(),
+                        password=self.password_input.text().encode("ascii"),
+                        handler=self.signals.connection_event.emit, telemetry=self.telemetry,
+                        journal=self.journal)
+                elif conn_type == "Serial":
+                    # Same command pipeline over a raw serial line; there is no password
+                    from lanbox.serialport import SerialConnection
+                    self.connection = SerialConnection(
+                        self.io_loop, self.serial_input.text(), int(self.baud_input.currentText()),
+                        handler=self.signals.connection_event.emit, telemetry=self.telemetry,
+                        journal=self.journal)
+                else:
+                    # Commands travel batched in SysEx messages over the MIDI device
+                    from lanbox.midi import MidiConnection
+                    self.connection = MidiConnection(
+                        self.io_loop, self.midi_input.currentText(),
+                        handler=self.signals.connection_event.emit, telemetry=self.telemetry,
+                        journal=self.journal)
+                self.connection_type = conn_type
+                self.connection.open()
                 
-                # Update connection info
-                self.info_type.setText("TCP/IP")
-                self.info_address.setText(self.ip_input.text() + ":" + str(self.port_input.value()))
-                self.info_status.setText("Connected")
-                self.info_firmware.setText("v3.01+")
-                
-                self.append_to_log("Connected to LanBox via TCP/IP at {}:{}".format(
-                    self.ip_input.text(), self.port_input.value()))
-            
-            elif conn_type == "Serial":
-                # Simulate serial connection
-                self.connected = True
-                self.status_label.setText("Connected via Serial")
-                self.status_label.setStyleSheet("QLabel { background-color: lightgreen; padding: 5px; }")
-                
-                # Update connection info
-                self.info_type.setText("Serial")
-                self.info_address.setText(self.serial_input.text())
-                self.info_status.setText("Connected")
-                self.info_firmware.setText("v3.01+")
-                
-                self.append_to_log("Connected to LanBox via Serial at {}".format(self.serial_input.text()))
-            
-            elif conn_type == "MIDI":
-                # Simulate MIDI connection
-                self.connected = True
-                self.status_label.setText("Connected via MIDI")
-                self.status_label.setStyleSheet("QLabel { background-color: lightgreen; padding: 5px; }")
-                
-                # Update connection info
-                self.info_type.setText("MIDI")
-                self.info_address.setText(self.midi_input.currentText())
-                self.info_status.setText("Connected")
-                self.info_firmware.setText("v3.01+")
-                
-                self.append_to_log("Connected to LanBox via MIDI {}".format(self.midi_input.currentText()))
+                self.connect_btn.setEnabled(False)
+                self.status_label.setText("Connecting...")
+                self.status_label.setStyleSheet("QLabel { background-color: lightyellow; padding: 5px; }")
+                self.append_to_log("Connecting to LanBox via {} at {}".format(
+                    conn_type, self.describe_address((self.connection.host, self.connection.port))))
             
             elif conn_type == "UDP":
-                # Simulate UDP connection
+                # Listen for the box's channel broadcasts; binding fails fast if the port is taken
+                self.start_udp_receiver()
                 self.connected = True
                 self.status_label.setText("Connected via UDP")
                 self.status_label.setStyleSheet("QLabel { background-color: lightgreen; padding: 5px; }")
@@ -630,10 +1300,10 @@ class LanBoxController(QMainWindow):
                 # Update connection info
                 self.info_type.setText("UDP")
                 self.info_address.setText("Port: " + str(self.udp_port_input.value()))
-                self.info_status.setText("Connected")
+                self.info_status.setText("Listening")
                 self.info_firmware.setText("v3.01+")
                 
-                self.append_to_log("Connected to LanBox via UDP port {}".format(self.udp_port_input.value()))
+                self.append_to_log("Listening for LanBox UDP broadcasts on port {}".format(self.udp_port_input.value()))
             
         except Exception as e:
             self.connected = False
@@ -641,37 +1311,371 @@ class LanBoxController(QMainWindow):
             self.status_label.setStyleSheet("QLabel { background-color: lightcoral; padding: 5px; }")
             self.append_to_log("Connection failed: {}".format(str(e)))
     
+    def start_io_loop(self):
+        """The I/O thread every transport runs on, UDP included; started on first use"""
+        if self.io_loop is None:
+            from lanbox.ioloop import IOLoop
+            self.io_loop = IOLoop()
+            self.io_loop.start()
+        return self.io_loop
+    
+    def describe_address(self, address):
+        """host:port for TCP/IP, the device and baud rate for serial, the device for MIDI"""
+        if self.connection_type == "Serial":
+            return "{} ({} baud)".format(*address)
+        if self.connection_type == "MIDI":
+            return "{} (SysEx)".format(address[0])
+        return "{}:{}".format(*address)
+    
     def disconnect_from_lanbox(self):
-        if self.socket:
-            try:
-                self.socket.close()
-            except:
-                pass
+        if self.connection:
+            # Drop the handler first so the close is not reported as a link loss
+            self.connection.handler = None
+            self.connection.close()
+            self.connection = None
+        self.coalescer = None
+        self.stop_fader()
+        self.stop_poller()
+        self.stop_udp_receiver()
         self.connected = False
         self.status_label.setText("Disconnected")
         self.status_label.setStyleSheet("QLabel { background-color: lightgray; padding: 5px; }")
         self.info_status.setText("Disconnected")
         self.append_to_log("Disconnected from LanBox")
     
+    def on_connection_event(self, event, detail):
+        """Update the UI for state changes reported by the I/O thread"""
+        from lanbox.connection import CONNECTED, RECONNECTING, FAILED, CLOSED
+        self.connect_btn.setEnabled(True)
+        
+        if event == CONNECTED:
+            # Whatever the box held may be gone after a reboot, so nothing is assumed across links
+            self.mirror.invalidate()
+            if self.connected:
+                # The connection manager re-established a lost link and replayed the queue
+                self.status_label.setText("Connected via {}".format(self.connection_type))
+                self.status_label.setStyleSheet("QLabel { background-color: lightgreen; padding: 5px; }")
+                self.info_status.setText("Connected")
+                self.append_to_log("Reconnected to LanBox at {}".format(self.describe_address(detail)))
+                if self.poller is not None:
+                    self.poller.forget()
+                if self.cue_sync_on_connect:
+                    self.sync_cue_lists()
+                return
+            
+            self.connected = True
+            from lanbox.coalesce import Coalescer
+            self.coalescer = Coalescer(self.connection, LIVE_UPDATE_INTERVAL)
+            self.start_poller()
+            self.status_label.setText("Connected via {}".format(self.connection_type))
+            self.status_label.setStyleSheet("QLabel { background-color: lightgreen; padding: 5px; }")
+            
+            # Update connection info
+            self.info_type.setText(self.connection_type)
+            self.info_address.setText(self.describe_address(detail))
+            self.info_status.setText("Connected")
+            self.info_firmware.setText("v3.01+")
+            
+            self.append_to_log("Connected to LanBox via {} at {}".format(self.connection_type, self.describe_address(detail)))
+            if self.cue_sync_on_connect:
+                self.sync_cue_lists()
+        
+        elif event == RECONNECTING:
+            # Commands keep queueing while the link is down and are replayed afterwards
+            attempt, delay, reason = detail
+            self.status_label.setText("Reconnecting...")
+            self.status_label.setStyleSheet("QLabel { background-color: lightyellow; padding: 5px; }")
+            self.info_status.setText("Reconnecting (attempt {})".format(attempt))
+            self.append_to_log("Link lost ({}), reconnecting in {:.2f}s".format(str(reason), delay))
+        
+        elif event == FAILED:
+            self.connected = False
+            self.connection = None
+            self.coalescer = None
+            self.stop_fader()
+            self.stop_poller()
+            self.status_label.setText("Connection Failed")
+            self.status_label.setStyleSheet("QLabel { background-color: lightcoral; padding: 5px; }")
+            self.append_to_log("Connection failed: {}".format(str(detail)))
+        
+        elif event == CLOSED:
+            self.connection = None
+            self.coalescer = None
+            self.stop_fader()
+            self.stop_poller()
+            self.connected = False
+            self.status_label.setText("Connection Lost")
+            self.status_label.setStyleSheet("QLabel { background-color: lightcoral; padding: 5px; }")
+            self.info_status.setText("Disconnected")
+            self.append_to_log("Connection lost: {}".format(str(detail)))
+    
+    def send_command(self, frame, success_message, error_message, on_reply=None, key=None):
+        """Queue a frame on the I/O thread; the outcome is logged once the box replies
+        
+        success_message may be a callable taking the decoded reply tuple.
+        on_reply, if given, is called with the reply on the I/O thread.
+        Frames with a key go through the coalescer, so a newer value for the
+        same key replaces one that has not been sent yet.
+        """
+        if self.connection is None:
+            self.append_to_log("{}: no open transport".format(error_message))
+            return
+        
+        def report(future):
+            # Runs on the I/O thread, so only emit signals from here
+            if future.cancelled():
+                # Superseded by a newer value before it was sent
+                return
+            if future.exception() is None:
+                if on_reply is not None:
+                    on_reply(future.result())
+                message = success_message
+                if callable(message):
+                    message = message(future.result())
+                self.signals.log_message.emit(message)
+            else:
+                self.signals.log_message.emit("{}: {}".format(error_message, str(future.exception())))
+        
+        if key is not None and self.coalescer is not None:
+            future = self.coalescer.submit(key, frame)
+        else:
+            future = self.connection.send(frame)
+        future.add_done_callback(report)
+    
+    def send_batch(self, frames, success_message, error_message):
+        """Queue several frames at once and log a single line when all have replied"""
+        if self.connection is None:
+            self.append_to_log("{}: no open transport".format(error_message))
+            return
+        self.report_batch([self.connection.send(frame) for frame in frames],
+                          success_message, error_message)
+    
+    def report_batch(self, futures, success_message, error_message):
+        """Log a single line once every future in a batch has completed"""
+        if not futures:
+            self.append_to_log(success_message)
+            return
+        
+        remaining = [len(futures)]
+        errors = []
+        lock = threading.Lock()
+        
+        def report(future):
+            with lock:
+                remaining[0] -= 1
+                if future.exception() is not None:
+                    errors.append(future.exception())
+                finished = remaining[0] == 0
+            if finished:
+                if errors:
+                    self.signals.log_message.emit("{}: {} of {} commands failed, first: {}".format(
+                        error_message, len(errors), len(futures), str(errors[0])))
+                else:
+                    self.signals.log_message.emit(success_message)
+        
+        for future in futures:
+            future.add_done_callback(report)
+    
+    def closeEvent(self, event):
+        if self.connection:
+            self.connection.handler = None
+            self.connection.close()
+        self.stop_udp_receiver()
+        for timer in (self.monitor_timer, self.log_timer, self.stats_timer):
+            if timer is not None:
+                timer.stop()
+        if self.metrics_server is not None:
+            self.metrics_server.close()
+        self.comm_log.disable_spill()
+        if self.io_loop is not None:
+            self.io_loop.stop()
+        if self.journal is not None:
+            self.journal.close()
+        super().closeEvent(event)
+    
     def append_to_log(self, message):
-        timestamp = time.strftime("%H:%M:%S")
-        self.log_output.append("[{}] {}".format(timestamp, message))
+        # Cheap and thread-safe; the view picks new lines up on the next flush
+        self.comm_log.append(message)
+    
+    def flush_log(self):
+        pending = self.comm_log.take_pending()
+        if not pending:
+            return
+        scrollbar = self.log_output.verticalScrollBar()
+        at_bottom = scrollbar.value() >= scrollbar.maximum()
+        self.log_model.append_lines(pending)
+        if at_bottom:
+            self.log_output.scrollToBottom()
     
     def clear_log(self):
-        self.log_output.clear()
+        self.comm_log.clear()
+        self.log_model.clear()
+    
+    def toggle_log_spill(self, enabled):
+        try:
+            if enabled:
+                self.comm_log.enable_spill(LOG_SPILL_PATH)
+                self.append_to_log("Writing log to {}".format(LOG_SPILL_PATH))
+            else:
+                self.comm_log.disable_spill()
+        except OSError as e:
+            self.append_to_log("Error writing log file: {}".format(str(e)))
+    
+    def toggle_journal(self, enabled):
+        journal = self.journal
+        if enabled and journal is None:
+            try:
+                from lanbox.journal import Journal
+                journal = self.journal = Journal()
+                self.append_to_log("Journaling commands to {}".format(journal.path))
+            except (OSError, ValueError) as e:
+                self.append_to_log("Error opening command journal: {}".format(str(e)))
+                return
+        elif not enabled and journal is not None:
+            self.journal = None
+            self.append_to_log("Stopped journaling commands")
+        else:
+            return
+        
+        if self.connection is not None:
+            # The connection journals on the I/O thread, so switch it there; closing is queued behind it
+            self.io_loop.call_soon(setattr, self.connection, "journal", self.journal)
+            if self.journal is None:
+                self.io_loop.call_soon(journal.close)
+        elif self.journal is None:
+            journal.close()
+        self.show_journal_info()
+    
+    def show_journal_info(self):
+        if self.journal_info_label is None:
+            return
+        if self.journal is None:
+            self.journal_info_label.setText("Journal: off")
+        else:
+            self.journal_info_label.setText("Journal: {} records in {}".format(self.journal.count, self.journal.path))
+    
+    def compact_journal(self):
+        if self.journal is None:
+            self.append_to_log("Command journal is off")
+            return
+        
+        journal = self.journal
+        
+        def work():
+            # Rewrites the whole file, so not on the GUI thread
+            dropped = journal.compact()
+            self.signals.journal_changed.emit()
+            return "Compacted command journal: {} records dropped, {} left".format(dropped, journal.count)
+        
+        self.run_in_background("Compacting command journal", work, "Error compacting command journal")
+    
+    def replay_journal(self):
+        if not self.connected:
+            self.append_to_log("Not connected to LanBox!")
+            return
+        if self.journal is None:
+            self.append_to_log("Command journal is off")
+            return
+        
+        connection = self.connection
+        journal = self.journal
+        
+        def work():
+            from lanbox.journal import replay
+            # Compacts first, then pipelined and journaled afresh as the box answers
+            sent, future = replay(connection, journal)
+            try:
+                future.result()
+            finally:
+                self.signals.journal_changed.emit()
+            return "Replayed command journal: {} commands".format(sent)
+        
+        self.run_in_background("Replaying command journal", work, "Error replaying command journal")
     
     def toggle_auto_update(self):
         self.auto_update_enabled = not self.auto_update_enabled
         if self.auto_update_enabled:
             self.auto_update_btn.setText("Disable Auto Update")
+            if self.monitor_timer is not None:
+                self.monitor_timer.start()
+            if self.poller is not None:
+                self.poller.start()
             self.append_to_log("Auto Update enabled")
         else:
             self.auto_update_btn.setText("Enable Auto Update")
+            if self.monitor_timer is not None:
+                self.monitor_timer.stop()
+            if self.poller is not None:
+                self.poller.stop()
             self.append_to_log("Auto Update disabled")
     
+    def toggle_cue_sync_on_connect(self, enabled):
+        self.cue_sync_on_connect = enabled
+    
     def update_now(self):
         self.append_to_log("Manual update initiated")
-        # In a real implementation, this would trigger an update
+        if self.monitor_timer is not None:
+            self.refresh_level_monitor()
+        if self.poller is not None:
+            self.poller.poll_now()
+    
+    def toggle_poll_patch_gains(self, enabled):
+        self.poll_patch_gains = enabled
+        if self.poller is not None:
+            # The sweep's ranges are fixed per poller, so start a fresh one
+            self.stop_poller()
+            self.start_poller()
+    
+    def start_poller(self):
+        """Create the status poller for the open connection; it sweeps while Auto Update is on"""
+        from lanbox.poller import StatusPoller
+        channels = range(1, 513) if self.poll_patch_gains else ()
+        self.poller = StatusPoller(self.connection, self.signals.status_polled.emit, self.mirror,
+                                   patch=channels, gains=channels)
+        if self.auto_update_enabled:
+            self.poller.start()
+    
+    def stop_fader(self):
+        # Running fades would otherwise keep ticking frames into a closed connection
+        if self.fader is not None:
+            self.fader.stop()
+            self.fader = None
+    
+    def stop_poller(self):
+        if self.poller is not None:
+            self.poller.stop()
+            self.poller = None
+    
+    def on_status_polled(self, changes):
+        if self.poller is None:
+            return
+        layers = changes.get("layers", {})
+        self.show_layer_status(layers)
+        channels = len(changes.get("patch", {})) + len(changes.get("gains", {}))
+        if self.poll_info_label is not None:
+            self.poll_info_label.setText("Layer status: every {:.1f}s, sweep {:.0f} ms, {} layers{} changed".format(
+                self.poller.interval, self.poller.sweep_time * 1000, len(layers),
+                ", {} patch/gain entries".format(channels) if channels else ""))
+    
+    def show_layer_status(self, layers):
+        """Write changed layer fields into the live table, leaving every other cell alone"""
+        if self.layer_table is None:
+            return
+        from lanbox.poller import LAYER_FIELDS
+        for layer, fields in layers.items():
+            for column, field in enumerate(LAYER_FIELDS):
+                if field not in fields:
+                    continue
+                value = fields[field]
+                if field == "mix_mode":
+                    value = self.mix_mode_input.itemText(value) or value
+                elif field == "name":
+                    value = value.decode("latin-1")
+                item = self.layer_table.item(layer - 1, column)
+                if item is None:
+                    item = QTableWidgetItem()
+                    self.layer_table.setItem(layer - 1, column, item)
+                item.setText(str(value))
     
     def create_cue_list(self):
         if not self.connected:
@@ -681,12 +1685,10 @@ class LanBoxController(QMainWindow):
         cue_list_num = self.create_cue_input.value()
         
         try:
-            # Command: *5F CLIS # where CLIS is 16bit number (Create Cue List)
-            command = struct.pack('>H', cue_list_num)  # 16-bit big-endian
-            full_command = b'*5F' + command + b'#'
+            full_command = commands.create_cue_list(cue_list_num)
             
-            self.socket.send(full_command)
-            self.append_to_log("Created Cue List: {}".format(cue_list_num))
+            self.send_command(full_command, "Created Cue List: {}".format(cue_list_num),
+                              "Error creating cue list")
             
         except Exception as e:
             self.append_to_log("Error creating cue list: {}".format(str(e)))
@@ -699,12 +1701,10 @@ class LanBoxController(QMainWindow):
         cue_list_num = self.load_cue_input.value()
         
         try:
-            # Command: *5D CLIS # where CLIS is 16bit number (Load Cue List)
-            command = struct.pack('>H', cue_list_num)  # 16-bit big-endian
-            full_command = b'*5D' + command + b'#'
+            full_command = commands.load_cue_list(cue_list_num)
             
-            self.socket.send(full_command)
-            self.append_to_log("Loaded Cue List: {}".format(cue_list_num))
+            self.send_command(full_command, "Loaded Cue List: {}".format(cue_list_num),
+                              "Error loading cue list")
             
         except Exception as e:
             self.append_to_log("Error loading cue list: {}".format(str(e)))
@@ -717,12 +1717,10 @@ class LanBoxController(QMainWindow):
         cue_list_num = self.save_cue_input.value()
         
         try:
-            # Command: *5E CLIS # where CLIS is 16bit number (Save Cue List)
-            command = struct.pack('>H', cue_list_num)  # 16-bit big-endian
-            full_command = b'*5E' + command + b'#'
+            full_command = commands.save_cue_list(cue_list_num)
             
-            self.socket.send(full_command)
-            self.append_to_log("Saved Cue List: {}".format(cue_list_num))
+            self.send_command(full_command, "Saved Cue List: {}".format(cue_list_num),
+                              "Error saving cue list")
             
         except Exception as e:
             self.append_to_log("Error saving cue list: {}".format(str(e)))
@@ -735,12 +1733,11 @@ class LanBoxController(QMainWindow):
         cue_list_num = self.clear_cue_input.value()
         
         try:
-            # Command: *5A CLIS # where CLIS is 16bit number (Clear Cue List)
-            command = struct.pack('>H', cue_list_num)  # 16-bit big-endian
-            full_command = b'*5A' + command + b'#'
+            full_command = commands.clear_cue_list(cue_list_num)
             
-            self.socket.send(full_command)
-            self.append_to_log("Cleared Cue List: {}".format(cue_list_num))
+            self.send_command(full_command, "Cleared Cue List: {}".format(cue_list_num),
+                              "Error clearing cue list",
+                              on_reply=lambda reply: self.signals.cue_step_edited.emit(0, "clear", cue_list_num))
             
         except Exception as e:
             self.append_to_log("Error clearing cue list: {}".format(str(e)))
@@ -754,13 +1751,11 @@ class LanBoxController(QMainWindow):
         step_number = self.insert_step_input.value()
         
         try:
-            # Command: *5C LA (CS) # where LA is 8bit, CS is optional 8bit
-            command = struct.pack('>BB', layer_id, step_number)
-            full_command = b'*5C' + command + b'#'
+            full_command = commands.insert_step(layer_id, step_number)
             
-            self.socket.send(full_command)
-            self.append_to_log("Inserted step {} in Layer {}: {}".format(
-                step_number, layer_id, "success"))
+            self.send_command(full_command, "Inserted step {} in Layer {}: {}".format(
+                step_number, layer_id, "success"), "Error inserting step",
+                on_reply=lambda reply: self.signals.cue_step_edited.emit(layer_id, "insert", step_number))
             
         except Exception as e:
             self.append_to_log("Error inserting step: {}".format(str(e)))
@@ -773,12 +1768,11 @@ class LanBoxController(QMainWindow):
         layer_id = self.append_layer_input.value()
         
         try:
-            # Command: *5C LA # where LA is 8bit (append to layer)
-            command = struct.pack('>B', layer_id)
-            full_command = b'*5C' + command + b'#'
+            full_command = commands.append_step(layer_id)
             
-            self.socket.send(full_command)
-            self.append_to_log("Appended step in Layer {}: success".format(layer_id))
+            self.send_command(full_command, "Appended step in Layer {}: success".format(layer_id),
+                              "Error appending step",
+                              on_reply=lambda reply: self.signals.cue_step_edited.emit(layer_id, "append", 0))
             
         except Exception as e:
             self.append_to_log("Error appending step: {}".format(str(e)))
@@ -792,16 +1786,124 @@ class LanBoxController(QMainWindow):
         step_number = self.delete_step_input.value()
         
         try:
-            # Command: *5B LA CS # where LA is 8bit, CS is 8bit
-            command = struct.pack('>BB', layer_id, step_number)
-            full_command = b'*5B' + command + b'#'
+            full_command = commands.delete_step(layer_id, step_number)
             
-            self.socket.send(full_command)
-            self.append_to_log("Deleted step {} in Layer {}: success".format(step_number, layer_id))
+            self.send_command(full_command, "Deleted step {} in Layer {}: success".format(step_number, layer_id),
+                              "Error deleting step",
+                              on_reply=lambda reply: self.signals.cue_step_edited.emit(layer_id, "delete", step_number))
             
         except Exception as e:
             self.append_to_log("Error deleting step: {}".format(str(e)))
     
+    def sync_cue_lists(self):
+        if not self.connected:
+            self.append_to_log("Not connected to LanBox!")
+            return
+        
+        from lanbox.cuesync import CueListCache, CueListSync, default_cache_directory
+        connection = self.connection
+        
+        def work():
+            cache = CueListCache(default_cache_directory(connection.host, connection.port))
+            report = CueListSync(connection, cache).sync()
+            for number in report.conflicts:
+                if number in report.kept:
+                    self.signals.log_message.emit(
+                        "Cue List {} was deleted on the LanBox but edited locally, kept the local copy".format(number))
+                else:
+                    self.signals.log_message.emit(
+                        "Cue List {} changed on both sides, kept the LanBox version".format(number))
+            return "Synced cue lists: {}".format(report)
+        
+        self.run_in_background("Cue list sync", work, "Error syncing cue lists")
+    
+    def run_in_background(self, name, work, error_message):
+        """Run a blocking protocol job off the GUI and I/O threads; work() returns the line to log"""
+        if self.worker is not None and self.worker.is_alive():
+            self.append_to_log("{} is still running".format(self.worker.name))
+            return
+        
+        def run():
+            try:
+                self.signals.log_message.emit(work())
+            except Exception as e:
+                self.signals.log_message.emit("{}: {}".format(error_message, str(e)))
+        
+        self.append_to_log("{}...".format(name))
+        self.worker = threading.Thread(target=run, name=name, daemon=True)
+        self.worker.start()
+    
+    def open_cue_editor(self):
+        if not self.connected:
+            self.append_to_log("Not connected to LanBox!")
+            return
+            
+        layer_id = self.editor_layer_input.value()
+        
+        def open_size(status):
+            # Runs on the I/O thread once the layer status is in; status[3] is its cue list
+            cue_list = status[3]
+            self.send_command(commands.get_cue_list_size(cue_list),
+                              lambda size: "Opened Cue List {} of Layer {}: {} steps".format(cue_list, layer_id, size[0]),
+                              "Error opening cue list",
+                              on_reply=lambda size: self.signals.cue_list_opened.emit(layer_id, cue_list, size[0]))
+        
+        try:
+            full_command = commands.get_layer_status(layer_id)
+            
+            self.send_command(full_command, "Reading cue list of Layer {}".format(layer_id),
+                              "Error opening cue list", on_reply=open_size)
+            
+        except Exception as e:
+            self.append_to_log("Error opening cue list: {}".format(str(e)))
+    
+    def on_cue_list_opened(self, layer_id, cue_list, size):
+        self.cue_model.open_list(layer_id, cue_list, size)
+        self.cue_editor_info.setText("Cue List {} ({} steps)".format(cue_list, size))
+    
+    def fetch_cue_steps(self, cue_list, generation, first, count):
+        """Read one page of steps, pipelined; the model is updated once the whole page is in"""
+        if self.connection is None:
+            return
+        futures = [self.connection.send_command(commands.get_cue_step, cue_list, first + offset + 1)
+                   for offset in range(count)]
+        remaining = [len(futures)]
+        lock = threading.Lock()
+        
+        def done(future):
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            rows = [(first + offset, f.result()) for offset, f in enumerate(futures) if f.exception() is None]
+            if len(rows) < len(futures):
+                self.signals.log_message.emit("Error reading steps {}-{} of Cue List {}".format(
+                    first + 1, first + count, cue_list))
+            self.signals.cue_steps.emit(generation, rows)
+        
+        for future in futures:
+            future.add_done_callback(done)
+    
+    def on_cue_steps(self, generation, rows):
+        self.cue_model.apply_steps(generation, rows)
+    
+    def on_cue_step_edited(self, layer_id, edit, step_number):
+        """Apply a confirmed step edit to the open editor without reloading it"""
+        steps = self.cue_model.steps
+        if edit == "clear":
+            if steps.cue_list == step_number:
+                self.on_cue_list_opened(self.cue_model.layer, step_number, 0)
+            return
+        if layer_id != self.cue_model.layer:
+            return
+        if edit == "insert":
+            self.cue_model.insert_step(step_number - 1)
+        elif edit == "append":
+            self.cue_model.insert_step(len(steps))
+        elif edit == "delete":
+            self.cue_model.delete_step(step_number - 1)
+        self.cue_editor_info.setText("Cue List {} ({} steps)".format(steps.cue_list, len(steps)))
+    
     def set_mix_mode(self):
         if not self.connected:
             self.append_to_log("Not connected to LanBox!")
@@ -811,13 +1913,11 @@ class LanBoxController(QMainWindow):
         mix_mode = self.mix_mode_input.currentIndex()
         
         try:
-            # Command: *47 LA MM # where LA is 8bit, MM is 8bit mix mode
-            command = struct.pack('>BB', layer_id, mix_mode)
-            full_command = b'*47' + command + b'#'
+            full_command = commands.set_mix_mode(layer_id, mix_mode)
             
-            self.socket.send(full_command)
-            self.append_to_log("Set Layer {} mix mode to: {}".format(
-                layer_id, self.mix_mode_input.currentText()))
+            self.send_command(full_command, "Set Layer {} mix mode to: {}".format(
+                layer_id, self.mix_mode_input.currentText()), "Error setting mix mode",
+                on_reply=lambda reply: self.mirror.mix_modes.update([(layer_id, mix_mode)]))
             
         except Exception as e:
             self.append_to_log("Error setting mix mode: {}".format(str(e)))
@@ -831,16 +1931,20 @@ class LanBoxController(QMainWindow):
         transparency = self.trans_depth_input.value()
         
         try:
-            # Command: *63 LA TD # where LA is 8bit, TD is 8bit transparency
-            command = struct.pack('>BB', layer_id, transparency)
-            full_command = b'*63' + command + b'#'
+            full_command = commands.set_transparency(layer_id, transparency)
             
-            self.socket.send(full_command)
-            self.append_to_log("Set Layer {} transparency to: {}".format(layer_id, transparency))
+            self.send_command(full_command, "Set Layer {} transparency to: {}".format(layer_id, transparency),
+                              "Error setting transparency", key=(b'63', layer_id),
+                              on_reply=lambda reply: self.mirror.transparencies.update([(layer_id, transparency)]))
             
         except Exception as e:
             self.append_to_log("Error setting transparency: {}".format(str(e)))
     
+    def live_update_transparency(self):
+        # Every intermediate value while dragging goes through the coalescer
+        if self.connected:
+            self.set_transparency()
+    
     def get_layer_status(self):
         if not self.connected:
             self.append_to_log("Not connected to LanBox!")
@@ -849,32 +1953,104 @@ class LanBoxController(QMainWindow):
         layer_id = self.layer_status_input.value()
         
         try:
-            # Command: *49 LA # where LA is 8bit (Get Layer Status)
-            command = struct.pack('>B', layer_id)
-            full_command = b'*49' + command + b'#'
+            full_command = commands.get_layer_status(layer_id)
             
-            self.socket.send(full_command)
-            self.append_to_log("Requested status for Layer {}".format(layer_id))
+            self.send_command(full_command, lambda reply: (
+                "Layer {} status: mix mode {}, transparency {}, priority {}, "
+                "cue list {} step {}, name '{}'".format(
+                    layer_id, self.mix_mode_input.itemText(reply[0]) or reply[0], reply[1],
+                    reply[2], reply[3], reply[4], reply[5].rstrip(b"\0").decode("latin-1"))),
+                "Error getting layer status", on_reply=lambda reply: self.remember_layer(layer_id, reply))
             
         except Exception as e:
             self.append_to_log("Error getting layer status: {}".format(str(e)))
     
+    def remember_layer(self, layer_id, status):
+        """Record a layer status reply in the mirror"""
+        self.mirror.mix_modes.update([(layer_id, status[0])])
+        self.mirror.transparencies.update([(layer_id, status[1])])
+        self.mirror.priorities.update([(layer_id, status[2])])
+        self.mirror.names.update([(layer_id, status[5].rstrip(b"\0"))])
+    
     def set_layer_name(self):
         if not self.connected:
             self.append_to_log("Not connected to LanBox!")
             return
             
         layer_id = self.layer_name_input.value()
-        name = self.name_text_input.text()[:15]  # Limit to 15 chars
+        name = commands.layer_name(self.name_text_input.text())
         
         try:
-            # Command: *48 LA NAME # where LA is 8bit, NAME is string
-            # This would require more complex encoding for strings in real implementation
-            self.append_to_log("Set Layer {} name to: {}".format(layer_id, name))
+            full_command = commands.set_layer_name(layer_id, name)
+            
+            self.send_command(full_command, "Set Layer {} name to: {}".format(layer_id, name.decode("latin-1")),
+                              "Error setting layer name",
+                              on_reply=lambda reply: self.mirror.names.update([(layer_id, name)]))
             
         except Exception as e:
             self.append_to_log("Error setting layer name: {}".format(str(e)))
     
+    def capture_layer_scene(self):
+        if not self.connected:
+            self.append_to_log("Not connected to LanBox!")
+            return
+            
+        name = self.scene_name_input.text().strip()
+        if not name:
+            self.append_to_log("Give the layer scene a name")
+            return
+        from lanbox.scene import capture_scene
+        connection = self.connection
+        
+        def work():
+            self.signals.scene_captured.emit(capture_scene(connection, name, mirror=self.mirror))
+            return "Captured layer scene '{}'".format(name)
+        
+        self.run_in_background("Capturing layer scene", work, "Error capturing layer scene")
+    
+    def on_scene_captured(self, scene):
+        try:
+            self.scene_book.put(scene)
+        except OSError as e:
+            self.append_to_log("Error saving layer scene: {}".format(str(e)))
+        self.scene_combo.clear()
+        self.scene_combo.addItems(self.scene_book.names())
+        self.scene_combo.setCurrentText(scene.name)
+    
+    def recall_layer_scene(self):
+        if not self.connected:
+            self.append_to_log("Not connected to LanBox!")
+            return
+            
+        name = self.scene_combo.currentText()
+        
+        try:
+            from lanbox.scene import recall_scene
+            # Only layers differing from the mirror are sent, all in one flush
+            sent, future = recall_scene(self.connection, self.mirror, self.scene_book.get(name))
+            
+            def report(future):
+                if future.exception() is None:
+                    self.signals.log_message.emit("Recalled layer scene '{}': {} commands in one batch".format(name, sent))
+                else:
+                    self.signals.log_message.emit("Error recalling layer scene '{}': {}".format(name, str(future.exception())))
+            
+            future.add_done_callback(report)
+            
+        except Exception as e:
+            self.append_to_log("Error recalling layer scene: {}".format(str(e)))
+    
+    def delete_layer_scene(self):
+        name = self.scene_combo.currentText()
+        
+        try:
+            self.scene_book.remove(name)
+            self.scene_combo.removeItem(self.scene_combo.currentIndex())
+            self.append_to_log("Deleted layer scene '{}'".format(name))
+            
+        except Exception as e:
+            self.append_to_log("Error deleting layer scene: {}".format(str(e)))
+    
     def set_layer_priority(self):
         if not self.connected:
             self.append_to_log("Not connected to LanBox!")
@@ -884,12 +2060,11 @@ class LanBoxController(QMainWindow):
         priority = self.priority_value_input.value()
         
         try:
-            # Command: *4A LA PR # where LA is 8bit, PR is 8bit priority
-            command = struct.pack('>BB', layer_id, priority)
-            full_command = b'*4A' + command + b'#'
+            full_command = commands.set_layer_priority(layer_id, priority)
             
-            self.socket.send(full_command)
-            self.append_to_log("Set Layer {} priority to: {}".format(layer_id, priority))
+            self.send_command(full_command, "Set Layer {} priority to: {}".format(layer_id, priority),
+                              "Error setting layer priority",
+                              on_reply=lambda reply: self.mirror.priorities.update([(layer_id, priority)]))
             
         except Exception as e:
             self.append_to_log("Error setting layer priority: {}".format(str(e)))
@@ -903,17 +2078,42 @@ class LanBoxController(QMainWindow):
         mixer_channel = self.patch_mixer_input.value()
         
         try:
-            # Command: *81 DMX1 CHA1 DMX2 CHA2 ... # (as per documentation)
-            # Simple example with one channel
-            command = struct.pack('>HH', dmx_channel, mixer_channel)
-            full_command = b'*81' + command + b'#'
+            full_command = commands.patch_channel(dmx_channel, mixer_channel)
             
-            self.socket.send(full_command)
-            self.append_to_log("Patched DMX {} to Mixer {}".format(dmx_channel, mixer_channel))
+            self.send_command(full_command, "Patched DMX {} to Mixer {}".format(dmx_channel, mixer_channel),
+                              "Error patching channels",
+                              on_reply=lambda reply: self.mirror.patch.update([(dmx_channel, mixer_channel)]))
             
         except Exception as e:
             self.append_to_log("Error patching channels: {}".format(str(e)))
     
+    def apply_patch_file(self):
+        if not self.connected:
+            self.append_to_log("Not connected to LanBox!")
+            return
+        
+        path, _ = QFileDialog.getOpenFileName(self, "Apply Patch File", "",
+                                              "Patch Files (*.txt *.csv *.patch);;All Files (*)")
+        if not path:
+            return
+        
+        if self.connection is None:
+            self.append_to_log("Error applying patch file: no open transport")
+            return
+        
+        try:
+            # Command: *81 DMX1 CHA1 DMX2 CHA2 ... # carrying only channels that differ
+            # from the mirror, packed as full as each frame allows
+            from lanbox.patch import read_patch_file
+            patch = read_patch_file(path)
+            futures = self.mirror.sync(self.connection, patch=patch)
+            
+            self.report_batch(futures, "Applied patch file {}: {} channels, {} frames sent".format(
+                path, len(patch), len(futures)), "Error applying patch file")
+            
+        except Exception as e:
+            self.append_to_log("Error applying patch file: {}".format(str(e)))
+    
     def get_patch(self):
         if not self.connected:
             self.append_to_log("Not connected to LanBox!")
@@ -922,12 +2122,11 @@ class LanBoxController(QMainWindow):
         dmx_channel = self.get_patch_dmx_input.value()
         
         try:
-            # Command: *80 DMX1 # where DMX1 is 16bit (Get Patch)
-            command = struct.pack('>H', dmx_channel)
-            full_command = b'*80' + command + b'#'
+            full_command = commands.get_patch(dmx_channel)
             
-            self.socket.send(full_command)
-            self.append_to_log("Requested patch for DMX {}".format(dmx_channel))
+            self.send_command(full_command, lambda reply: "DMX {} is patched to Mixer {}".format(
+                dmx_channel, reply[0]), "Error getting patch",
+                on_reply=lambda reply: self.mirror.patch.update([(dmx_channel, reply[0])]))
             
         except Exception as e:
             self.append_to_log("Error getting patch: {}".format(str(e)))
@@ -941,16 +2140,21 @@ class LanBoxController(QMainWindow):
         gain_value = self.gain_value_input.value()
         
         try:
-            # Command: *82 DMX1 GAIN # where DMX1 is 16bit, GAIN is 8bit (Set Gain)
-            command = struct.pack('>HB', dmx_channel, gain_value)
-            full_command = b'*82' + command + b'#'
+            full_command = commands.set_gain(dmx_channel, gain_value)
             
-            self.socket.send(full_command)
-            self.append_to_log("Set DMX {} gain to: {}".format(dmx_channel, gain_value))
+            self.send_command(full_command, "Set DMX {} gain to: {}".format(dmx_channel, gain_value),
+                              "Error setting gain",
+                              on_reply=lambda reply: self.mirror.gains.update([(dmx_channel, gain_value)]),
+                              key=(b'82', dmx_channel))
             
         except Exception as e:
             self.append_to_log("Error setting gain: {}".format(str(e)))
     
+    def live_update_gain(self):
+        # Every intermediate value while dragging goes through the coalescer
+        if self.connected:
+            self.set_gain()
+    
     def get_gain(self):
         if not self.connected:
             self.append_to_log("Not connected to LanBox!")
@@ -959,12 +2163,11 @@ class LanBoxController(QMainWindow):
         dmx_channel = self.get_gain_dmx_input.value()
         
         try:
-            # Command: *82 DMX1 0 # where DMX1 is 16bit, 0 indicates get (Get Gain)
-            command = struct.pack('>H', dmx_channel)
-            full_command = b'*82' + command + b'#'
+            full_command = commands.get_gain(dmx_channel)
             
-            self.socket.send(full_command)
-            self.append_to_log("Requested gain for DMX {}".format(dmx_channel))
+            self.send_command(full_command, lambda reply: "DMX {} gain is: {}".format(
+                dmx_channel, reply[0]), "Error getting gain",
+                on_reply=lambda reply: self.mirror.gains.update([(dmx_channel, reply[0])]))
             
         except Exception as e:
             self.append_to_log("Error getting gain: {}".format(str(e)))
@@ -975,26 +2178,61 @@ class LanBoxController(QMainWindow):
             return
             
         try:
-            # Command: *B1 # (Factory Reset)
-            full_command = b'*B1#'
+            full_command = commands.factory_reset()
             
-            self.socket.send(full_command)
-            self.append_to_log("Factory reset command sent")
+            self.send_command(full_command, "Factory reset command sent",
+                              "Error sending factory reset")
             
         except Exception as e:
             self.append_to_log("Error sending factory reset: {}".format(str(e)))
     
+    def save_show(self):
+        if not self.connected:
+            self.append_to_log("Not connected to LanBox!")
+            return
+            
+        path, _ = QFileDialog.getSaveFileName(self, "Save Show", "", "LanBox shows (*.show);;All files (*)")
+        if not path:
+            return
+        from lanbox.show import capture_show
+        connection = self.connection
+        
+        def work():
+            show = capture_show(connection)
+            show.save(path)
+            return "Saved show to {}: {} cue lists".format(path, len(show.cue_lists))
+        
+        self.run_in_background("Saving show", work, "Error saving show")
+    
+    def load_show(self):
+        if not self.connected:
+            self.append_to_log("Not connected to LanBox!")
+            return
+            
+        path, _ = QFileDialog.getOpenFileName(self, "Load Show", "", "LanBox shows (*.show);;All files (*)")
+        if not path:
+            return
+        from lanbox.show import Show, push_show
+        connection = self.connection
+        
+        def work():
+            # Only what differs from the mirror and the box's cue list digests is sent
+            with Show.load(path) as show:
+                sent = push_show(connection, self.mirror, show)
+            return "Loaded show {}: {} commands sent".format(path, sent)
+        
+        self.run_in_background("Loading show", work, "Error loading show")
+    
     def save_configuration(self):
         if not self.connected:
             self.append_to_log("Not connected to LanBox!")
             return
             
         try:
-            # Command: *B2 # (Save Configuration)
-            full_command = b'*B2#'
+            full_command = commands.save_configuration()
             
-            self.socket.send(full_command)
-            self.append_to_log("Configuration save command sent")
+            self.send_command(full_command, "Configuration save command sent",
+                              "Error saving configuration")
             
         except Exception as e:
             self.append_to_log("Error saving configuration: {}".format(str(e)))
@@ -1005,15 +2243,30 @@ class LanBoxController(QMainWindow):
             return
             
         try:
-            # Command: *B3 # (Get System Info)
-            full_command = b'*B3#'
+            full_command = commands.get_system_info()
             
-            self.socket.send(full_command)
-            self.append_to_log("System info request sent")
+            self.send_command(full_command, lambda reply: "System info: firmware v{}.{:02d}, {} mixer channels".format(
+                *reply), "Error getting system info")
             
         except Exception as e:
             self.append_to_log("Error getting system info: {}".format(str(e)))
     
+    def start_udp_receiver(self):
+        if self.udp_receiver is None:
+            from lanbox.udp import UdpReceiver
+            receiver = UdpReceiver(self.start_io_loop(), self.udp_port_input.value())
+            # Only kept once open, so a failed bind can simply be retried
+            receiver.open()
+            self.udp_receiver = receiver
+    
+    def stop_udp_receiver(self):
+        if self.udp_receiver is not None:
+            receiver = self.udp_receiver
+            self.udp_receiver = None
+            receiver.close()
+            self.append_to_log("UDP receiver stopped: {} packets, {} lost, {} malformed, {} errors".format(
+                receiver.packets, receiver.lost, receiver.malformed, receiver.errors))
+    
     def start_udp_broadcast(self):
         if not self.connected:
             self.append_to_log("Not connected to LanBox!")
@@ -1023,8 +2276,10 @@ class LanBoxController(QMainWindow):
         end_channel = self.udp_broadcast_end.value()
         
         try:
-            self.append_to_log("Starting UDP broadcast for channels {}-{}".format(start_channel, end_channel))
-            # In a real implementation, this would configure the UDP broadcasting settings
+            # Broadcast values land in the receiver's shared level buffer on the I/O thread
+            self.start_udp_receiver()
+            self.append_to_log("Receiving UDP broadcast for channels {}-{} on port {} ({} packets so far)".format(
+                start_channel, end_channel, self.udp_receiver.port, self.udp_receiver.packets))
         except Exception as e:
             self.append_to_log("Error starting UDP broadcast: {}".format(str(e)))
 
@@ -1032,4 +2287,12 @@ if __name__ == "__main__":
     app = QApplication(sys.argv)
     window = LanBoxController()
     window.show()
+    if "--startup-time" in sys.argv:
+        # Measure a cold launch: report once the first event loop pass has shown the window
+        def report():
+            print("lcopen started in {:.0f} ms".format(window.report_startup()))
+            window.close()
+        QTimer.singleShot(0, report)
+    else:
+        QTimer.singleShot(0, window.report_startup)
     sys.exit(app.exec())
@@ -0,0 +1,64 @@
+"""Write coalescing against the emulator: last value wins, at a bounded rate"""
+import time
+from concurrent.futures import CancelledError
+
+import pytest
+
+from lanbox import commands
+from lanbox.client import Client
+from lanbox.coalesce import Coalescer
+from lanbox.emulator import Emulator
+
+
+@pytest.fixture
+def emulator():
+    emulator = Emulator(port=0)
+    emulator.start()
+    yield emulator
+    emulator.stop()
+
+
+@pytest.fixture
+def client(emulator):
+    with Client("127.0.0.1", emulator.port, timeout=2) as client:
+        yield client
+
+
+def test_last_value_wins(emulator, client):
+    coalescer = Coalescer(client.connection, window=0.2)
+    # The first value goes out at once; the rest wait for the window, each replacing the one before
+    futures = [coalescer.submit("gain 3", commands.set_gain(3, level)) for level in range(50)]
+    other = coalescer.submit("gain 4", commands.set_gain(4, 9))
+    assert futures[-1].result(5) == ()
+    assert other.result(5) == ()
+    assert emulator.model.gains[2:4] == bytes([49, 9])
+    superseded = [future for future in futures[1:-1] if future.cancelled()]
+    assert len(superseded) >= 47
+    with pytest.raises(CancelledError):
+        superseded[0].result(0)
+
+
+def test_sends_at_most_once_per_window(emulator, client):
+    window = 0.05
+    coalescer = Coalescer(client.connection, window=window)
+    before = emulator.commands
+    started = time.monotonic()
+    for level in range(200):
+        coalescer.submit("gain 1", commands.set_gain(1, level))
+        time.sleep(0.002)
+    future = coalescer.submit("gain 1", commands.set_gain(1, 255))
+    elapsed = time.monotonic() - started
+    future.result(5)
+    sent = emulator.commands - before
+    assert sent <= elapsed / window + 2
+    assert sent < 100
+    assert emulator.model.gains[0] == 255
+
+
+def test_flush_sends_at_once(emulator, client):
+    coalescer = Coalescer(client.connection, window=60)
+    coalescer.submit("gain 1", commands.set_gain(1, 1)).result(5)
+    future = coalescer.submit("gain 1", commands.set_gain(1, 2))
+    coalescer.flush()
+    assert future.result(5) == ()
+    assert emulator.model.gains[0] == 2
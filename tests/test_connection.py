@@ -0,0 +1,82 @@
+"""Reconnecting with backoff and replaying unacknowledged commands, against the emulator"""
+import time
+
+import pytest
+
+from lanbox import commands
+from lanbox.client import Client
+from lanbox.connection import CONNECTED, RECONNECTING
+from lanbox.emulator import Emulator
+
+
+@pytest.fixture
+def emulator():
+    emulator = Emulator(port=0)
+    emulator.start()
+    yield emulator
+    emulator.stop()
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_dropped_link_is_reestablished_and_commands_replayed(emulator):
+    with Client("127.0.0.1", emulator.port, timeout=2) as client:
+        assert client.send_command(commands.set_gain, 1, 10).result(5) == ()
+        # Lots in flight when the link goes
+        futures = [client.send_command(commands.set_gain, dmx, dmx) for dmx in range(1, 201)]
+        emulator.drop_connections()
+        futures += [client.send_command(commands.set_gain, dmx, 7) for dmx in range(201, 301)]
+        for future in futures:
+            assert future.result(5) == ()
+        assert client.connection.reconnects >= 1
+        assert client.connection.state == CONNECTED
+        assert emulator.model.gains[:200] == bytes(range(1, 201))
+        assert emulator.model.gains[200:300] == bytes([7] * 100)
+
+
+def test_backoff_while_the_box_is_away():
+    emulator = Emulator(port=0)
+    emulator.start()
+    port = emulator.port
+    with Client("127.0.0.1", port, timeout=2, backoff_initial=0.05, backoff_max=0.4) as client:
+        emulator.stop()
+        wait_for(lambda: client.connection.state == RECONNECTING)
+        # Queued while away, sent once the box is back
+        future = client.send_command(commands.set_gain, 5, 55)
+        time.sleep(1.0)
+        # 0.05, 0.1, 0.2, then every 0.4 s: a handful of tries, not a busy loop
+        assert 3 <= client.connection.reconnects <= 7
+
+        emulator = Emulator(port=port)
+        emulator.start()
+        try:
+            assert future.result(5) == ()
+            assert emulator.model.gains[4] == 55
+            assert client.connection.state == CONNECTED
+            # A good link starts the backoff over
+            assert client.connection._attempt == 0
+        finally:
+            emulator.stop()
+
+
+def test_commands_give_up_after_max_attempts(emulator, monkeypatch):
+    original = type(emulator.model).cmd_82
+
+    def never_answer(model, payload):
+        # Every attempt at this command takes the link down before the reply goes out
+        for session in list(emulator.sessions):
+            session.transport.abort()
+        return original(model, payload)
+
+    with Client("127.0.0.1", emulator.port, timeout=2, max_attempts=2) as client:
+        monkeypatch.setattr(type(emulator.model), "cmd_82", never_answer)
+        with pytest.raises(OSError):
+            client.send_command(commands.set_gain, 1, 1).result(5)
+        monkeypatch.undo()
+        wait_for(lambda: client.connection.state == CONNECTED)
+        assert client.send_command(commands.get_gain, 2).result(5) == (255,)
@@ -0,0 +1,84 @@
+"""Three-way cue list sync between a CueListCache and the emulator"""
+import pytest
+
+from lanbox.client import Client
+from lanbox.cuesync import CueListCache, CueListSync
+from lanbox.emulator import Emulator
+
+LISTS = range(1, 10)
+EDITED = [(1, 7, 70, 7)]
+
+
+@pytest.fixture
+def emulator():
+    emulator = Emulator(port=0)
+    emulator.model.load_show(3, 4)
+    emulator.start()
+    yield emulator
+    emulator.stop()
+
+
+@pytest.fixture
+def client(emulator):
+    with Client("127.0.0.1", emulator.port, timeout=2) as client:
+        yield client
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return CueListCache(str(tmp_path))
+
+
+def sync(client, cache):
+    return CueListSync(client.connection, cache, timeout=5).sync(LISTS)
+
+
+def test_first_sync_downloads_then_nothing_moves(emulator, client, cache):
+    report = sync(client, cache)
+    assert report.downloaded == [1, 2, 3]
+    assert cache.get(2) == emulator.model.cue_lists[2]
+    report = sync(client, cache)
+    assert report.unchanged == [1, 2, 3]
+    assert not report.downloaded and not report.uploaded
+
+
+def test_one_sided_changes_move_the_right_way(emulator, client, cache):
+    sync(client, cache)
+    emulator.model.cue_lists[1] = list(EDITED)
+    cache.put(2, EDITED)
+    report = sync(client, cache)
+    assert report.downloaded == [1]
+    assert report.uploaded == [2]
+    assert cache.get(1) == EDITED
+    assert emulator.model.cue_lists[2] == EDITED
+
+
+def test_both_sides_changed_keeps_the_box(emulator, client, cache):
+    sync(client, cache)
+    emulator.model.cue_lists[3] = list(EDITED)
+    cache.put(3, [(2, 2, 2, 2)])
+    report = sync(client, cache)
+    assert report.conflicts == [3]
+    assert report.kept == []
+    assert cache.get(3) == EDITED
+
+
+def test_deleted_on_the_box(emulator, client, cache):
+    sync(client, cache)
+    del emulator.model.cue_lists[1]
+    del emulator.model.cue_lists[2]
+    cache.put(2, EDITED)
+    report = sync(client, cache)
+    # Unchanged here: follows the box. Edited here: kept, and reported
+    assert report.removed == [1]
+    assert report.conflicts == [2]
+    assert report.kept == [2]
+    assert cache.lists() == [2, 3]
+    assert cache.get(2) == EDITED
+
+
+def test_index_survives_a_reopen(client, cache):
+    sync(client, cache)
+    reopened = CueListCache(cache.directory)
+    assert reopened.lists() == [1, 2, 3]
+    assert all(reopened.hash(number) == reopened.base(number) for number in reopened.lists())
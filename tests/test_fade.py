@@ -0,0 +1,83 @@
+"""Fades against the emulator, with and without NumPy"""
+import threading
+import time
+
+import pytest
+
+from lanbox import emulator as emulated, fade
+from lanbox.client import Client
+from lanbox.emulator import Emulator
+from lanbox.fade import FadeEngine, ListFades, VectorFades
+from lanbox.mirror import Mirror
+
+
+@pytest.fixture
+def emulator():
+    emulator = Emulator(port=0)
+    emulator.start()
+    yield emulator
+    emulator.stop()
+
+
+@pytest.fixture
+def client(emulator):
+    with Client("127.0.0.1", emulator.port, timeout=2) as client:
+        yield client
+
+
+@pytest.fixture(params=["vector", "list"])
+def vectors(request, monkeypatch):
+    if request.param == "list":
+        monkeypatch.setattr(fade, "numpy", None)
+    return request.param == "vector"
+
+
+def wait_idle(engine, timeout=5):
+    # Fades begin on the I/O loop; let the queued calls run first
+    begun = threading.Event()
+    engine.loop.call_soon(begun.set)
+    assert begun.wait(timeout)
+    deadline = time.monotonic() + timeout
+    while engine.active or engine._unacknowledged:
+        assert time.monotonic() < deadline, "fade did not finish"
+        time.sleep(0.01)
+
+
+def test_fade_reaches_targets(emulator, client, vectors):
+    mirror = Mirror()
+    engine = FadeEngine(client.connection, mirror)
+    assert isinstance(engine._fades, VectorFades if vectors else ListFades)
+    engine.fade({1: 255, 2: 100, 300: 7}, 0.2)
+    wait_idle(engine)
+    assert emulator.model.levels[:2] == bytes([255, 100])
+    assert emulator.model.levels[299] == 7
+    assert mirror.levels.get(2) == 100
+    # Levels in between went out too, but unchanged channels never did
+    assert engine.frames > 1
+    assert emulator.model.levels[2] == 0
+
+    engine.crossfade({3: 50}, 0.1)
+    wait_idle(engine)
+    assert emulator.model.levels[:3] == bytes([0, 0, 50])
+    assert emulator.model.levels[299] == 0
+
+
+def test_failed_frames_are_sent_again(emulator, client, vectors, monkeypatch):
+    original = type(emulator.model).cmd_C9
+    failures = []
+
+    def reject_first(model, payload):
+        if not failures:
+            failures.append(payload)
+            raise emulated.Rejected()
+        return original(model, payload)
+
+    monkeypatch.setattr(type(emulator.model), "cmd_C9", reject_first)
+    engine = FadeEngine(client.connection)
+    # Channel 1 jumps on the first tick; channel 2 keeps the fade ticking after it
+    engine.fade({1: 200}, 0)
+    engine.fade({2: 100}, 0.2)
+    wait_idle(engine)
+    assert failures and engine.errors == 1
+    assert emulator.model.levels[:2] == bytes([200, 100])
+    assert engine.acknowledged[:2] == bytes([200, 100])
@@ -0,0 +1,156 @@
+"""Command journal: recovery, folding, compaction and replay against the emulator"""
+import pytest
+
+from lanbox import commands, journal as journals
+from lanbox.client import Client
+from lanbox.emulator import Emulator
+from lanbox.journal import ACKED, PENDING, REJECTED, REPLAYED, RECORD, Journal, replay
+from lanbox.protocol import pack_frames
+
+
+def gains(*items):
+    return bytes(pack_frames(commands.set_gains, list(items))[0][0])
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "journal")
+
+
+@pytest.fixture
+def emulator():
+    emulator = Emulator(port=0)
+    emulator.start()
+    yield emulator
+    emulator.stop()
+
+
+def test_torn_record_is_dropped_on_open(path):
+    journal = Journal(path)
+    journal.append(gains((1, 10)), ACKED)
+    journal.append(gains((2, 20)), ACKED)
+    end = journal.end
+    journal.append(gains((3, 30)), ACKED)
+    # A crash half way through the last record: its frame is damaged
+    journal._map[end + RECORD.size + 4] ^= 0xFF
+    journal.close()
+
+    journal = Journal(path)
+    assert [record.frame for record in journal.records()] == [gains((1, 10)), gains((2, 20))]
+    assert journal.end == end
+    # Appending goes on from the last intact record
+    sequence = journal.append(gains((4, 40)), ACKED)
+    journal.close()
+    journal = Journal(path)
+    assert [record.sequence for record in journal.records()] == [1, 2, sequence]
+    journal.close()
+
+
+def test_fold(path):
+    journal = Journal(path)
+    journal.append(commands.set_mix_mode(1, 2), ACKED)
+    journal.append(gains((1, 10), (2, 20)), ACKED)
+    journal.append(gains((5, 50)), REJECTED)
+    journal.append(commands.save_configuration(), ACKED)
+    unchanged = journal.append(commands.set_mix_mode(2, 1), ACKED)
+    journal.append(gains((3, 30), (4, 40)), ACKED)
+    journal.append(gains((3, 31)), ACKED)
+    in_flight = journal.append(commands.set_mix_mode(2, 3))
+    journal.append(commands.set_layer_name(4, b"Wash"), ACKED)
+
+    records = journal.snapshot()
+    # Everything up to the save is in the box's flash; the rejected gain never counted.
+    # The command still in flight stays as it is, after the last acknowledged value
+    assert [(record.frame, record.status) for record in records] == [
+        (commands.set_mix_mode(2, 1), ACKED), (gains((3, 31), (4, 40)), ACKED),
+        (commands.set_mix_mode(2, 3), PENDING), (commands.set_layer_name(4, b"Wash"), ACKED)]
+    assert [record.frame for record in journal.snapshot(in_flight=False)][2] == commands.set_layer_name(4, b"Wash")
+    # A record that survives as it was keeps its sequence; a re-packed one gets a fresh one
+    sequences = [record.sequence for record in records]
+    assert sequences[0] == unchanged and sequences[2] == in_flight
+    assert sequences[1] > sequences[3]
+    assert len(set(sequences)) == len(sequences)
+    journal.close()
+
+
+def test_folded_records_get_unique_sequences(path):
+    journal = Journal(path)
+    # Both gain frames fold into one; the mix modes fold into one frame per layer
+    journal.append(gains((1, 10)), ACKED)
+    journal.append(commands.set_mix_mode(1, 2), ACKED)
+    journal.append(commands.set_mix_mode(2, 2), ACKED)
+    journal.append(gains((2, 20)), ACKED)
+    journal.append(commands.set_mix_mode(1, 3), ACKED)
+    journal.compact()
+    sequences = [record.sequence for record in journal.records()]
+    assert len(sequences) == 3
+    assert len(set(sequences)) == 3
+    journal.close()
+
+
+def test_compact_then_reopen(path):
+    journal = Journal(path)
+    for level in range(100):
+        journal.append(gains((1, level), (2, level)), ACKED)
+    pending = journal.append(commands.set_mix_mode(7, 2))
+    assert journal.compact() == 99
+    # The in-flight command's outcome still lands after the rewrite
+    journal.settle(pending, ACKED)
+    after = journal.sequence
+    journal.close()
+
+    journal = Journal(path)
+    assert [(record.frame, record.status) for record in journal.records()] == [
+        (gains((1, 99), (2, 99)), ACKED), (commands.set_mix_mode(7, 2), ACKED)]
+    assert journal.sequence == after
+    assert journal.append(gains((3, 3))) == after + 1
+    journal.close()
+
+
+def test_replay_retires_what_it_sent(path, emulator):
+    journal = Journal(path)
+    with Client("127.0.0.1", emulator.port, timeout=2, journal=journal) as client:
+        client.send(gains((1, 11), (2, 22))).result(5)
+        client.send(commands.set_mix_mode(3, 2)).result(5)
+    old = [record.sequence for record in journal.snapshot()]
+
+    # The box lost everything
+    emulator.model.reset()
+    with Client("127.0.0.1", emulator.port, timeout=2, journal=journal) as client:
+        sent, future = replay(client.connection, journal)
+        future.result(5)
+    assert sent == 2
+    assert emulator.model.gains[:2] == bytes([11, 22])
+    assert emulator.model.layers[2].mix_mode == 2
+
+    statuses = {record.sequence: record.status for record in journal.records()}
+    assert all(statuses[sequence] == REPLAYED for sequence in old)
+    # Only the fresh copies are left, so a second replay sends each command once
+    again = journal.snapshot()
+    assert len(again) == 2
+    assert not set(old) & {record.sequence for record in again}
+    journal.compact()
+    assert len(journal.records()) == 2
+    journal.close()
+
+
+def test_retire_during_compaction_is_kept(path, monkeypatch):
+    journal = Journal(path)
+    first = journal.append(commands.set_mix_mode(1, 2), ACKED)
+    journal.append(commands.set_mix_mode(2, 2), ACKED)
+    journal.append(commands.set_mix_mode(2, 3), ACKED)
+    fold = journals._fold
+
+    def fold_and_retire(image, live, allocate):
+        # A replay acknowledges the first record while the new file is being written
+        records = fold(image, live, allocate)
+        journal.retire(first)
+        return records
+
+    monkeypatch.setattr(journals, "_fold", fold_and_retire)
+    journal.compact()
+    monkeypatch.undo()
+    statuses = {record.sequence: record.status for record in journal.records()}
+    assert statuses[first] == REPLAYED
+    assert [record.frame for record in journal.snapshot()] == [commands.set_mix_mode(2, 3)]
+    journal.close()
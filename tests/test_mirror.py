@@ -0,0 +1,83 @@
+"""Mirror diffing, and syncing only what differs to the emulator"""
+from array import array
+
+import pytest
+
+from lanbox.client import Client
+from lanbox.emulator import Emulator
+from lanbox.mirror import Mirror, NameTable, Table
+from lanbox.protocol import CommandRejected
+
+
+@pytest.fixture
+def emulator():
+    emulator = Emulator(port=0)
+    emulator.start()
+    yield emulator
+    emulator.stop()
+
+
+def test_unknown_entries_are_always_in_the_diff():
+    table = Table("B", 8)
+    assert table.diff({3: 0}) == [(3, 0)]
+    table.update([(3, 0), (4, 9)])
+    assert table.diff({3: 0, 4: 10, 5: 0}) == [(4, 10), (5, 0)]
+    table.invalidate()
+    assert table.diff({3: 0}) == [(3, 0)]
+
+
+def test_diff_takes_tables_and_mappings():
+    table = Table("B", 4)
+    table.update(enumerate([1, 2, 3, 4], 1))
+    assert table.diff([1, 2, 30, 4]) == [(3, 30)]
+    assert table.diff({"2": "20"}) == [(2, 20)]
+    # A whole known table mapped from a file is compared in one go
+    assert table.diff(memoryview(bytes([1, 2, 3, 4]))) == []
+    assert table.diff(memoryview(bytes([1, 2, 3, 5]))) == [(4, 5)]
+    assert table.diff(memoryview(array("B", [0, 2, 3, 4]))) == [(1, 0)]
+
+
+def test_diff_rejects_channels_out_of_range():
+    table = Table("H", 4)
+    with pytest.raises(ValueError):
+        table.diff({5: 1})
+    with pytest.raises(ValueError):
+        NameTable(2).diff({0: b"x"})
+
+
+def test_names():
+    names = NameTable(3)
+    assert names.diff({1: b"Wash"}) == [(1, b"Wash")]
+    names.update([(1, b"Wash")])
+    assert names.diff({1: b"Wash", 2: b""}) == [(2, b"")]
+
+
+def test_sync_sends_only_differences(emulator):
+    mirror = Mirror()
+    with Client("127.0.0.1", emulator.port, timeout=2) as client:
+        futures = mirror.sync(client.connection, gains={dmx: 100 for dmx in range(1, 201)}, mix_modes={4: 2})
+        # 85 gains fit a bulk frame; each layer setting is a frame of its own
+        assert len(futures) == 4
+        for future in futures:
+            future.result(5)
+        assert emulator.model.gains[:200] == bytes([100] * 200)
+        assert emulator.model.layers[3].mix_mode == 2
+        assert mirror.gains.get(200) == 100
+
+        futures = mirror.sync(client.connection, gains={dmx: 100 for dmx in range(1, 201)}, mix_modes={4: 2})
+        assert futures == []
+        futures = mirror.sync(client.connection, gains={7: 1, 8: 100}, batch=True)
+        assert len(futures) == 1
+        futures[0].result(5)
+        assert emulator.model.gains[6] == 1
+
+
+def test_rejected_frames_leave_the_mirror_unknown(emulator):
+    mirror = Mirror()
+    with Client("127.0.0.1", emulator.port, timeout=2) as client:
+        futures = mirror.sync(client.connection, mix_modes={2: 1, 3: 250})
+        futures[0].result(5)
+        with pytest.raises(CommandRejected):
+            futures[1].result(5)
+    assert mirror.mix_modes.get(2) == 1
+    assert mirror.mix_modes.get(3) is None
@@ -0,0 +1,42 @@
+"""LevelHistory: change reports, ring wrap-around and short sources"""
+from array import array
+
+from lanbox.monitor import LevelHistory
+
+
+def test_changes_are_reported_per_channel():
+    history = LevelHistory(channels=200, depth=4)
+    levels = bytearray(200)
+    assert list(history.capture(levels, 1.0)) == list(range(200))
+    assert history.capture(levels, 2.0) == []
+    # One change per scan block, and two in the last, partial one
+    levels[0] = 1
+    levels[70] = 2
+    levels[198:200] = b"\x03\x04"
+    assert history.capture(levels, 3.0) == [0, 70, 198, 199]
+    assert bytes(history.latest()[:1]) == b"\x01"
+
+
+def test_ring_keeps_the_newest_frames():
+    history = LevelHistory(channels=8, depth=3)
+    assert history.latest() is None
+    for value in range(5):
+        history.capture(bytes([value] * 8), float(value))
+    assert len(history) == 3
+    assert history.series(1) == [2, 3, 4]
+    assert history.frame(2)[0] == 2
+    assert history.frame(3) is None
+    assert list(history.times) == [3.0, 4.0, 2.0]
+    assert history.latest().readonly
+
+
+def test_short_source_reads_as_zeros():
+    history = LevelHistory(channels=8, depth=2)
+    history.capture(bytes([9] * 8))
+    # A mirror table shorter than the monitor, as array or bytes; frames keep their size
+    assert history.capture(array("B", [9, 9, 9])) == [3, 4, 5, 6, 7]
+    assert len(history.frames) == 16
+    assert bytes(history.latest()) == bytes([9, 9, 9, 0, 0, 0, 0, 0])
+    # A longer one is cut to the monitor's width
+    assert history.capture(bytes([1] * 20)) == list(range(8))
+    assert len(history.frames) == 16
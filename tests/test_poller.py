@@ -0,0 +1,109 @@
+"""Adaptive status polling against the emulator"""
+import threading
+import time
+
+import pytest
+
+from lanbox import emulator as emulated
+from lanbox.client import Client
+from lanbox.emulator import Emulator
+from lanbox.mirror import Mirror
+from lanbox.poller import DUTY, StatusPoller
+
+
+@pytest.fixture
+def emulator():
+    emulator = Emulator(port=0)
+    emulator.start()
+    yield emulator
+    emulator.stop()
+
+
+@pytest.fixture
+def client(emulator):
+    with Client("127.0.0.1", emulator.port, timeout=2) as client:
+        yield client
+
+
+class Changes:
+    """Collects what the poller reports, from the I/O thread"""
+
+    def __init__(self):
+        self.reports = []
+        self.event = threading.Event()
+
+    def __call__(self, changes):
+        self.reports.append(changes)
+        self.event.set()
+
+    def next(self, timeout=5):
+        assert self.event.wait(timeout), "nothing reported"
+        self.event.clear()
+        return self.reports[-1]
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_reports_only_what_changed(emulator, client):
+    changes = Changes()
+    mirror = Mirror()
+    poller = StatusPoller(client.connection, changes, mirror, layers=range(1, 11), gains=range(1, 5))
+    poller.start()
+    try:
+        first = changes.next()
+        # The first sweep reports everything
+        assert sorted(first["layers"]) == list(range(1, 11))
+        assert first["gains"] == {1: 255, 2: 255, 3: 255, 4: 255}
+        assert first["layers"][3]["name"] == b"Layer 3"
+        assert mirror.priorities.get(10) == 10
+
+        emulator.model.layers[2].mix_mode = 4
+        emulator.model.gains[1] = 7
+        poller.poll_now()
+        assert changes.next() == {"layers": {3: {"mix_mode": 4}}, "gains": {2: 7}}
+        assert mirror.mix_modes.get(3) == 4
+        assert mirror.gains.get(2) == 7
+    finally:
+        poller.stop()
+
+
+def test_interval_adapts(emulator, client):
+    poller = StatusPoller(client.connection, layers=range(1, 4), min_interval=0.02, max_interval=0.3)
+    poller.start()
+    try:
+        # Nothing moves after the first sweep, so the interval stretches up to the maximum
+        wait_for(lambda: poller.interval == 0.3)
+        sweeps = poller.sweeps
+        time.sleep(0.7)
+        assert poller.sweeps - sweeps <= 4
+
+        # Changes halve it again
+        emulator.model.layers[0].priority = 60
+        poller.poll_now()
+        wait_for(lambda: poller.changes > 3)
+        assert poller.interval < 0.3
+        # Never faster than the sweep's own round trip allows
+        assert poller.interval >= poller.sweep_time / DUTY
+    finally:
+        poller.stop()
+
+
+def test_failed_sweeps_back_right_off(emulator, client, monkeypatch):
+    def reject(model, payload):
+        raise emulated.Rejected()
+
+    poller = StatusPoller(client.connection, layers=range(1, 4), min_interval=0.02, max_interval=0.5)
+    monkeypatch.setattr(type(emulator.model), "cmd_49", reject)
+    poller.start()
+    try:
+        wait_for(lambda: poller.errors >= 1)
+        assert poller.interval == 0.5
+        assert poller.values["layers"] == {}
+    finally:
+        poller.stop()
+    wait_for(lambda: not poller.active)
@@ -0,0 +1,74 @@
+"""Reply parsing, and pipelined requests matched to their replies by the emulator"""
+import pytest
+
+from lanbox import commands
+from lanbox.client import Client
+from lanbox.connection import gather
+from lanbox.emulator import Emulator
+from lanbox.protocol import GAIN, LAYER_STATUS, CommandRejected, ProtocolError, ReplyParser
+
+
+@pytest.fixture
+def emulator():
+    emulator = Emulator(port=0)
+    emulator.start()
+    yield emulator
+    emulator.stop()
+
+
+def test_replies_in_pieces():
+    parser = ReplyParser()
+    wire = b"*82\xc8#*47#"
+    for value in wire[:4]:
+        assert parser.next_reply(b"82", GAIN) is None
+        parser.feed(bytes([value]))
+    parser.feed(wire[4:])
+    assert parser.next_reply(b"82", GAIN) == (200,)
+    assert parser.next_reply(b"47", None) == ()
+    assert parser.next_reply(b"47", None) is None
+
+
+def test_rejection_leaves_the_stream_in_step():
+    parser = ReplyParser()
+    parser.feed(b"?82#*49")
+    with pytest.raises(CommandRejected):
+        parser.next_reply(b"82", GAIN)
+    status = LAYER_STATUS.pack(1, 0, 3, 3, 0, b"Layer 3")
+    assert parser.next_reply(b"49", LAYER_STATUS) is None
+    parser.feed(status + b"#")
+    assert parser.next_reply(b"49", LAYER_STATUS)[2] == 3
+
+
+@pytest.mark.parametrize("wire, opcode", [
+    (b"x82#", b"82"),
+    # A reply to some other command than the oldest in flight
+    (b"*47\x01#", b"82"),
+    (b"*82\x01!", b"82"),
+])
+def test_garbage_is_a_protocol_error(wire, opcode):
+    parser = ReplyParser()
+    parser.feed(wire)
+    with pytest.raises(ProtocolError):
+        parser.next_reply(opcode, GAIN)
+
+
+def test_pipelined_replies_reach_their_futures(emulator):
+    emulator.model.gains[:64] = bytes(range(64))
+    with Client("127.0.0.1", emulator.port, timeout=2) as client:
+        send = client.send_command
+        # Queries, commands and a rejection interleaved, all in flight at once
+        futures = []
+        for dmx in range(1, 65):
+            futures.append(send(commands.get_gain, dmx))
+            futures.append(send(commands.get_layer_status, dmx % 63 + 1))
+        rejected = send(commands.set_mix_mode, 99, 1)
+        futures.append(send(commands.set_gain, 1, 7))
+        futures.append(send(commands.get_gain, 1))
+
+        results = gather(futures).result(5)
+        assert [gain for gain, in results[0:128:2]] == list(range(64))
+        assert [status[2] for status in results[1:128:2]] == [dmx % 63 + 1 for dmx in range(1, 65)]
+        assert results[-2:] == [(), (7,)]
+        with pytest.raises(CommandRejected):
+            rejected.result(5)
+        assert client.connection.in_flight == 0
@@ -0,0 +1,87 @@
+"""Layer scenes: capture, recall in one batch, and the scene book"""
+import pytest
+
+from lanbox.client import Client
+from lanbox.emulator import Emulator
+from lanbox.mirror import LAYERS, Mirror
+from lanbox.protocol import CommandRejected
+from lanbox.scene import LayerScene, SceneBook, capture_scene, recall_scene
+
+
+@pytest.fixture
+def emulator():
+    emulator = Emulator(port=0)
+    emulator.start()
+    yield emulator
+    emulator.stop()
+
+
+@pytest.fixture
+def client(emulator):
+    with Client("127.0.0.1", emulator.port, timeout=2) as client:
+        yield client
+
+
+def test_capture_and_recall(emulator, client):
+    emulator.model.layers[0].mix_mode = 3
+    emulator.model.layers[1].name = b"Front wash"
+    mirror = Mirror()
+    scene = capture_scene(client.connection, "look", 5, mirror)
+    assert scene.mix_modes[0] == 3
+    assert scene.names[1] == b"Front wash"
+    assert mirror.names.get(2) == b"Front wash"
+
+    # Nothing changed on the box, so nothing to send
+    sent, future = recall_scene(client.connection, mirror, scene)
+    assert sent == 0
+    assert future.result(5) == []
+
+    emulator.model.layers[0].mix_mode = 1
+    emulator.model.layers[4].priority = 40
+    emulator.model.layers[1].name = b"Other"
+    capture_scene(client.connection, "now", 5, mirror)
+    sent, future = recall_scene(client.connection, mirror, scene)
+    assert sent == 3
+    future.result(5)
+    assert emulator.model.layers[0].mix_mode == 3
+    assert emulator.model.layers[4].priority == 5
+    assert emulator.model.layers[1].name.rstrip(b"\0") == b"Front wash"
+
+
+def test_rejected_recall_fails_as_a_whole(emulator, client):
+    mirror = Mirror()
+    scene = capture_scene(client.connection, "look", 5, mirror)
+    scene.mix_modes[9] = 200
+    scene.priorities[10] = 1
+    sent, future = recall_scene(client.connection, mirror, scene)
+    assert sent == 2
+    with pytest.raises(CommandRejected):
+        future.result(5)
+    # What the box took is in the mirror; for the rejected mix mode it still holds the box's value
+    assert emulator.model.layers[10].priority == 1
+    assert mirror.priorities.get(11) == 1
+    assert mirror.mix_modes.get(10) == emulator.model.layers[9].mix_mode == 1
+
+
+def test_scene_book_round_trip(tmp_path):
+    path = str(tmp_path / "scenes" / "scenes.json")
+    book = SceneBook(path)
+    scene = LayerScene("look", [1] * LAYERS, [0] * LAYERS, list(range(1, LAYERS + 1)),
+                       [b"L\xe9"] + [b""] * (LAYERS - 1))
+    book.put(scene)
+    book.put(LayerScene("dark", [0] * LAYERS, [0] * LAYERS, [1] * LAYERS, [b""] * LAYERS))
+
+    book = SceneBook(path)
+    assert book.names() == ["dark", "look"]
+    loaded = book.get("look")
+    assert loaded.priorities == scene.priorities
+    assert loaded.names[0].rstrip(b"\0") == b"L\xe9"
+    book.remove("dark")
+    assert SceneBook(path).names() == ["look"]
+    with pytest.raises(ValueError):
+        book.get("dark")
+
+
+def test_scene_needs_every_layer():
+    with pytest.raises(ValueError):
+        LayerScene("short", [1] * 3, [0] * 3, [1] * 3, [b""] * 3)
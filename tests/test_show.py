@@ -0,0 +1,105 @@
+"""Show files: save and load round trip, format checks, and pushing to the emulator"""
+import struct
+
+import pytest
+
+from lanbox.client import Client
+from lanbox.emulator import Emulator
+from lanbox.mirror import Mirror
+from lanbox.show import CUE_ENTRY, HEADER, SECTION, Show, ShowFormatError, capture_show, push_show, read_mirror
+
+
+@pytest.fixture
+def emulator():
+    emulator = Emulator(port=0)
+    emulator.model.load_show(3, 5)
+    emulator.model.gains[9] = 90
+    emulator.model.patch[4] = 300
+    emulator.model.layers[1].mix_mode = 3
+    emulator.start()
+    yield emulator
+    emulator.stop()
+
+
+@pytest.fixture
+def client(emulator):
+    with Client("127.0.0.1", emulator.port, timeout=2) as client:
+        yield client
+
+
+@pytest.fixture
+def saved(client, tmp_path):
+    path = str(tmp_path / "rig.show")
+    capture_show(client.connection, 10).save(path)
+    return path
+
+
+def test_save_load_round_trip(emulator, saved):
+    with Show.load(saved) as show:
+        assert list(show.patch) == list(emulator.model.patch)
+        assert bytes(show.gains) == bytes(emulator.model.gains)
+        assert show.mix_modes[1] == 3
+        assert list(show.priorities) == list(range(1, 64))
+        assert sorted(show.cue_lists) == [1, 2, 3]
+        assert show.steps(2) == emulator.model.cue_lists[2]
+
+
+def test_loading_onto_the_same_box_sends_nothing(emulator, client, saved):
+    mirror = Mirror()
+    read_mirror(client.connection, mirror, 10)
+    with Show.load(saved) as show:
+        assert push_show(client.connection, mirror, show, 10) == 0
+
+
+def test_loading_sends_only_differences(emulator, client, saved):
+    emulator.model.gains[100] = 1
+    emulator.model.layers[5].priority = 9
+    del emulator.model.cue_lists[3]
+    mirror = Mirror()
+    read_mirror(client.connection, mirror, 10)
+    with Show.load(saved) as show:
+        # One gain frame, one layer priority, and the missing list: create, clear, 5 steps
+        assert push_show(client.connection, mirror, show, 10) == 9
+    assert emulator.model.gains[100] == 255
+    assert emulator.model.layers[5].priority == 6
+    assert len(emulator.model.cue_lists[3]) == 5
+
+
+def corrupt(path, size=None, patch=None):
+    with open(path, "rb") as f:
+        data = bytearray(f.read())
+    if patch is not None:
+        patch(data)
+    with open(path, "wb") as f:
+        f.write(data[:size])
+
+
+def cues_section(data):
+    count = struct.unpack_from("<H", data, 8)[0]
+    for index in range(count):
+        tag, offset, length = SECTION.unpack_from(data, HEADER.size + index * SECTION.size)
+        if tag == b"CUES":
+            return HEADER.size + index * SECTION.size, offset, length
+
+
+@pytest.mark.parametrize("change", [
+    lambda data: data.__setitem__(slice(0, 6), b"NOSHOW"),
+    lambda data: struct.pack_into("<H", data, 6, 99),
+    # A cue section too short for its own list count
+    lambda data: SECTION.pack_into(data, cues_section(data)[0], b"CUES", cues_section(data)[1], 1),
+    # More cue lists claimed than the directory has room for
+    lambda data: struct.pack_into("<H", data, cues_section(data)[1], 5000),
+    # A list whose steps run past the section
+    lambda data: CUE_ENTRY.pack_into(data, cues_section(data)[1] + 2, 1, 5000, 8),
+])
+def test_corrupt_files_are_rejected(saved, change):
+    corrupt(saved, patch=change)
+    with pytest.raises(ShowFormatError):
+        Show.load(saved)
+
+
+@pytest.mark.parametrize("size", [4, HEADER.size + 3, 200])
+def test_truncated_files_are_rejected(saved, size):
+    corrupt(saved, size)
+    with pytest.raises(ShowFormatError):
+        Show.load(saved)
@@ -0,0 +1,73 @@
+"""Serial and MIDI transports against the emulator's pseudo-terminals"""
+import pytest
+
+from lanbox import commands
+from lanbox.client import Client
+from lanbox.emulator import Emulator
+from lanbox.midi import MIDI_BAUDRATE, MidiConnection, SysExDecoder, SysExEncoder, pack7, unpack7
+from lanbox.serialport import SerialConnection
+
+
+@pytest.fixture
+def emulator():
+    emulator = Emulator(port=0, serial=True, midi=True)
+    emulator.start()
+    yield emulator
+    emulator.stop()
+
+
+def round_trip(client):
+    assert client.send_command(commands.set_gain, 12, 200).result(5) == ()
+    assert client.send_command(commands.get_gain, 12).result(5) == (200,)
+    # Pipelined: every request is queued before any reply is awaited
+    futures = [client.send_command(commands.get_layer_status, layer) for layer in range(1, 64)]
+    assert len([future.result(5) for future in futures]) == 63
+
+
+def test_serial_round_trip(emulator):
+    with Client(emulator.serial_path, 38400, timeout=2, connection_class=SerialConnection) as client:
+        round_trip(client)
+
+
+def test_midi_round_trip(emulator):
+    with Client(emulator.midi_path, MIDI_BAUDRATE, timeout=2, connection_class=MidiConnection) as client:
+        round_trip(client)
+
+
+def test_pack7_round_trip():
+    data = bytes(range(256)) * 3
+    packed = pack7(data)
+    assert max(packed) < 0x80
+    assert bytes(unpack7(packed)) == data
+
+
+def test_sysex_framing():
+    encoder = SysExEncoder(max_message=64)
+    data = bytes(range(256)) * 4
+    wire = encoder.encode(data)
+    assert encoder.messages > 1
+    assert wire[0] == 0xF0 and wire[-1] == 0xF7
+    assert all(len(message) + 2 <= 64 for message in wire[1:-1].split(b"\xf7\xf0"))
+
+    # Clock bytes anywhere, a foreign SysEx and a note-on in between, fed in small pieces
+    noisy = bytearray(b"\xf0\x43\x01\x02\xf7\x90\x40\x7f")
+    for index, value in enumerate(wire):
+        noisy.append(value)
+        if index % 13 == 0:
+            noisy.append(0xF8)
+    decoder = SysExDecoder()
+    out = b"".join(decoder.feed(noisy[start:start + 5]) for start in range(0, len(noisy), 5))
+    assert out == data
+    assert decoder.lost == 0
+
+
+def test_sysex_losses_are_counted():
+    encoder = SysExEncoder()
+    first, second, third, fourth = (encoder.encode(text * 10) for text in (b"w", b"x", b"y", b"z"))
+    decoder = SysExDecoder()
+    # The second message never arrives, the fourth is cut short by a status byte
+    assert decoder.feed(first + third) == b"w" * 10 + b"y" * 10
+    assert decoder.gaps == 1
+    assert decoder.feed(fourth[:-3] + b"\x90") == b""
+    assert decoder.truncated == 1
+    assert decoder.lost == 2
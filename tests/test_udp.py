@@ -0,0 +1,117 @@
+"""UDP level broadcasts: ingest, loss accounting and socket errors"""
+import errno
+import socket
+import threading
+import time
+
+import pytest
+
+from lanbox.emulator import Emulator
+from lanbox.ioloop import IOLoop
+from lanbox.patch import MIXER_CHANNELS
+from lanbox.udp import UdpReceiver, encode_broadcast
+
+
+@pytest.fixture
+def loop():
+    loop = IOLoop()
+    loop.start()
+    yield loop
+    loop.stop()
+
+
+@pytest.fixture
+def receiver(loop):
+    receiver = UdpReceiver(loop, port=0, host="127.0.0.1")
+    receiver.open()
+    yield receiver
+    receiver.close()
+
+
+@pytest.fixture
+def sender(receiver):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.connect(receiver.sock.getsockname())
+    yield sock
+    sock.close()
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_blocks_land_in_levels(receiver, sender):
+    blocks = []
+    receiver.on_block = lambda start, count: blocks.append((start, count))
+    sender.send(encode_broadcast(1, 1, bytes(range(100))))
+    sender.send(encode_broadcast(2, MIXER_CHANNELS - 9, bytes([7] * 10)))
+    wait_for(lambda: receiver.packets == 2)
+    assert receiver.levels[:100] == bytes(range(100))
+    assert receiver.levels[-10:] == bytes([7] * 10)
+    assert blocks == [(1, 100), (MIXER_CHANNELS - 9, 10)]
+    assert (receiver.lost, receiver.late, receiver.malformed) == (0, 0, 0)
+
+
+def test_losses_late_and_malformed_datagrams_are_counted(receiver, sender):
+    # Across the wrap: 0 and 1 never arrive, then 1 turns up late
+    for sequence in (0xFFFE, 0xFFFF, 2, 1):
+        sender.send(encode_broadcast(sequence, 1, bytes([sequence & 0xFF])))
+    # Bad magic, past the last channel, shorter than it claims, shorter than a header
+    sender.send(b"XX" + encode_broadcast(7, 1, b"\x01")[2:])
+    sender.send(encode_broadcast(8, MIXER_CHANNELS, b"\x01\x02"))
+    sender.send(encode_broadcast(9, 1, b"\x01\x02")[:-1])
+    sender.send(b"LB")
+    wait_for(lambda: receiver.packets == 8)
+    assert receiver.lost == 2
+    assert receiver.late == 1
+    assert receiver.malformed == 4
+    # The late datagram did not overwrite newer values
+    assert receiver.levels[0] == 2
+
+
+def test_emulator_broadcasts(receiver):
+    emulator = Emulator(port=0, udp_target=receiver.sock.getsockname(), broadcast_rate=50)
+    emulator.model.levels[:3] = b"\x01\x02\x03"
+    emulator.start()
+    try:
+        wait_for(lambda: receiver.levels[:3] == b"\x01\x02\x03")
+    finally:
+        emulator.stop()
+    assert receiver.lost == 0
+
+
+class FailingSocket:
+    def __init__(self, code):
+        self.code = code
+        self.closed = False
+
+    def recv_into(self, buffer):
+        raise OSError(self.code, "simulated")
+
+    def close(self):
+        self.closed = True
+
+
+def on_loop(loop, callback):
+    done = threading.Event()
+    loop.call_soon(lambda: (callback(), done.set()))
+    assert done.wait(5)
+
+
+def test_socket_errors(loop):
+    receiver = UdpReceiver(loop, port=0)
+    transient = FailingSocket(errno.ECONNREFUSED)
+    receiver.sock = transient
+    on_loop(loop, lambda: receiver._on_readable(None))
+    # An ICMP error from an earlier send leaves the socket usable
+    assert receiver.errors == 1 and receiver.sock is transient and not transient.closed
+
+    fatal = FailingSocket(errno.EBADF)
+    receiver.sock = fatal
+    on_loop(loop, lambda: receiver._on_readable(None))
+    assert receiver.errors == 2
+    assert receiver.error.errno == errno.EBADF
+    assert receiver.sock is None and fatal.closed